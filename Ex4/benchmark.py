@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# benchmark.py
+# WordCount throughput of the MPI MapReduce runner as the rank count grows:
+#   python benchmark.py [GB] [max_ranks]
+import itertools
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+VOCABULARY = 200000
+WORDS_PER_LINE = 12
+
+def write_corpus(path, size):
+    """Zipf-ish text so the combiner sees a realistic mix of hot and rare words"""
+    rng = random.Random(0)
+    words = [f"w{i}" for i in range(VOCABULARY)]
+    cum_weights = list(itertools.accumulate(1 / (i + 1) for i in range(VOCABULARY)))
+    tokens = rng.choices(words, cum_weights=cum_weights, k=WORDS_PER_LINE * 100000)
+    block = '\n'.join(' '.join(tokens[i:i + WORDS_PER_LINE]) for i in range(0, len(tokens), WORDS_PER_LINE)) + '\n'
+    block = block.encode()
+    with open(path, 'wb') as f:
+        for _ in range(size // len(block)):
+            f.write(block)
+        f.write(block[:size % len(block)].rsplit(b'\n', 1)[0] + b'\n')
+
+def main():
+    gb = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    max_ranks = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    mpiexec = shutil.which('mpiexec') or shutil.which('mpirun')
+    if not mpiexec:
+        print("Error: 'mpiexec' not found. Please install MPI runtime.")
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = os.path.join(workdir, 'corpus.txt')
+        write_corpus(corpus, int(gb * 1e9))
+        print(f"WordCount over {gb:.1f} GB")
+        print(f"  {'ranks':>5s} {'GB/min':>8s} {'map s':>7s} {'shuffle s':>9s} {'reduce s':>8s}")
+        ranks = 1
+        while ranks <= max_ranks:
+            out_dir = os.path.join(workdir, f'out_{ranks}')
+            cmd = [mpiexec, '-n', str(ranks), sys.executable, os.path.join(HERE, 'wordcount.py'), corpus, out_dir]
+            result = subprocess.run(cmd, capture_output=True, text=True, cwd=HERE)
+            phases = re.search(r"map ([\d.]+)s\s+shuffle ([\d.]+)s\s+reduce ([\d.]+)s", result.stdout)
+            rate = re.search(r"([\d.]+) GB/min", result.stdout)
+            if result.returncode or not phases or not rate:
+                print(f"  {ranks:5d} failed: {result.stderr.strip()[-200:]}")
+            else:
+                print(f"  {ranks:5d} {float(rate.group(1)):8.2f} {float(phases.group(1)):7.2f} "
+                      f"{float(phases.group(2)):9.2f} {float(phases.group(3)):8.2f}")
+            shutil.rmtree(out_dir, ignore_errors=True)
+            ranks *= 2
+
+if __name__ == '__main__':
+    main()
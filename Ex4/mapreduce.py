@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# mapreduce.py
+# Minimal MapReduce on MPI ranks: every rank maps a share of the input splits,
+# the map output is hash-partitioned and exchanged with Alltoallv, and every
+# rank reduces one partition into <output_dir>/part-r-<rank>.
+# Keys must be sortable: map output is kept sorted from the spills to the reducers.
+from mpi4py import MPI
+import os
+import mmap
+import time
+import pickle
+import shutil
+import zlib
+import heapq
+import itertools
+from collections import defaultdict
+from operator import itemgetter
+
+SPLIT_SIZE = 64 * 1024 * 1024  # Bytes of input per map task
+SHUFFLE_ROUND = 256 * 1024 * 1024  # Max bytes a rank sends, and receives, in one Alltoallv (MPI counts and displacements are 32-bit)
+MAP_BUFFER_KEYS = 1000000  # Distinct keys held in memory on the map side before spilling a sorted run
+SPILL_BATCH = 10000  # Records per pickle frame in a spill file
+
+def list_inputs(paths):
+    """Expand directories into the files under them, in a fixed order on every rank"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names)
+        else:
+            files.append(path)
+    return sorted(files)
+
+def make_splits(files, split_size=SPLIT_SIZE):
+    """Cut the inputs into (path, start, end) byte ranges"""
+    splits = []
+    for path in files:
+        size = os.path.getsize(path)
+        for start in range(0, size, split_size):
+            splits.append((path, start, min(start + split_size, size)))
+    return splits
+
+def read_split(mm, start, end):
+    """Return the whole lines of a split: a line belongs to the split it starts in"""
+    if start > 0:
+        newline = mm.find(b'\n', start - 1, end)
+        if newline < 0:
+            return b''
+        start = newline + 1
+    if end < len(mm):
+        newline = mm.find(b'\n', end - 1)
+        end = len(mm) if newline < 0 else newline + 1
+    return mm[start:end]
+
+def partition(key, partitions):
+    """Stable hash partitioning: Python's hash() differs between processes"""
+    if isinstance(key, str):
+        key = key.encode()
+    elif not isinstance(key, bytes):
+        key = pickle.dumps(key)
+    return zlib.crc32(key) % partitions
+
+def sorted_records(buffer, partitions):
+    """Map-side buffer as (partition, key, values) records in (partition, key) order"""
+    return sorted(((partition(key, partitions), key, values) for key, values in buffer.items()),
+                  key=itemgetter(0, 1))
+
+def by_partition(records, partitions):
+    """Split (partition, key, values) records in partition order into one list per partition"""
+    lists = [[] for _ in range(partitions)]
+    for part, group in itertools.groupby(records, key=itemgetter(0)):
+        lists[part] = list(group)
+    return lists
+
+def write_run(records, partitions, path):
+    """Write a sorted run; returns the [start, end) byte range of each partition in the file"""
+    index = []
+    with open(path, 'wb') as f:
+        for part_records in by_partition(records, partitions):
+            start = f.tell()
+            for i in range(0, len(part_records), SPILL_BATCH):
+                pickle.dump(part_records[i:i + SPILL_BATCH], f, pickle.HIGHEST_PROTOCOL)
+            index.append((start, f.tell()))
+    return index
+
+def read_run(path, start=0, end=None):
+    """Records from the pickle frames in [start, end) of a file (to the end if end is None)
+
+    The file is reopened for every frame, so one stream per partition per run
+    can be open at once without holding that many descriptors.
+    """
+    while end is None or start < end:
+        with open(path, 'rb') as f:
+            f.seek(start)
+            try:
+                batch = pickle.load(f)
+            except EOFError:
+                return
+            start = f.tell()
+        yield from batch
+
+def combine_sorted(records, combiner):
+    """Collapse adjacent records with the same (partition, key), combining their values"""
+    current = None
+    for part, key, values in records:
+        if current is not None and current[0] == part and current[1] == key:
+            current[2].extend(values)
+            if combiner:
+                current[2][:] = [combiner(key, current[2])]
+        else:
+            if current is not None:
+                yield current
+            current = (part, key, list(values))
+    if current is not None:
+        yield current
+
+def run_map(splits, mapper, combiner, partitions, spill_dir):
+    """Run the mapper over each split; returns one key-sorted stream of (partition, key, values)
+    records per partition, plus the number of records the mapper emitted and the number of spills
+
+    Map output is aggregated in one in-memory buffer, combined as it goes when
+    there is a combiner. When the buffer holds MAP_BUFFER_KEYS keys it is spilled
+    to disk as a sorted run. Each partition's stream k-way merges its part of
+    every run lazily, so memory stays flat however large the input; the runs
+    must stay in spill_dir until the streams have been read.
+    """
+    buffer = {}
+    runs = []
+    records = 0
+    opened = {}
+    try:
+        for path, start, end in splits:
+            if path not in opened:
+                f = open(path, 'rb')
+                opened[path] = (f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            data = read_split(opened[path][1], start, end)
+            # Group the split's output first so the buffer is touched once per distinct key
+            grouped = defaultdict(list)
+            for key, value in mapper(data):
+                grouped[key].append(value)
+                records += 1
+            for key, values in grouped.items():
+                existing = buffer.get(key)
+                if existing is None:
+                    buffer[key] = existing = values
+                else:
+                    existing.extend(values)
+                if combiner and len(existing) > 1:
+                    buffer[key] = [combiner(key, existing)]
+            if len(buffer) >= MAP_BUFFER_KEYS:
+                os.makedirs(spill_dir, exist_ok=True)
+                path = os.path.join(spill_dir, f'run-{len(runs):05d}')
+                runs.append((path, write_run(sorted_records(buffer, partitions), partitions, path)))
+                buffer = {}
+    finally:
+        for f, mm in opened.values():
+            mm.close()
+            f.close()
+
+    memory = by_partition(sorted_records(buffer, partitions), partitions)
+    del buffer
+    streams = [combine_sorted(heapq.merge(*[read_run(path, *index[part]) for path, index in runs],
+                                          memory[part], key=itemgetter(1)), combiner)
+               for part in range(partitions)]
+    return streams, records, len(runs)
+
+def shuffle(comm, streams, spool_dir):
+    """Exchange the partition streams with Alltoallv in bounded rounds
+
+    Records are pickled in frames of SPILL_BATCH as they are pulled, and what
+    arrives from each rank is appended to its own file in spool_dir; returns
+    those paths. Every destination gets at most SHUFFLE_ROUND // size bytes a
+    round, so each rank sends and receives at most SHUFFLE_ROUND per Alltoallv
+    and no count or displacement overflows however many ranks there are.
+    """
+    size = comm.Get_size()
+    budget = max(1, SHUFFLE_ROUND // size)
+    pending = [bytearray() for _ in range(size)]
+    os.makedirs(spool_dir, exist_ok=True)
+    paths = [os.path.join(spool_dir, f'from-{i:05d}') for i in range(size)]
+    spools = [open(path, 'wb') for path in paths]
+    try:
+        while True:
+            for part, stream in enumerate(streams):
+                while stream is not None and len(pending[part]) < budget:
+                    frame = [(key, values) for _, key, values in itertools.islice(stream, SPILL_BATCH)]
+                    if not frame:
+                        streams[part] = stream = None
+                        break
+                    pending[part] += pickle.dumps(frame, pickle.HIGHEST_PROTOCOL)
+            send_counts = [min(len(p), budget) for p in pending]
+            recv_counts = comm.alltoall(send_counts)
+            send_displs = [sum(send_counts[:i]) for i in range(size)]
+            recv_displs = [sum(recv_counts[:i]) for i in range(size)]
+            send_buf = bytearray(b''.join(p[:count] for p, count in zip(pending, send_counts)))
+            recv_buf = bytearray(sum(recv_counts))
+            comm.Alltoallv([send_buf, (send_counts, send_displs), MPI.BYTE],
+                           [recv_buf, (recv_counts, recv_displs), MPI.BYTE])
+            for p, count in zip(pending, send_counts):
+                del p[:count]
+            more = any(pending) or any(stream is not None for stream in streams)
+            for i in range(size):
+                spools[i].write(memoryview(recv_buf)[recv_displs[i]:recv_displs[i] + recv_counts[i]])
+            if not comm.allreduce(int(more), op=MPI.MAX):
+                break
+    finally:
+        for f in spools:
+            f.close()
+    return paths
+
+def run_reduce(received, reducer, output_path):
+    """Merge the key-sorted frames spooled from every mapper and write reducer results in key order"""
+    lists = [read_run(path) for path in received]
+    keys = 0
+    with open(output_path, 'wb') as out:
+        for key, group in itertools.groupby(heapq.merge(*lists, key=itemgetter(0)), key=itemgetter(0)):
+            value = reducer(key, [v for _, values in group for v in values])
+            key_bytes = key if isinstance(key, bytes) else str(key).encode()
+            out.write(key_bytes + b'\t' + str(value).encode() + b'\n')
+            keys += 1
+    return keys
+
+def run_job(comm, inputs, output_dir, mapper, reducer, combiner=None):
+    """Run one MapReduce job on every rank of comm; returns per-phase timings on rank 0"""
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+    files = list_inputs(inputs)
+    splits = make_splits(files, SPLIT_SIZE)
+    input_bytes = sum(os.path.getsize(path) for path in files)
+    if rank == 0:
+        os.makedirs(output_dir, exist_ok=True)
+        print(f"[Rank 0] {len(files)} input files, {input_bytes} bytes, {len(splits)} splits over {size} ranks")
+    comm.Barrier()
+
+    timings = {}
+    start = time.perf_counter()
+    spill_dir = os.path.join(output_dir, '_spill', f'r{rank:05d}')
+    streams, records, spills = run_map(splits[rank::size], mapper, combiner, size, spill_dir)
+    timings['map'] = time.perf_counter() - start
+
+    # The map streams are merged lazily, so the shuffle time includes the final merge
+    start = time.perf_counter()
+    received = shuffle(comm, streams, os.path.join(spill_dir, 'shuffle'))
+    del streams
+    timings['shuffle'] = time.perf_counter() - start
+    shuffle_bytes = comm.reduce(sum(os.path.getsize(path) for path in received), op=MPI.SUM, root=0)
+    records = comm.reduce(records, op=MPI.SUM, root=0)
+    spills = comm.reduce(spills, op=MPI.SUM, root=0)
+
+    start = time.perf_counter()
+    keys = run_reduce(received, reducer, os.path.join(output_dir, f'part-r-{rank:05d}'))
+    timings['reduce'] = time.perf_counter() - start
+    shutil.rmtree(spill_dir, ignore_errors=True)
+
+    # A phase takes as long as its slowest rank
+    timings = {phase: comm.reduce(t, op=MPI.MAX, root=0) for phase, t in timings.items()}
+    keys = comm.reduce(keys, op=MPI.SUM, root=0)
+    if rank == 0:
+        shutil.rmtree(os.path.join(output_dir, '_spill'), ignore_errors=True)
+        total = sum(timings.values())
+        print(f"[Rank 0] map {timings['map']:.2f}s  shuffle {timings['shuffle']:.2f}s  "
+              f"reduce {timings['reduce']:.2f}s  ({shuffle_bytes} bytes shuffled, {keys} keys)")
+        print(f"[Rank 0] {records} map output records, {spills} spills")
+        print(f"[Rank 0] {input_bytes / 1e9 / (total / 60):.2f} GB/min")
+        timings.update({'input_bytes': input_bytes, 'shuffle_bytes': shuffle_bytes, 'keys': keys,
+                        'records': records, 'spills': spills})
+        return timings
+    return None
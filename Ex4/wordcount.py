@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+# wordcount.py
+# WordCount.java on the MPI MapReduce runner, no Hadoop needed:
+#   mpiexec -n 4 python wordcount.py <input file or dir> [...] <output dir>
+from mpi4py import MPI
+import sys
+from collections import Counter
+
+from mapreduce import run_job
+
+def tokenizer_map(data):
+    """TokenizerMapper with in-mapper combining: emit (word, count) once per distinct
+    word of the split instead of (word, 1) per token; Counter does the counting in C"""
+    return Counter(data.split()).items()
+
+def int_sum_reduce(key, values):
+    """IntSumReducer, also used as the combiner"""
+    return sum(values)
+
+def main():
+    comm = MPI.COMM_WORLD
+    if len(sys.argv) < 3:
+        if comm.Get_rank() == 0:
+            print("Usage: mpiexec -n <ranks> python wordcount.py <input> [<input> ...] <output_dir>")
+        sys.exit(1)
+    run_job(comm, sys.argv[1:-1], sys.argv[-1], tokenizer_map, int_sum_reduce, combiner=int_sum_reduce)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Chat latency through the relay while a large file is relayed.
+
+    mpiexec -n 4 python -m MPI_communicator.benchmark [--gb 5] [--fifo]
+
+Rank 0 runs the relay, rank 1 pushes --gb of 1 MiB file chunks through it to
+rank 2, and rank 3 pings rank 2 through the relay every PING_INTERVAL seconds;
+rank 2 answers each ping the same way. Rank 3 reports round-trip percentiles.
+--fifo runs the relay with a single lane per destination for comparison.
+"""
+import sys
+import time
+import uuid
+from mpi4py import MPI
+from .transport import MPITransport, TAG_MSG, TAG_CMD, TAG_FILE_CHUNK
+from .server import Server
+
+CHUNK_SIZE = 1024 * 1024
+PING_INTERVAL = 0.05
+ROLES = {1: 'bulk', 2: 'sink', 3: 'pinger'}
+
+def chat(transport: MPITransport, from_user: str, to_user: str, content: str):
+    msg = {
+        'message_id': str(uuid.uuid4()),
+        'from_user': from_user,
+        'to_user': to_user,
+        'content': content,
+        'message_type': 'text',
+        'timestamp': time.time()
+    }
+    transport.send(msg, 0, TAG_MSG)
+
+def join(transport: MPITransport, user_id: str):
+    """Join and wait until every benchmark role is online"""
+    transport.send({'type': 'JOIN', 'user': {'user_id': user_id, 'display_name': user_id}}, 0, TAG_CMD)
+    while True:
+        data, _, tag = transport.receive()
+        if tag == TAG_CMD and data['type'] == 'USER_LIST_UPDATE' and len(data['users']) > len(ROLES):
+            return
+
+def run_bulk(transport: MPITransport, total_bytes: int):
+    join(transport, 'bulk')
+    payload = bytes(CHUNK_SIZE)
+    total_chunks = total_bytes // CHUNK_SIZE
+    start = time.perf_counter()
+    for i in range(total_chunks):
+        chunk = {
+            'file_id': 'bench',
+            'filename': 'bench.bin',
+            'chunk_index': i,
+            'total_chunks': total_chunks,
+            'data': payload,
+            'to_user': 'sink'
+        }
+        transport.send(chunk, 0, TAG_FILE_CHUNK)
+    elapsed = time.perf_counter() - start
+    print(f"[bulk] Relayed {total_bytes / 1e9:.1f} GB in {elapsed:.1f} s ({total_bytes / 1e6 / elapsed:.0f} MB/s)")
+    chat(transport, 'bulk', 'pinger', 'bulk done')
+
+def run_sink(transport: MPITransport):
+    join(transport, 'sink')
+    received = 0
+    while True:
+        probe = transport.next_message()
+        if probe is None:
+            time.sleep(0.001)
+            continue
+        data, _, tag = transport.receive(*probe)
+        if tag == TAG_FILE_CHUNK:
+            received += len(data['data'])
+        elif tag == TAG_MSG and data['content'].startswith('ping'):
+            chat(transport, 'sink', 'pinger', data['content'].replace('ping', 'pong', 1))
+        elif tag == TAG_MSG and data['content'] == 'done':
+            print(f"[sink] Received {received / 1e9:.1f} GB of chunks")
+            return
+
+def run_pinger(transport: MPITransport):
+    join(transport, 'pinger')
+    rtts = []
+    next_ping = time.time()
+    sent = 0
+    while True:
+        now = time.time()
+        if now >= next_ping:
+            chat(transport, 'pinger', 'sink', f'ping {sent} {now}')
+            sent += 1
+            next_ping = now + PING_INTERVAL
+        probe = transport.probe(tag=TAG_MSG)
+        if probe is None:
+            time.sleep(0.001)
+            continue
+        data, _, _ = transport.receive(*probe)
+        if data['content'].startswith('pong'):
+            rtts.append(time.time() - float(data['content'].split()[2]))
+        elif data['content'] == 'bulk done':
+            break
+
+    chat(transport, 'pinger', 'sink', 'done')
+    time.sleep(0.5)  # Let the relay deliver 'done' before it stops
+    transport.send({'type': 'SHUTDOWN'}, 0, TAG_CMD)
+    rtts.sort()
+    if not rtts:
+        print("[pinger] No pongs received")
+        return
+    pct = lambda p: rtts[min(len(rtts) - 1, int(p / 100 * len(rtts)))] * 1000
+    print(f"[pinger] {len(rtts)}/{sent} pings answered, RTT ms: "
+          f"p50 {pct(50):.1f}  p99 {pct(99):.1f}  max {rtts[-1] * 1000:.1f}")
+
+def main():
+    comm = MPI.COMM_WORLD
+    rank = comm.Get_rank()
+    if comm.Get_size() != len(ROLES) + 1:
+        if rank == 0:
+            print(f"Run with exactly {len(ROLES) + 1} processes")
+        return
+    gb = float(sys.argv[sys.argv.index('--gb') + 1]) if '--gb' in sys.argv else 5.0
+    transport = MPITransport(comm)
+
+    if rank == 0:
+        Server(transport, prioritize='--fifo' not in sys.argv).start()
+    elif ROLES[rank] == 'bulk':
+        run_bulk(transport, int(gb * 1e9))
+    elif ROLES[rank] == 'sink':
+        run_sink(transport)
+    else:
+        run_pinger(transport)
+
+if __name__ == "__main__":
+    main()
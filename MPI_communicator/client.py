@@ -1,10 +1,47 @@
+import itertools
+import os
+import queue
 import threading
 import time
 import sys
 import uuid
-from .transport import MPITransport, TAG_MSG, TAG_CMD
+from collections import deque
+from operator import itemgetter
+from .transport import MPITransport, TAG_MSG, TAG_CMD, TAG_FILE_REQ, TAG_FILE_META, TAG_FILE_CHUNK, TAG_FILE_CREDIT, rma_tag
 from .models import Message, MessageType, User
 
+try:
+    import readline  # Lets a frame redraw the half-typed input line
+except ImportError:  # Windows
+    readline = None
+
+RENDER_INTERVAL = 0.05  # Seconds between terminal frames
+RENDER_MAX_LINES = 40  # Messages drawn per frame; older ones in a flood are summarized
+WRITE_QUEUE_CHUNKS = 64  # Received chunks waiting for the disk writer before the listen loop blocks
+WRITE_BATCH = 16  # Chunks gathered into one writev
+
+# Multicast: the file goes down a chain of receivers, each forwarding what it has stored to the next
+MULTICAST_CHUNK = 1024 * 1024
+MULTICAST_WINDOW = 32  # Chunks a hop may hold unacknowledged before its upstream waits
+HOP_TIMEOUT = 10.0  # Seconds without progress before a hop is routed around
+MULTICAST_ACCEPT_TIMEOUT = 60.0  # Seconds to wait for /accept answers before starting the chain
+
+def write_all(fd: int, buffers: list) -> None:
+    """Write every buffer to fd, with one writev call where the OS has it"""
+    if not hasattr(os, 'writev'):  # Windows
+        data = memoryview(b''.join(buffers))
+        while data:
+            data = data[os.write(fd, data):]
+        return
+    views = [memoryview(b) for b in buffers]
+    while views:
+        written = os.writev(fd, views)
+        while views and written >= len(views[0]):
+            written -= len(views[0])
+            views.pop(0)
+        if views:
+            views[0] = views[0][written:]
+
 class ChatClient:
     def __init__(self, transport: MPITransport, user_id: str):
         self.transport = transport
@@ -15,8 +52,18 @@ class ChatClient:
         self.online_users = []
         self.recv_thread = threading.Thread(target=self.listen_loop, daemon=True)
         
+        # Only render_loop writes incoming output to the terminal, one write per frame
+        self.pending_lines = deque()
+        self.render_thread = threading.Thread(target=self.render_loop, daemon=True)
+        
+        # Write-behind: the listen loop only enqueues received chunks, write_loop does the disk I/O
+        self.write_queue = queue.Queue(maxsize=WRITE_QUEUE_CHUNKS)
+        self.write_thread = threading.Thread(target=self.write_loop, daemon=True)
+        self.download_stats = {}  # path -> {'peak_depth', 'writes'}
+        self.multicasts = {}  # file_id -> chain state, see _multicast_state
+        
         # Handshake State
-        self.active_transfers = {} # file_id -> {filepath, to_rank, use_p2p, ...}
+        self.active_transfers = {} # file_id -> {filepath, to_rank, use_p2p, use_rma, ...}
         self.pending_offers = {}   # from_rank -> {file_id, filename, size, ...}
 
     def login(self):
@@ -30,6 +77,8 @@ class ChatClient:
         self.transport.send(join_cmd, 0, TAG_CMD)
         self.running = True
         self.recv_thread.start()
+        self.write_thread.start()
+        self.render_thread.start()
         print(f"[Client] Logged in as {self.params['display_name']} (Rank {self.rank})")
 
     def send_message(self, content: str, to_user: str = 'all', use_p2p: bool = False):
@@ -45,7 +94,7 @@ class ChatClient:
         # P2P Logic for DMs
         if use_p2p and to_user != 'all':
             target_rank = next((u['rank'] for u in self.online_users if u['user_id'] == to_user), None)
-            if target_rank:
+            if target_rank and self.transport.reaches(target_rank):
                 try:
                     self.transport.send(msg, target_rank, TAG_MSG)
                     return
@@ -57,22 +106,86 @@ class ChatClient:
     def listen_loop(self):
         while self.running:
             try:
-                if self.transport.check_msg():
-                    data, source, tag = self.transport.receive()
+                probe = self.transport.next_message()
+                if probe:
+                    data, source, tag = self.transport.receive(*probe)
                     self.handle_incoming(data, source, tag)
                 else:
                     time.sleep(0.01)
             except Exception as e:
-                print(f"[Client Error] {e}")
+                self._safe_print(f"[Client Error] {e}")
                 break
 
+    def write_loop(self):
+        """Append queued chunks to their files, batching whatever has piled up into one writev"""
+        files = {}  # path -> fd, open until the file's last chunk
+        while True:
+            batch = [self.write_queue.get()]
+            while len(batch) < WRITE_BATCH:
+                try:
+                    batch.append(self.write_queue.get_nowait())
+                except queue.Empty:
+                    break
+            for path, group in itertools.groupby(batch, key=itemgetter(0)):
+                group = list(group)
+                try:
+                    if path not in files:
+                        files[path] = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, 'O_BINARY', 0), 0o644)
+                    write_all(files[path], [data for _, data, _, _ in group])
+                    stats = self.download_stats.setdefault(path, {'peak_depth': 0, 'writes': 0})
+                    stats['writes'] += 1
+                    state = self.multicasts.get(group[0][3])
+                    if state:
+                        self._stored(state, sum(len(data) for _, data, _, _ in group))
+                    if group[-1][2]:
+                        start = time.perf_counter()
+                        os.fsync(files[path])
+                        fsync_ms = (time.perf_counter() - start) * 1000
+                        os.close(files.pop(path))
+                        stats = self.download_stats.pop(path)
+                        self._safe_print(f"File '{os.path.basename(path)}' download complete (saved to downloads/). "
+                                         f"Write queue peak {stats['peak_depth']}/{WRITE_QUEUE_CHUNKS} chunks, "
+                                         f"{stats['writes']} writes, fsync {fsync_ms:.1f} ms.")
+                except OSError as e:
+                    self._safe_print(f"[Write Error] {path}: {e}")
+                    if path in files:
+                        os.close(files.pop(path))
+                finally:
+                    for _ in group:
+                        self.write_queue.task_done()
+
     def _safe_print(self, msg):
-        sys.stdout.write('\r' + msg + '\n')
-        sys.stdout.write('You: ')
+        """Queue a message for the next frame; safe to call from any thread"""
+        self.pending_lines.append(msg)
+
+    def render_loop(self):
+        while True:
+            time.sleep(RENDER_INTERVAL)
+            self.render_frame()
+
+    def render_frame(self):
+        """Draw everything queued since the last frame with one write, then the prompt"""
+        messages = []
+        while self.pending_lines:
+            messages.append(self.pending_lines.popleft())
+        if not messages:
+            return
+        skipped = len(messages) - RENDER_MAX_LINES
+        if skipped > 0:
+            messages = [f"... +{skipped} more messages"] + messages[-RENDER_MAX_LINES:]
+        if readline:
+            # Clear the prompt line, then put it back with whatever was typed so far
+            sys.stdout.write('\r\x1b[K' + '\n'.join(messages) + '\nYou: ' + readline.get_line_buffer())
+        else:
+            sys.stdout.write('\r' + '\n'.join(messages) + '\nYou: ')
         sys.stdout.flush()
 
-    def send_file(self, filepath: str, to_rank: int, use_p2p: bool = False):
-        """Initiates file transfer by sending a Request (REQ)"""
+    def send_file(self, filepath: str, to_rank: int, use_p2p: bool = False, use_rma: bool = False):
+        """Initiates file transfer by sending a Request (REQ)
+
+        use_rma asks the receiver for a one-sided transfer: it exposes the
+        destination file as an MPI window and the chunks are Put straight into it.
+        """
         import os
         if not os.path.exists(filepath):
             self._safe_print(f"File not found: {filepath}")
@@ -86,13 +199,23 @@ class ChatClient:
             self._safe_print(f"Rank {to_rank} not found online.")
             return
 
+        if (use_p2p or use_rma) and not self.transport.reaches(to_rank):
+            self._safe_print(f"Rank {to_rank} is not directly reachable (one of you joined later); relaying through the server.")
+            use_p2p = use_rma = False
+        elif use_rma and not self.transport.supports_rma():
+            # The receiver checks its own side before exposing a window; this side has to Put into it
+            self._safe_print("RMA is unavailable on this communicator; sending P2P chunks instead.")
+            use_p2p, use_rma = True, False
+
         file_id = str(uuid.uuid4())
+        use_p2p = use_p2p or use_rma  # RMA is direct; if refused it falls back to P2P chunks
         
         # Store state for when ACK comes back
         self.active_transfers[file_id] = {
             'filepath': filepath,
             'to_rank': to_rank,
             'use_p2p': use_p2p,
+            'use_rma': use_rma,
             'target_id': target_id,
             'filename': filename,
             'filesize': file_size
@@ -110,6 +233,8 @@ class ChatClient:
             'to_user': target_id,
             'from_rank': self.rank # Helpful for receiver
         }
+        if use_rma and file_size > 0:
+            meta['rma_tag'] = rma_tag(file_id)
         
         try:
             self.transport.send(meta, dest_rank, tag_req)
@@ -149,15 +274,13 @@ class ChatClient:
 
             # 2. Send Chunks
             CHUNK_SIZE = 1024 * 1024 
-            chunk_idx = 0
-            total_chunks = (file_size // CHUNK_SIZE) + 1
+            # The receiver closes the file on chunk total_chunks - 1, so that chunk must exist:
+            # an exact multiple of CHUNK_SIZE has no short tail, an empty file is one empty chunk
+            total_chunks = max(1, -(-file_size // CHUNK_SIZE))
             
             with open(filepath, 'rb') as f:
-                while True:
+                for chunk_idx in range(total_chunks):
                     data = f.read(CHUNK_SIZE)
-                    if not data:
-                        break
-                    
                     chunk = {
                         'file_id': file_id,
                         'filename': filename,
@@ -167,7 +290,6 @@ class ChatClient:
                         'to_user': target_id 
                     }
                     self.transport.send(chunk, dest_rank, tag_chunk)
-                    chunk_idx += 1
                     time.sleep(0.001)
                     
             self._safe_print(f"File {filename} sent.")
@@ -180,6 +302,201 @@ class ChatClient:
             else:
                 self._safe_print(f"Upload failed: {e}")
 
+    def send_multicast(self, filepath: str, ranks: list):
+        """Offer one file to many ranks; those that accept get it down a pipeline chain,
+        so it costs about one file time plus one chunk per hop instead of one upload each"""
+        if not os.path.exists(filepath):
+            self._safe_print(f"File not found: {filepath}")
+            return
+        # Rank 0 is listed as the server's 'System' user; it never answers an offer
+        online = {u['rank']: u['user_id'] for u in self.online_users if u['rank'] != 0}
+        ranks = {r for r in ranks if r in online and r != self.rank}
+        unreachable = sorted(r for r in ranks if not self.transport.reaches(r))
+        if unreachable:
+            # Chain hops send to each other directly
+            self._safe_print(f"Skipping ranks {unreachable}: not directly reachable, use /send <path> <rank> for each.")
+        ranks = sorted(ranks - set(unreachable))
+        if not ranks:
+            self._safe_print("None of those ranks are online and directly reachable.")
+            return
+
+        file_id = str(uuid.uuid4())
+        filename = os.path.basename(filepath)
+        file_size = os.path.getsize(filepath)
+        info = {'multicast': True, 'filename': filename, 'pending': set(ranks), 'accepted': []}
+        self.active_transfers[file_id] = info
+        for rank in ranks:
+            meta = {
+                'file_id': file_id,
+                'filename': filename,
+                'size': file_size,
+                'from_user': self.user_id,
+                'to_user': online[rank],
+                'from_rank': self.rank,
+                'multicast': len(ranks)
+            }
+            self.transport.send(meta, rank, TAG_FILE_REQ)
+        self._safe_print(f"Sent request for '{filename}' to {len(ranks)} ranks. Waiting for approval...")
+
+        deadline = time.time() + MULTICAST_ACCEPT_TIMEOUT
+        while info['pending'] and time.time() < deadline:
+            # Ranks that left will never answer; stop waiting once only they are left
+            if not info['pending'] & {u['rank'] for u in self.online_users}:
+                break
+            time.sleep(0.1)
+        del self.active_transfers[file_id]
+        chain = sorted(info['accepted'])  # Neighbouring ranks are usually on the same host
+        if not chain:
+            self._safe_print(f"Nobody accepted '{filename}'.")
+            return
+
+        state = self._multicast_state(file_id, filename, file_size, filepath, chain, None)
+        state['received'] = state['stored'] = file_size
+        self._safe_print(f"[Multicast] Sending {filename} down the chain {' -> '.join(map(str, chain))}...")
+        start = time.perf_counter()
+        if self._forward_multicast(state):
+            elapsed = time.perf_counter() - start
+            self._safe_print(f"File {filename} stored by Rank {state['chain'][0]}, which forwards it down the chain "
+                             f"({file_size / 1e6 / max(elapsed, 1e-9):.0f} MB/s from here).")
+        else:
+            self._safe_print(f"[Multicast Failed]: no hop of the chain is reachable.")
+
+    def _multicast_state(self, file_id, filename, size, path, chain, upstream):
+        state = {
+            'file_id': file_id,
+            'filename': filename,
+            'size': size,
+            'path': path,               # Read from here when forwarding
+            'chain': list(chain),       # Ranks after this one, next hop first
+            'upstream': upstream,       # Rank our chunks come from; gets our credits
+            'received': 0,              # Bytes queued for the disk writer
+            'stored': 0,                # Bytes on disk, safe to forward
+            'downstream': None,         # Current next hop
+            'acked': -1,                # Bytes the next hop has stored (-1: not yet answered)
+            'cond': threading.Condition()
+        }
+        self.multicasts[file_id] = state
+        return state
+
+    def _join_multicast(self, meta, source):
+        """META from an upstream hop: start (or resume) receiving, reply with the bytes we have"""
+        state = self.multicasts.get(meta['file_id'])
+        if state is None:
+            os.makedirs("downloads", exist_ok=True)
+            path = os.path.join("downloads", meta['filename'])
+            open(path, 'wb').close()
+            state = self._multicast_state(meta['file_id'], meta['filename'], meta['size'], path, meta['chain'], source)
+            self._safe_print(f"Incoming file '{meta['filename']}' from {meta['from_user']} (multicast)...")
+            if state['chain']:
+                threading.Thread(target=self._forward_multicast, args=(state,), daemon=True).start()
+        else:
+            state['upstream'] = source  # Our previous upstream was routed around
+        self.transport.send({'file_id': meta['file_id'], 'have': state['received']}, source, TAG_FILE_CREDIT)
+
+    def _stored(self, state, nbytes):
+        """Writer thread: nbytes more of a multicast file are on disk; tell both neighbours"""
+        with state['cond']:
+            state['stored'] += nbytes
+            state['cond'].notify_all()
+        if state['upstream'] is not None:
+            self.transport.send({'file_id': state['file_id'], 'have': state['stored']}, state['upstream'], TAG_FILE_CREDIT)
+
+    def _send_hop(self, data, hop, tag) -> bool:
+        """Send without blocking forever on a dead hop"""
+        request = self.transport.isend(data, hop, tag)
+        deadline = time.time() + HOP_TIMEOUT
+        while request is not None:
+            if request.Test():
+                return True
+            if time.time() > deadline:
+                return False
+            time.sleep(0.0005)
+        return False
+
+    def _open_hop(self, state, hop):
+        """Announce the file to hop; returns the offset it wants data from, or None if it is gone"""
+        if hop not in {u['rank'] for u in self.online_users}:
+            return None
+        cond = state['cond']
+        with cond:
+            state['downstream'] = hop
+            state['acked'] = -1
+        meta = {
+            'multicast': True,
+            'file_id': state['file_id'],
+            'filename': state['filename'],
+            'size': state['size'],
+            'chain': state['chain'][1:],
+            'from_user': self.user_id
+        }
+        if not self._send_hop(meta, hop, TAG_FILE_META):
+            return None
+        with cond:
+            if not cond.wait_for(lambda: state['acked'] >= 0, timeout=HOP_TIMEOUT):
+                return None
+            return state['acked']
+
+    def _forward_multicast(self, state) -> bool:
+        """Stream the stored part of the file to the next hop, at most MULTICAST_WINDOW chunks ahead
+        of its credits; a hop that stalls for HOP_TIMEOUT is dropped and the next one resumes"""
+        chain = state['chain']
+        cond = state['cond']
+        with open(state['path'], 'rb') as f:
+            while chain:
+                hop = chain[0]
+                offset = self._open_hop(state, hop)
+                while offset is not None and offset < state['size']:
+                    with cond:
+                        cond.wait_for(lambda: state['stored'] > offset)  # Our own upstream's pace
+                        in_window = cond.wait_for(lambda: offset - state['acked'] < MULTICAST_WINDOW * MULTICAST_CHUNK,
+                                                  timeout=HOP_TIMEOUT)
+                        available = state['stored'] - offset
+                    if not in_window:
+                        break
+                    f.seek(offset)
+                    chunk = {
+                        'multicast': True,
+                        'file_id': state['file_id'],
+                        'filename': state['filename'],
+                        'offset': offset,
+                        'data': f.read(min(MULTICAST_CHUNK, available))
+                    }
+                    if not self._send_hop(chunk, hop, TAG_FILE_CHUNK):
+                        break
+                    offset += len(chunk['data'])
+                else:
+                    if offset is not None:
+                        with cond:
+                            if cond.wait_for(lambda: state['acked'] >= state['size'], timeout=HOP_TIMEOUT):
+                                return True
+                self._safe_print(f"[Multicast] Rank {hop} stopped responding; routing around it.")
+                chain.pop(0)
+        return False
+
+    def _perform_rma_upload(self, transfer_info, tag):
+        """Put the file into the receiver's window (Called after an ACK with rma)"""
+        filename = transfer_info['filename']
+        to_rank = transfer_info['to_rank']
+        self._safe_print(f"[RMA] Uploading {filename} to Rank {to_rank}...")
+        try:
+            start = time.perf_counter()
+            size = self.transport.put_file(transfer_info['filepath'], to_rank, tag)
+            elapsed = time.perf_counter() - start
+            self._safe_print(f"File {filename} sent ({size / 1e6 / max(elapsed, 1e-9):.0f} MB/s).")
+        except Exception as e:
+            self._safe_print(f"[RMA Failed]: {e}")
+
+    def _receive_rma(self, meta):
+        """Expose downloads/<filename> to the sender and wait for its Puts"""
+        os.makedirs("downloads", exist_ok=True)
+        path = os.path.join("downloads", meta['filename'])
+        self._safe_print(f"Incoming file '{meta['filename']}' from {meta['from_user']} (RMA)...")
+        try:
+            self.transport.receive_into_window(path, meta['size'], meta['from_rank'], meta['rma_tag'])
+            self._safe_print(f"File '{meta['filename']}' download complete (saved to downloads/).")
+        except Exception as e:
+            self._safe_print(f"[RMA Failed]: {e}")
+
     def handle_incoming(self, data, source, tag):
         if tag == TAG_MSG:
             msg: Message = data
@@ -203,6 +520,24 @@ class ChatClient:
             cmd = data
             if cmd['type'] == 'USER_LIST_UPDATE':
                 self.online_users = cmd['users']
+            elif cmd['type'] == 'QUEUE_STATS':
+                lines = ["--- Server outbound queues ---"]
+                for q in cmd['queues']:
+                    state = " (disconnected)" if q['closed'] else ""
+                    lines.append(f"Rank {q['rank']}: {q['depth']} msgs ({q['urgent']} chat/control, {q['bulk']} file), "
+                                 f"{q['bytes']} bytes queued, "
+                                 f"peak {q['high_water']} bytes, {q['sent']} sent, {q['dropped']} dropped{state}")
+                self._safe_print("\n".join(lines))
+            elif cmd['type'] == 'SEARCH_RESULTS':
+                lines = [f"--- Search '{cmd['query']}': {cmd['total']}{'+' if cmd['more'] else ''} matches, "
+                         f"page {cmd['page'] + 1} ---"]
+                for r in cmd['results']:
+                    when = time.strftime('%Y-%m-%d %H:%M', time.localtime(r['timestamp']))
+                    prefix = "(Private) " if r['to_user'] != 'all' else ""
+                    lines.append(f"{prefix}[{r['from_user']} {when}]: {r['content']}")
+                if cmd['more']:
+                    lines.append(f"Type '/search {cmd['query']} --page {cmd['page'] + 2}' for more.")
+                self._safe_print("\n".join(lines))
         
         elif tag == 4: # TAG_FILE_REQ
             meta = data
@@ -210,25 +545,41 @@ class ChatClient:
             filename = meta['filename']
             size_mb = meta['size'] / (1024*1024)
             
+            meta['from_rank'] = from_rank
             self.pending_offers[from_rank] = meta
-            self._safe_print(f"\n[Request] Rank {from_rank} wants to send '{filename}' ({size_mb:.2f} MB).")
+            mode_str = " via RMA" if 'rma_tag' in meta else ""
+            if meta.get('multicast'):
+                mode_str = f" to {meta['multicast']} ranks as a chain"
+            self._safe_print(f"\n[Request] Rank {from_rank} wants to send '{filename}' ({size_mb:.2f} MB){mode_str}.")
             self._safe_print(f"Type '/accept {from_rank}' to receive or '/deny {from_rank}' to reject.")
 
         elif tag == 5: # TAG_FILE_ACK
             ack = data
             file_id = ack['file_id']
-            if file_id in self.active_transfers:
+            if self.active_transfers.get(file_id, {}).get('multicast'):
+                info = self.active_transfers[file_id]
+                info['pending'].discard(ack['from_rank'])
+                info['accepted'].append(ack['from_rank'])
+            elif file_id in self.active_transfers:
                 transfer_info = self.active_transfers.pop(file_id)
                 self._safe_print(f"Request accepted by receiver. Starting upload...")
-                threading.Thread(target=self._perform_upload, args=(transfer_info,)).start()
+                if ack.get('rma_tag') is not None:
+                    threading.Thread(target=self._perform_rma_upload, args=(transfer_info, ack['rma_tag'])).start()
+                else:
+                    threading.Thread(target=self._perform_upload, args=(transfer_info,)).start()
 
         elif tag == 6: # TAG_FILE_DENY
             deny = data
             file_id = deny['file_id']
-            if file_id in self.active_transfers:
+            if self.active_transfers.get(file_id, {}).get('multicast'):
+                self.active_transfers[file_id]['pending'].discard(deny['from_rank'])
+            elif file_id in self.active_transfers:
                 info = self.active_transfers.pop(file_id)
                 self._safe_print(f"Request for '{info['filename']}' was DENIED by receiver.")
 
+        elif tag == 2 and data.get('multicast'):
+            self._join_multicast(data, source)
+
         elif tag == 2: 
             meta = data
             filename = meta['filename']
@@ -236,25 +587,48 @@ class ChatClient:
             self._safe_print(f"Incoming file '{filename}' from {sender}...")
             
         elif tag == 3: 
-            import os
             chunk = data
             filename = chunk['filename']
             file_data = chunk['data']
+            file_id = None
             
-            os.makedirs("downloads", exist_ok=True)
-            path = os.path.join("downloads", filename)
+            if chunk.get('multicast'):
+                state = self.multicasts.get(chunk['file_id'])
+                if state is None:
+                    return
+                offset, received = chunk['offset'], state['received']
+                if offset > received or offset + len(file_data) <= received:
+                    return  # Already have it: resent by a new upstream after a reroute
+                if offset < received:
+                    file_data = file_data[received - offset:]
+                state['received'] += len(file_data)
+                path, file_id = state['path'], state['file_id']
+                last = state['received'] == state['size']
+            else:
+                os.makedirs("downloads", exist_ok=True)
+                path = os.path.join("downloads", filename)
+                last = chunk['chunk_index'] == chunk['total_chunks'] - 1
             
-            with open(path, 'ab') as f:
-                f.write(file_data)
-                
-            if chunk['chunk_index'] == chunk['total_chunks'] - 1:
-                self._safe_print(f"File '{filename}' download complete (saved to downloads/).")
+            stats = self.download_stats.setdefault(path, {'peak_depth': 0, 'writes': 0})
+            stats['peak_depth'] = max(stats['peak_depth'], self.write_queue.qsize() + 1)
+            # Blocks only when the writer is WRITE_QUEUE_CHUNKS behind
+            self.write_queue.put((path, file_data, last, file_id))
+
+        elif tag == TAG_FILE_CREDIT:
+            state = self.multicasts.get(data['file_id'])
+            if state and source == state['downstream']:
+                with state['cond']:
+                    state['acked'] = data['have']
+                    state['cond'].notify_all()
 
     def start_input_loop(self):
         print("Type a message and press Enter. Type '/quit' to exit.")
         print("Type '/users' to list online users.")
         print("Type '/dm <rank> <msg>' to send a direct message.")
-        print("Type '/send <path> <rank>' to send a file.")
+        print("Type '/send <path> <rank> [--mode p2p|rma]' to send a file.")
+        print("Type '/send <path> all' or '/send <path> <rank>,<rank>,...' to send a file to many ranks.")
+        print("Type '/queues' to see the server's per-user outbound queues.")
+        print("Type '/search <words> [--page N]' to search the chat history.")
         
         sys.stdout.write("You: ")
         sys.stdout.flush()
@@ -280,13 +654,36 @@ class ChatClient:
                     
                     continue
                     
+                if inp.strip() == '/queues':
+                    self.transport.send({'type': 'QUEUE_STATS'}, 0, TAG_CMD)
+                    continue
+
+                if inp.startswith('/search '):
+                    parts = inp.split()[1:]
+                    page = 1
+                    if "--page" in parts:
+                        idx = parts.index("--page")
+                        try:
+                            page = int(parts[idx + 1])
+                        except (IndexError, ValueError):
+                            print("Usage: /search <words> [--page N]")
+                            continue
+                        del parts[idx:idx + 2]
+                    self.transport.send({'type': 'SEARCH', 'query': " ".join(parts), 'page': page - 1}, 0, TAG_CMD)
+                    continue
+
                 if inp.startswith('/accept '):
                     try:
                         rank = int(inp.split(' ')[1])
                         if rank in self.pending_offers:
                             meta = self.pending_offers.pop(rank)
-                            ack_msg = {'file_id': meta['file_id']}
+                            ack_msg = {'file_id': meta['file_id'], 'from_rank': self.rank}
                             ack_msg['to_user'] = meta['from_user'] # Needed for Server routing
+                            use_rma = 'rma_tag' in meta and self.transport.supports_rma() and self.transport.reaches(rank)
+                            if use_rma:
+                                ack_msg['rma_tag'] = meta['rma_tag']
+                                # Start exposing the window first; the sender joins it when the ACK arrives
+                                threading.Thread(target=self._receive_rma, args=(meta,), daemon=True).start()
                             self.transport.send(ack_msg, 0, 5) # TAG_FILE_ACK
                             self._safe_print(f"Accepted file from Rank {rank}.")
                         else:
@@ -300,7 +697,7 @@ class ChatClient:
                         rank = int(inp.split(' ')[1])
                         if rank in self.pending_offers:
                             meta = self.pending_offers.pop(rank)
-                            deny_msg = {'file_id': meta['file_id'], 'to_user': meta['from_user']}
+                            deny_msg = {'file_id': meta['file_id'], 'to_user': meta['from_user'], 'from_rank': self.rank}
                             self.transport.send(deny_msg, 0, 6) # TAG_FILE_DENY
                             self._safe_print(f"Denied file from Rank {rank}.")
                         else:
@@ -342,16 +739,26 @@ class ChatClient:
                     if len(parts) >= 3:
                         filepath = parts[1]
                         try:
+                            if parts[2] == 'all' or ',' in parts[2]:
+                                if parts[2] == 'all':
+                                    ranks = [u['rank'] for u in self.online_users]
+                                else:
+                                    ranks = [int(r) for r in parts[2].split(',') if r]
+                                threading.Thread(target=self.send_multicast, args=(filepath, ranks)).start()
+                                continue
                             rank = int(parts[2])
                             use_p2p = False
+                            use_rma = False
                             if "--mode" in parts and "p2p" in parts:
                                 use_p2p = True
+                            if "--mode" in parts and "rma" in parts:
+                                use_rma = True
                             
-                            threading.Thread(target=self.send_file, args=(filepath, rank, use_p2p)).start()
+                            threading.Thread(target=self.send_file, args=(filepath, rank, use_p2p, use_rma)).start()
                         except ValueError:
                              print("Invalid rank.")
                     else:
-                        print("Usage: /send <filepath> <rank> [--mode p2p]")
+                        print("Usage: /send <filepath> <rank>|<rank>,<rank>,...|all [--mode p2p|rma]")
                     continue
 
                 self.send_message(inp)
@@ -359,4 +766,6 @@ class ChatClient:
                 break
             except Exception as e:
                 print(f"Input Error: {e}")
+        self.render_frame()
+        self.write_queue.join()  # Don't lose chunks still waiting for the disk
         self.transport.close()
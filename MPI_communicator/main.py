@@ -1,23 +1,49 @@
 import sys
 from mpi4py import MPI
-from .transport import MPITransport
+from .transport import MPITransport, PORT_FILE
 from .server import Server
 from .client import ChatClient
+from .metrics import start_profiler
 import uuid
 
+def option(name: str, default=None):
+    return sys.argv[sys.argv.index(name) + 1] if name in sys.argv else default
+
+def optional_value(name: str, default: str) -> str:
+    """Argument of a flag that may be given alone, as in `--join` or `--join ports.txt`"""
+    i = sys.argv.index(name) + 1
+    return sys.argv[i] if i < len(sys.argv) and not sys.argv[i].startswith('--') else default
+
 def main():
-    comm = MPI.COMM_WORLD
-    rank = comm.Get_rank()
-    size = comm.Get_size()
+    # --join [port file] attaches this process to a running server started with --elastic
+    if '--join' in sys.argv:
+        transport = MPITransport.join(optional_value('--join', PORT_FILE))
+    else:
+        transport = MPITransport(MPI.COMM_WORLD)
+    rank = transport.get_rank()
+    size = transport.size
+    
+    # --profile cprofile|sample writes profile_rank<N>.* at exit
+    if option('--profile'):
+        start_profiler(option('--profile'), rank)
     
-    transport = MPITransport(comm)
+    # Metrics go to metrics_rank<N>.json on SIGUSR1 and, with --metrics-interval, periodically
+    metrics_path = f"metrics_rank{rank}.json"
+    transport.metrics.dump_on_signal(metrics_path)
+    if option('--metrics-interval'):
+        transport.metrics.dump_every(metrics_path, float(option('--metrics-interval')))
     
     if rank == 0:
         print("==========================================")
         print(f"Starting MPI Chat Server on Rank {rank}")
         print(f"Total Processes: {size}")
         print("==========================================")
-        server = Server(transport)
+        # --elastic [port file] lets clients join later with --join
+        if '--elastic' in sys.argv:
+            port_file = optional_value('--elastic', PORT_FILE)
+            transport.listen(port_file)
+            print(f"Accepting new clients: python -m MPI_communicator.main --join {port_file}")
+        server = Server(transport, verbose='--verbose' in sys.argv)
         try:
             server.start()
         except KeyboardInterrupt:
@@ -0,0 +1,189 @@
+import atexit
+import cProfile
+import json
+import os
+import pickle
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Optional
+
+HISTOGRAM_BUCKETS = 40  # log2 microsecond buckets, up to ~6 days
+SAMPLE_INTERVAL = 0.005  # Seconds between stack samples in 'sample' profiling mode
+
+class Histogram:
+    """Log2-bucketed histogram of durations: bucket i counts values below 2**i microseconds"""
+
+    def __init__(self):
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.buckets[min(int(seconds * 1e6).bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p: float) -> float:
+        """Upper bound of the bucket holding the p-th percentile, in seconds"""
+        target = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= target:
+                return min((2 ** i) / 1e6, self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.percentile(50) * 1000,
+            'p99_ms': self.percentile(99) * 1000,
+            'max_ms': self.max * 1000
+        }
+
+class Metrics:
+    """Per-rank counters and histograms for the transport and relay.
+
+    Updates take one lock and a few arithmetic operations, so they stay on
+    in normal runs. snapshot() returns plain dicts ready for json.dump.
+    """
+
+    def __init__(self, rank: int, tag_names: Optional[dict] = None):
+        self.rank = rank
+        self.tag_names = tag_names or {}
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.sent_messages = Counter()
+        self.sent_bytes = Counter()
+        self.received_messages = Counter()
+        self.received_bytes = Counter()
+        self.histograms: dict[str, Histogram] = {}
+        self.extra: dict[str, Callable[[], Any]] = {}  # Name -> callable adding live state to snapshots
+        self._local = threading.local()  # Size of the last message (de)serialized on this thread
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def count_sent(self, tag: int) -> None:
+        size = getattr(self._local, 'size', 0)
+        with self.lock:
+            self.sent_messages[tag] += 1
+            self.sent_bytes[tag] += size
+
+    def count_received(self, tag: int) -> None:
+        size = getattr(self._local, 'size', 0)
+        with self.lock:
+            self.received_messages[tag] += 1
+            self.received_bytes[tag] += size
+
+    def install_pickle_timing(self, mpi) -> bool:
+        """Route mpi4py's pickling through timed wrappers; False if this mpi4py has no hook"""
+        local = self._local
+
+        def dumps(obj, *args, **kwargs):
+            start = time.perf_counter()
+            data = pickle.dumps(obj, *args, **kwargs)
+            self.observe('serialize_s', time.perf_counter() - start)
+            local.size = len(data)
+            return data
+
+        def loads(data, *args, **kwargs):
+            start = time.perf_counter()
+            obj = pickle.loads(data, *args, **kwargs)
+            self.observe('deserialize_s', time.perf_counter() - start)
+            local.size = len(data)
+            return obj
+
+        try:
+            mpi.pickle.__init__(dumps, loads)
+        except (AttributeError, TypeError):
+            return False
+        return True
+
+    def snapshot(self) -> dict:
+        name = lambda tag: self.tag_names.get(tag, str(tag))
+        with self.lock:
+            data = {
+                'rank': self.rank,
+                'time': time.time(),
+                'uptime_s': time.time() - self.started,
+                'sent': {name(t): {'messages': n, 'bytes': self.sent_bytes[t]} for t, n in self.sent_messages.items()},
+                'received': {name(t): {'messages': n, 'bytes': self.received_bytes[t]}
+                             for t, n in self.received_messages.items()},
+                'histograms': {k: h.snapshot() for k, h in self.histograms.items()}
+            }
+        for key, source in self.extra.items():
+            data[key] = source()
+        return data
+
+    def dump(self, path: str) -> None:
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def dump_on_signal(self, path: str, signum: Optional[int] = None) -> bool:
+        """Write a snapshot to path whenever the process gets SIGUSR1 (not available on Windows)"""
+        signum = signum if signum is not None else getattr(signal, 'SIGUSR1', None)
+        if signum is None or threading.current_thread() is not threading.main_thread():
+            return False
+        signal.signal(signum, lambda *_: self.dump(path))
+        return True
+
+    def dump_every(self, path: str, interval: float) -> threading.Thread:
+        """Write a snapshot to path every interval seconds from a daemon thread"""
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.dump(path)
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+        return thread
+
+def start_profiler(mode: str, rank: int) -> None:
+    """Opt-in per-rank profiling, written at exit to profile_rank<N>.prof / .txt
+
+    'cprofile' traces every call on the main thread (view with pstats or snakeviz);
+    'sample' records the innermost frame of every thread each SAMPLE_INTERVAL,
+    which costs far less and also covers the receive and upload threads.
+    """
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        def save():
+            profiler.disable()
+            profiler.dump_stats(f'profile_rank{rank}.prof')
+        atexit.register(save)
+    elif mode == 'sample':
+        samples = Counter()
+
+        def sample():
+            me = threading.get_ident()
+            while True:
+                time.sleep(SAMPLE_INTERVAL)
+                for ident, frame in sys._current_frames().items():
+                    if ident != me:
+                        code = frame.f_code
+                        samples[f"{code.co_filename}:{frame.f_lineno} {code.co_name}"] += 1
+
+        def save():
+            counts = Counter(dict(samples))  # Copy first: the sampler thread may still be running
+            total = sum(counts.values()) or 1
+            with open(f'profile_rank{rank}.txt', 'w') as f:
+                for where, n in counts.most_common(50):
+                    f.write(f"{n / total * 100:6.2f}%  {n:8d}  {where}\n")
+        threading.Thread(target=sample, daemon=True).start()
+        atexit.register(save)
+    else:
+        raise ValueError(f"Unknown profiler {mode!r}, expected 'cprofile' or 'sample'")
@@ -0,0 +1,162 @@
+import time
+from collections import deque
+from typing import Any, Optional
+from .transport import MPITransport, TAG_MSG, BULK_TAGS
+
+MAX_QUEUE_MESSAGES = 1000
+MAX_QUEUE_BYTES = 64 * 1024 * 1024
+MAX_IN_FLIGHT = 4  # Outstanding isend requests per destination
+BULK_IN_FLIGHT = 1  # Of those, file chunks; a chat line waits behind at most this many chunks at the receiver
+BULK_RATE = None  # Optional cap on relayed file bytes per second per destination
+SLOW_CONSUMER_TIMEOUT = 30.0  # Seconds a full queue may go without a completed send
+
+def message_size(data: Any) -> int:
+    """Rough wire size of a relayed message, used for queue accounting"""
+    size = 256  # Pickled dict keys, ids and timestamps
+    if isinstance(data, dict):
+        payload = data.get('data') or data.get('content') or b''
+        size += len(payload)
+    return size
+
+class OutboundQueue:
+    """Messages waiting for one destination rank, sent with non-blocking isend.
+
+    Two lanes: control and chat go out with strict priority, file chunks
+    (BULK_TAGS) take the remaining slots, limited to BULK_IN_FLIGHT at a
+    time and optionally to BULK_RATE bytes per second.
+
+    Overflow policy: when the urgent lane is full a new chat message evicts
+    the oldest queued chat message; file chunks are always accepted, and the
+    relay pauses their sender until the queue drains (see Server.route_message).
+    A queue that stays full without completing a send for
+    SLOW_CONSUMER_TIMEOUT is reported as stalled so the relay can disconnect it.
+    """
+
+    def __init__(self, transport: MPITransport, rank: int,
+                 max_messages: int = MAX_QUEUE_MESSAGES, max_bytes: int = MAX_QUEUE_BYTES,
+                 prioritize: bool = True, bulk_rate: Optional[float] = BULK_RATE):
+        self.transport = transport
+        self.rank = rank
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.prioritize = prioritize  # False keeps one FIFO lane, for comparison runs
+        self.bulk_rate = bulk_rate
+        self.urgent = deque()     # (data, tag, size, queued_at) control and chat not yet handed to MPI
+        self.bulk = deque()       # (data, tag, size, queued_at) file chunks not yet handed to MPI
+        self.in_flight = []       # (request, size, is_bulk) isends not yet completed
+        self.bytes = 0            # Pending plus in-flight bytes
+        self.bulk_started_at = None
+        self.bulk_sent_bytes = 0  # Since bulk_started_at, for the rate cap
+        self.sent = 0
+        self.dropped = 0
+        self.high_water = 0
+        self.last_progress = time.time()
+        self.closed = False
+
+    def depth(self) -> int:
+        return len(self.urgent) + len(self.bulk) + len(self.in_flight)
+
+    def full(self) -> bool:
+        return self.depth() >= self.max_messages or self.bytes >= self.max_bytes
+
+    def below_low_water(self) -> bool:
+        """Drained enough to resume paused senders"""
+        return self.depth() < self.max_messages // 2 and self.bytes < self.max_bytes // 2
+
+    def push(self, data: Any, tag: int) -> bool:
+        """Queue a message; returns False if it was dropped"""
+        if self.closed:
+            self.dropped += 1
+            return False
+        if tag == TAG_MSG and self._chat_full() and not self._drop_oldest_chat():
+            self.dropped += 1
+            return False
+        if not self.depth():
+            self.last_progress = time.time()  # Idle time does not count as stalling
+        size = message_size(data)
+        lane = self.bulk if self.prioritize and tag in BULK_TAGS else self.urgent
+        lane.append((data, tag, size, time.time()))
+        self.bytes += size
+        self.high_water = max(self.high_water, self.bytes)
+        return True
+
+    def _chat_full(self) -> bool:
+        # With lanes, queued file chunks never cost a chat line its place
+        return len(self.urgent) >= self.max_messages if self.prioritize else self.full()
+
+    def _drop_oldest_chat(self) -> bool:
+        for i, (_, tag, size, _) in enumerate(self.urgent):
+            if tag == TAG_MSG:
+                del self.urgent[i]
+                self.bytes -= size
+                self.dropped += 1
+                return True
+        return False
+
+    def _bulk_allowed(self, now: float) -> bool:
+        if sum(1 for _, _, is_bulk in self.in_flight if is_bulk) >= BULK_IN_FLIGHT:
+            return False
+        if self.bulk_rate is None:
+            return True
+        if self.bulk_started_at is None or now - self.bulk_started_at > 1.0:
+            self.bulk_started_at, self.bulk_sent_bytes = now, 0  # Restart the one-second window
+        return self.bulk_sent_bytes <= self.bulk_rate * (now - self.bulk_started_at)
+
+    def _start(self, lane: deque, is_bulk: bool) -> None:
+        data, tag, size, queued_at = lane.popleft()
+        self.transport.metrics.observe('queue_wait_s.bulk' if is_bulk else 'queue_wait_s.urgent',
+                                       time.time() - queued_at)
+        self.in_flight.append((self.transport.isend(data, self.rank, tag), size, is_bulk))
+        if is_bulk:
+            self.bulk_sent_bytes += size
+
+    def drain(self) -> int:
+        """Reap completed sends and start queued ones, urgent lane first; returns the number completed"""
+        still_running = []
+        done = 0
+        for request, size, is_bulk in self.in_flight:
+            if request is None or request.Test():
+                self.bytes -= size
+                done += 1
+            else:
+                still_running.append((request, size, is_bulk))
+        self.in_flight = still_running
+
+        now = time.time()
+        while len(self.in_flight) < MAX_IN_FLIGHT:
+            if self.urgent:
+                self._start(self.urgent, False)
+            elif self.bulk and self._bulk_allowed(now):
+                self._start(self.bulk, True)
+            else:
+                break
+
+        if done:
+            self.sent += done
+            self.last_progress = now
+        return done
+
+    def stalled(self, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        return self.full() and now - self.last_progress > SLOW_CONSUMER_TIMEOUT
+
+    def close(self) -> None:
+        """Drop everything still pending; in-flight sends are left to complete or not"""
+        self.closed = True
+        for lane in (self.urgent, self.bulk):
+            self.dropped += len(lane)
+            self.bytes -= sum(size for _, _, size, _ in lane)
+            lane.clear()
+
+    def stats(self) -> dict:
+        return {
+            'rank': self.rank,
+            'depth': self.depth(),
+            'urgent': len(self.urgent),
+            'bulk': len(self.bulk),
+            'bytes': self.bytes,
+            'high_water': self.high_water,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'closed': self.closed
+        }
@@ -0,0 +1,201 @@
+import math
+import re
+import time
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from itertools import accumulate
+from typing import Optional
+
+BLOCK_SIZE = 128  # Postings per compressed block
+SEARCH_PAGE = 10  # Results per page
+SEARCH_CANDIDATES = 10000  # Newest matches ranked per query; older matches are not scored
+TOKEN = re.compile(r'\b\w{1,64}\b')  # Longer words are not indexed
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+def tokenize(text: str) -> list:
+    return TOKEN.findall(text.lower())
+
+class PostingList:
+    """Message numbers containing one term, in increasing order, with the term's count in each.
+
+    New postings go to an uncompressed tail of doc << 8 | count ints, which
+    SearchIndex.add appends to directly; every BLOCK_SIZE postings the tail is
+    sealed into a block of delta-encoded numbers and counts, zlib-compressed.
+    firsts/lasts keep each block's range so lookups decompress one block.
+    """
+    __slots__ = ('blocks', 'firsts', 'lasts', 'tail')
+
+    def __init__(self):
+        self.blocks = []
+        self.firsts = array('I')
+        self.lasts = array('I')
+        self.tail = []
+
+    @property
+    def df(self) -> int:
+        return len(self.blocks) * BLOCK_SIZE + len(self.tail)
+
+    def seal(self) -> int:
+        """Compress the full tail into a block; returns the bytes the block takes"""
+        docs = [p >> 8 for p in self.tail]
+        deltas = array('I', [0]) + array('I', [b - a for a, b in zip(docs, docs[1:])])
+        tfs = bytes(p & 255 for p in self.tail)
+        self.blocks.append(zlib.compress(deltas.tobytes() + tfs, 1))
+        self.firsts.append(docs[0])
+        self.lasts.append(docs[-1])
+        self.tail.clear()
+        return len(self.blocks[-1]) + self.firsts.itemsize * 2
+
+    def block(self, i: int) -> tuple:
+        """(first, offsets, tfs) of sealed block i, or of the tail when i == len(blocks);
+        its docs are first + offsets[j], left relative so decoding stays in C"""
+        if i == len(self.blocks):
+            return 0, [p >> 8 for p in self.tail], [p & 255 for p in self.tail]
+        raw = zlib.decompress(self.blocks[i])
+        deltas = array('I')
+        deltas.frombytes(raw[:BLOCK_SIZE * deltas.itemsize])
+        return self.firsts[i], list(accumulate(deltas)), raw[BLOCK_SIZE * deltas.itemsize:]
+
+    def newest_first(self):
+        """Yield (doc, tf) from the newest posting back"""
+        for i in range(len(self.blocks), -1, -1):
+            first, offsets, tfs = self.block(i)
+            for j in range(len(offsets) - 1, -1, -1):
+                yield first + offsets[j], tfs[j]
+
+    def find_block(self, doc: int) -> int:
+        """Index of the block that would hold doc (len(blocks) for the tail)"""
+        i = bisect_right(self.firsts, doc) - 1
+        if i >= 0 and doc <= self.lasts[i]:
+            return i
+        return len(self.blocks)
+
+class SearchIndex:
+    """Chat history with an incremental inverted index over it, for /search.
+
+    Messages get consecutive numbers as they are added, so posting lists are
+    append-only. Contents are kept in one bytearray log and the sender,
+    recipient, time and length in arrays, which keeps 10M messages in about
+    a gigabyte. Queries match all terms, rank the newest SEARCH_CANDIDATES
+    matches with BM25 and only return messages the asker could have seen.
+    """
+
+    def __init__(self):
+        self.postings: dict[str, PostingList] = {}
+        self.tails: dict[str, list] = {}  # term -> its PostingList.tail, one lookup per term in add
+        self.log = bytearray()
+        self.offsets = array('Q', [0])
+        self.lengths = array('H')
+        self.timestamps = array('d')
+        self.senders = array('I')
+        self.recipients = array('I')  # 0: everyone
+        self.user_ids = ['all']
+        self.user_numbers = {'all': 0}
+        self.total_terms = 0
+        self.block_bytes = 0  # Compressed posting blocks and their ranges
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def _user_number(self, user_id: str) -> int:
+        number = self.user_numbers.get(user_id)
+        if number is None:
+            number = self.user_numbers[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+        return number
+
+    def add(self, msg: dict) -> int:
+        """Index one chat message; returns its number"""
+        doc = len(self.timestamps)
+        content = msg.get('content', '')
+        terms = tokenize(content)
+        key = doc << 8
+        tails = self.tails
+        for term, tf in Counter(terms).items():
+            tail = tails.get(term)
+            if tail is None:
+                postings = self.postings[term] = PostingList()
+                tail = tails[term] = postings.tail
+            tail.append(key | tf if tf < 256 else key | 255)
+            if len(tail) == BLOCK_SIZE:
+                self.block_bytes += self.postings[term].seal()
+
+        self.log += content.encode()
+        self.offsets.append(len(self.log))
+        self.lengths.append(min(len(terms), 65535))
+        self.total_terms += len(terms)
+        self.timestamps.append(msg.get('timestamp') or time.time())
+        self.senders.append(self._user_number(msg.get('from_user', '')))
+        self.recipients.append(self._user_number(msg.get('to_user') or 'all'))
+        return doc
+
+    def visible(self, doc: int, user: Optional[int]) -> bool:
+        """Broadcasts are visible to everyone, direct messages to their two users"""
+        recipient = self.recipients[doc]
+        return recipient == 0 or (user is not None and (recipient == user or self.senders[doc] == user))
+
+    def message(self, doc: int) -> dict:
+        recipient = self.recipients[doc]
+        return {
+            'from_user': self.user_ids[self.senders[doc]],
+            'to_user': self.user_ids[recipient],
+            'content': self.log[self.offsets[doc]:self.offsets[doc + 1]].decode(),
+            'timestamp': self.timestamps[doc]
+        }
+
+    def search(self, query: str, user_id: Optional[str] = None, page: int = 0) -> dict:
+        """Messages containing every term of query, best first, SEARCH_PAGE per page"""
+        terms = sorted(set(tokenize(query)), key=lambda t: self.postings[t].df if t in self.postings else 0)
+        if not terms or terms[0] not in self.postings:
+            return {'total': 0, 'more': False, 'results': []}
+        lists = [self.postings[t] for t in terms]
+        user = self.user_numbers.get(user_id)
+        n = len(self)
+        idf = [math.log(1 + (n - p.df + 0.5) / (p.df + 0.5)) for p in lists]
+        avg_len = self.total_terms / n
+
+        # Walk the rarest term newest-first and look the others up block by block
+        cached = [{} for _ in lists]  # Per term: block index -> decoded block
+        scored = []
+        capped = False
+        for doc, tf in lists[0].newest_first():
+            if not self.visible(doc, user):
+                continue
+            tfs = [tf]
+            for k in range(1, len(lists)):
+                i = lists[k].find_block(doc)
+                block = cached[k].get(i)
+                if block is None:
+                    block = cached[k][i] = lists[k].block(i)
+                first, offsets, block_tfs = block
+                j = bisect_left(offsets, doc - first)
+                if j == len(offsets) or offsets[j] != doc - first:
+                    break
+                tfs.append(block_tfs[j])
+            else:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc] / avg_len)
+                score = sum(w * t * (BM25_K1 + 1) / (t + norm) for w, t in zip(idf, tfs))
+                scored.append((score, doc))
+                if len(scored) >= SEARCH_CANDIDATES:
+                    capped = True
+                    break
+
+        scored.sort(reverse=True)  # Ties go to the newer message
+        start = max(page, 0) * SEARCH_PAGE
+        results = []
+        for score, doc in scored[start:start + SEARCH_PAGE]:
+            result = self.message(doc)
+            result['score'] = round(score, 3)
+            results.append(result)
+        return {'total': len(scored), 'more': capped or start + SEARCH_PAGE < len(scored), 'results': results}
+
+    def stats(self) -> dict:
+        return {
+            'messages': len(self),
+            'terms': len(self.postings),
+            'log_bytes': len(self.log),
+            'postings_bytes': self.block_bytes
+        }
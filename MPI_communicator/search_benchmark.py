@@ -0,0 +1,78 @@
+"""/search index build rate and query latency over a synthetic chat history.
+
+    python -m MPI_communicator.search_benchmark [--messages 10000000]
+
+Messages are 3-15 words drawn from a Zipf vocabulary, 5% of them direct
+messages between USERS users. Queries pick words from three frequency
+bands (hot, mid, rare) alone and in pairs, searched as a random user.
+Needs no MPI: it drives SearchIndex directly, as Server.route_message does.
+"""
+import itertools
+import random
+import sys
+import time
+from .search import SearchIndex
+
+VOCABULARY = 50000
+USERS = 50
+BATCH = 100000  # Messages generated at a time
+QUERIES = 50  # Per query kind
+BANDS = {'hot': (0, 20), 'mid': (200, 2000), 'rare': (10000, VOCABULARY)}
+
+def messages(count: int, rng: random.Random):
+    words = [f"w{i}" for i in range(VOCABULARY)]
+    cum_weights = list(itertools.accumulate(1 / (i + 1) for i in range(VOCABULARY)))
+    users = [f"user_{i}" for i in range(USERS)]
+    now = time.time()
+    for start in range(0, count, BATCH):
+        n = min(BATCH, count - start)
+        lengths = [rng.randint(3, 15) for _ in range(n)]
+        tokens = iter(rng.choices(words, cum_weights=cum_weights, k=sum(lengths)))
+        for i, length in enumerate(lengths):
+            yield {
+                'from_user': users[rng.randrange(USERS)],
+                'to_user': users[rng.randrange(USERS)] if rng.random() < 0.05 else 'all',
+                'content': ' '.join(itertools.islice(tokens, length)),
+                'message_type': 'text',
+                'timestamp': now + start + i
+            }
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+def main():
+    count = int(float(sys.argv[sys.argv.index('--messages') + 1])) if '--messages' in sys.argv else 10000000
+    rng = random.Random(0)
+    index = SearchIndex()
+
+    print(f"Indexing {count} messages")
+    elapsed = 0.0
+    for done, msg in enumerate(messages(count, rng), 1):
+        start = time.perf_counter()
+        index.add(msg)
+        elapsed += time.perf_counter() - start
+        if done % 1000000 == 0:
+            print(f"  {done:>10d} messages, {done / elapsed:,.0f} msgs/s")
+    stats = index.stats()
+    print(f"Build: {count / elapsed:,.0f} msgs/s  ({elapsed:.1f} s in SearchIndex.add)")
+    print(f"Index: {stats['terms']} terms, {stats['postings_bytes'] / 1e6:.0f} MB postings, "
+          f"{stats['log_bytes'] / 1e6:.0f} MB message log")
+
+    kinds = [(name,) for name in BANDS] + [('hot', 'mid'), ('mid', 'rare'), ('hot', 'hot')]
+    print(f"  {'query':>10s} {'p50 ms':>8s} {'p99 ms':>8s} {'matches':>8s}")
+    for kind in kinds:
+        latencies = []
+        totals = []
+        for _ in range(QUERIES):
+            query = ' '.join(f"w{rng.randrange(*BANDS[band])}" for band in kind)
+            user = f"user_{rng.randrange(USERS)}"
+            start = time.perf_counter()
+            result = index.search(query, user)
+            latencies.append(time.perf_counter() - start)
+            totals.append(result['total'])
+        print(f"  {'+'.join(kind):>10s} {percentile(latencies, 50) * 1000:8.2f} {percentile(latencies, 99) * 1000:8.2f} "
+              f"{percentile(totals, 50):8d}")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,16 @@
 import time
-from .transport import MPITransport, TAG_MSG, TAG_CMD, TAG_FILE_META, TAG_FILE_CHUNK, TAG_FILE_REQ, TAG_FILE_ACK, TAG_FILE_DENY
+from .transport import MPITransport, TAG_MSG, TAG_CMD, TAG_FILE_META, TAG_FILE_CHUNK, TAG_FILE_REQ, TAG_FILE_ACK, TAG_FILE_DENY, BULK_TAGS
 from .models import Message, MessageType, User
+from .outbound import OutboundQueue
+from .search import SearchIndex
+
+QUEUE_LOG_INTERVAL = 10.0  # Seconds between laggard reports in the server log
 
 class Server:
-    def __init__(self, transport: MPITransport):
+    def __init__(self, transport: MPITransport, prioritize: bool = True, verbose: bool = False):
         self.transport = transport
+        self.prioritize = prioritize  # Chat and control ahead of file chunks in every outbound queue
+        self.verbose = verbose  # Per-message routing log; off by default, it runs once per file chunk
         self.users: dict[int, User] = {}
         self.start_time = time.time()
         self.users[0] = {
@@ -12,17 +18,89 @@ class Server:
             'display_name': 'System',
             'rank': 0
         }
+        self.outbound: dict[int, OutboundQueue] = {}
+        self.paused: dict[int, int] = {}  # Sender rank -> destination whose full queue paused its file chunks
+        self.queue_logged_at = 0.0
+        self.search = SearchIndex()  # Every chat message routed through here, for /search
+        self.transport.metrics.extra['queues'] = self.queue_stats
+        self.transport.metrics.extra['users'] = lambda: len(self.users) - 1
+        self.transport.metrics.extra['joined'] = lambda: len(self.transport.links)
+        self.transport.metrics.extra['search'] = self.search.stats
 
     def start(self):
         print(f"[Server] Started on Rank 0. Waiting for clients...")
         while True:
-            if self.transport.check_msg():
-                data, source, tag = self.transport.receive()
+            probe = self.transport.next_message(self.paused)
+            if probe:
+                data, source, tag = self.transport.receive(*probe)
+                started = time.perf_counter()
                 should_continue = self.handle_message(data, source, tag)
+                self.transport.metrics.observe('handle_s', time.perf_counter() - started)
                 if should_continue is False:
                     break
-            else:
-                time.sleep(0.01)
+            busy = self.flush_outbound()
+            if not probe:
+                time.sleep(0.001 if busy else 0.01)
+
+    def enqueue(self, data, rank: int, tag: int) -> OutboundQueue:
+        """Queue a message for rank; the main loop sends it without blocking on slow receivers"""
+        queue = self.outbound.get(rank)
+        if queue is None:
+            queue = self.outbound[rank] = OutboundQueue(self.transport, rank, prioritize=self.prioritize)
+        queue.push(data, tag)
+        return queue
+
+    def flush_outbound(self) -> bool:
+        """Advance every destination queue; returns True while anything is still queued"""
+        now = time.time()
+        for rank, queue in list(self.outbound.items()):
+            queue.drain()
+            if not queue.closed and queue.stalled(now):
+                self.disconnect_slow(rank)
+
+        for source, dest in list(self.paused.items()):
+            queue = self.outbound.get(dest)
+            if queue is None or queue.closed or queue.below_low_water():
+                del self.paused[source]
+                print(f"[Server] Resuming file chunks from {source}")
+
+        if now - self.queue_logged_at >= QUEUE_LOG_INTERVAL:
+            self.queue_logged_at = now
+            for queue in self.outbound.values():
+                if queue.depth() and not queue.closed:
+                    stats = queue.stats()
+                    print(f"[Server] Queue to {queue.rank}: {stats['depth']} msgs, {stats['bytes']} bytes, "
+                          f"{stats['dropped']} dropped")
+        return any(queue.depth() for queue in self.outbound.values())
+
+    def disconnect_slow(self, rank: int):
+        """Drop a receiver that stopped draining its messages, as if it had left"""
+        queue = self.outbound[rank]
+        queue.close()
+        for source, dest in list(self.paused.items()):
+            if dest == rank:
+                del self.paused[source]
+        if rank in self.users:
+            name = self.users.pop(rank)['display_name']
+            print(f"[Server] Disconnecting slow consumer {name} (Rank {rank}): "
+                  f"{queue.dropped} messages dropped")
+            self.broadcast_system_msg(f"{name} was disconnected (not receiving messages).")
+            self.broadcast_user_list()
+        self.transport.detach(rank)
+
+    def drain_bulk(self, source: int):
+        """Route the file chunks source has already sent, paused or not"""
+        self.paused.pop(source, None)
+        for tag in BULK_TAGS:
+            while True:
+                probe = self.transport.probe(source, tag)
+                if not probe:
+                    break
+                data, _, _ = self.transport.receive(*probe)
+                self.route_message(data, source, tag)
+
+    def queue_stats(self) -> list:
+        return [queue.stats() for queue in self.outbound.values()]
 
     def handle_message(self, data, source: int, tag: int):
         if tag == TAG_CMD:
@@ -39,16 +117,34 @@ class Server:
             user_info = cmd.get('user')
             user_info['rank'] = source
             self.users[source] = user_info
+            if source in self.outbound:
+                self.outbound[source].closed = False
             print(f"[Server] User joined: {user_info['display_name']} (Rank {source})")
             self.broadcast_system_msg(f"{user_info['display_name']} has joined the chat.")
             self.broadcast_user_list()
         elif type == 'LEAVE':
+            # LEAVE is a priority tag and overtakes the chunks sent before it; deliver those first
+            self.drain_bulk(source)
             if source in self.users:
                 name = self.users[source]['display_name']
                 del self.users[source]
                 print(f"[Server] User left: {name} (Rank {source})")
                 self.broadcast_system_msg(f"{name} has left the chat.")
                 self.broadcast_user_list()
+            if source in self.transport.links:
+                # A joined client's rank is never reused; drop what is queued for it and let it go
+                if source in self.outbound:
+                    self.outbound[source].close()
+                self.transport.detach(source)
+        elif type == 'SEARCH':
+            started = time.perf_counter()
+            user_id = self.users[source]['user_id'] if source in self.users else None
+            result = self.search.search(cmd.get('query', ''), user_id, cmd.get('page', 0))
+            self.transport.metrics.observe('search_s', time.perf_counter() - started)
+            result.update({'type': 'SEARCH_RESULTS', 'query': cmd.get('query', ''), 'page': cmd.get('page', 0)})
+            self.enqueue(result, source, TAG_CMD)
+        elif type == 'QUEUE_STATS':
+            self.enqueue({'type': 'QUEUE_STATS', 'queues': self.queue_stats()}, source, TAG_CMD)
         elif type == 'SHUTDOWN':
             print("[Server] Shutdown command received. Stopping.")
             return False
@@ -61,20 +157,27 @@ class Server:
 
         if tag == TAG_MSG and not msg.get('timestamp'):
             msg['timestamp'] = time.time()
+        if tag == TAG_MSG and msg.get('message_type') == MessageType.TEXT.value:
+            self.search.add(msg)
 
         dest_id = msg.get('to_user') 
         
         if dest_id and dest_id != 'all':
             target_rank = self.get_rank_by_id(dest_id)
             if target_rank:
-                print(f"[Server] Routing tag {tag} from {source} to {target_rank}")
-                self.transport.send(msg, target_rank, tag)
+                if self.verbose:
+                    print(f"[Server] Routing tag {tag} from {source} to {target_rank}")
+                queue = self.enqueue(msg, target_rank, tag)
+                if tag == TAG_FILE_CHUNK and queue.full() and source not in self.paused:
+                    # Chunks are never dropped; stop taking them from the sender instead
+                    self.paused[source] = target_rank
+                    print(f"[Server] Queue to {target_rank} full, pausing file chunks from {source}")
             else:
                 print(f"[Server] User {dest_id} not found")
         else:
             for rank in self.users:
                 if rank != 0 and rank != source:
-                    self.transport.send(msg, rank, tag)
+                    self.enqueue(msg, rank, tag)
 
     def broadcast_system_msg(self, text: str):
         msg: Message = {
@@ -86,7 +189,7 @@ class Server:
         }
         for rank in self.users:
             if rank != 0:
-                self.transport.send(msg, rank, TAG_MSG)
+                self.enqueue(msg, rank, TAG_MSG)
 
     def broadcast_user_list(self):
         user_list = list(self.users.values())
@@ -96,7 +199,7 @@ class Server:
         }
         for rank in self.users:
             if rank != 0:
-                self.transport.send(update_cmd, rank, TAG_CMD)
+                self.enqueue(update_cmd, rank, TAG_CMD)
 
     def get_rank_by_id(self, user_id: str) -> int:
         for r, u in self.users.items():
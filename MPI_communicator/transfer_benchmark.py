@@ -0,0 +1,104 @@
+"""P2P file transfer throughput: two-sided chunk messages vs one-sided RMA.
+
+    mpiexec -n 2 python -m MPI_communicator.transfer_benchmark [--gb 2]
+
+Rank 0 sends a --gb file to rank 1 twice. 'send' is the ChatClient --mode p2p
+path: pickled 1 MiB chunk dicts, which rank 1 polls for and appends to the
+file. 'rma' is --mode rma: rank 1 exposes an mmap of the preallocated file
+as a window and rank 0 Puts the file into it. Run it on one multi-core box
+to compare shared-memory transports.
+"""
+import hashlib
+import os
+import sys
+import tempfile
+import time
+from mpi4py import MPI
+from .transport import MPITransport, TAG_FILE_CHUNK, rma_tag
+
+CHUNK_SIZE = 1024 * 1024
+BLOCK = os.urandom(CHUNK_SIZE)
+
+def digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE * 16), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def send_chunks(transport: MPITransport, path: str, size: int):
+    """Same messages and pacing as ChatClient._perform_upload"""
+    total_chunks = max(1, -(-size // CHUNK_SIZE))
+    with open(path, 'rb') as f:
+        for chunk_idx in range(total_chunks):
+            data = f.read(CHUNK_SIZE)
+            chunk = {
+                'file_id': 'bench',
+                'filename': 'bench.bin',
+                'chunk_index': chunk_idx,
+                'total_chunks': total_chunks,
+                'data': data,
+                'to_user': 'receiver'
+            }
+            transport.send(chunk, 1, TAG_FILE_CHUNK)
+            time.sleep(0.001)
+
+def receive_chunks(transport: MPITransport, path: str, size: int):
+    """Same loop as ChatClient.listen_loop and its TAG_FILE_CHUNK handler"""
+    received = 0
+    while received < size:
+        probe = transport.next_message()
+        if not probe:
+            time.sleep(0.01)
+            continue
+        chunk, _, _ = transport.receive(*probe)
+        with open(path, 'ab') as f:
+            f.write(chunk['data'])
+        received += len(chunk['data'])
+
+def main():
+    comm = MPI.COMM_WORLD
+    rank = comm.Get_rank()
+    if comm.Get_size() != 2:
+        if rank == 0:
+            print("Run with exactly 2 processes")
+        return
+    gb = float(sys.argv[sys.argv.index('--gb') + 1]) if '--gb' in sys.argv else 2.0
+    size = int(gb * 1e9) // CHUNK_SIZE * CHUNK_SIZE
+    transport = MPITransport(comm)
+    if not transport.supports_rma():
+        if rank == 0:
+            print("This MPI has no Comm.Create_group (MPI-3); RMA mode is unavailable")
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, f'rank{rank}.bin')
+        if rank == 0:
+            with open(path, 'wb') as f:
+                for _ in range(size // CHUNK_SIZE):
+                    f.write(BLOCK)
+            expected = digest(path)
+            print(f"Sending {size / 1e9:.2f} GB from rank 0 to rank 1")
+
+        for mode in ('send', 'rma'):
+            if rank == 1 and os.path.exists(path):
+                os.remove(path)
+            comm.Barrier()
+            start = time.perf_counter()
+            if rank == 0 and mode == 'send':
+                send_chunks(transport, path, size)
+            elif rank == 0:
+                transport.put_file(path, 1, rma_tag(mode))
+            elif mode == 'send':
+                receive_chunks(transport, path, size)
+            else:
+                transport.receive_into_window(path, size, 0, rma_tag(mode))
+            comm.Barrier()
+            elapsed = time.perf_counter() - start
+            received = comm.bcast(digest(path) if rank == 1 else None, root=1)
+            if rank == 0:
+                state = "ok" if received == expected else "CORRUPT"
+                print(f"  {mode:>5s}: {elapsed:6.2f} s  {size / 1e6 / elapsed:8.0f} MB/s  {state}")
+
+if __name__ == "__main__":
+    main()
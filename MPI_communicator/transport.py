@@ -1,7 +1,12 @@
-from typing import Protocol, Tuple, Any, Optional
+from typing import Protocol, Tuple, Any, Optional, Iterable
 from mpi4py import MPI
+import mmap
+import os
 import pickle
+import threading
 import time
+import zlib
+from .metrics import Metrics
 
 TAG_MSG = 1
 TAG_FILE_META = 2
@@ -11,31 +16,282 @@ TAG_FILE_ACK = 5
 TAG_FILE_DENY = 6
 TAG_CMD = 7
 TAG_CHECK = 8
+TAG_FILE_CREDIT = 9  # Multicast flow control: bytes a hop has stored
+
+# Receive and send scheduling: control and chat are served before file chunks
+PRIORITY_TAGS = (TAG_CMD, TAG_MSG, TAG_FILE_REQ, TAG_FILE_ACK, TAG_FILE_DENY, TAG_FILE_META, TAG_FILE_CREDIT)
+BULK_TAGS = (TAG_FILE_CHUNK,)
+
+TAG_NAMES = {
+    TAG_MSG: 'msg', TAG_FILE_META: 'file_meta', TAG_FILE_CHUNK: 'file_chunk', TAG_FILE_REQ: 'file_req',
+    TAG_FILE_ACK: 'file_ack', TAG_FILE_DENY: 'file_deny', TAG_CMD: 'cmd', TAG_CHECK: 'check',
+    TAG_FILE_CREDIT: 'file_credit'
+}
+SENT_AT = '_sent_at'  # Send timestamp stamped into dict messages for per-hop latency
+
+# One-sided file transfers: the receiver exposes an mmap of the destination file as an MPI window
+RMA_PUT_SIZE = 64 * 1024 * 1024  # Bytes per Put (MPI counts are 32-bit)
+RMA_TAG_BASE = 1000  # Tags for Create_group of the per-transfer sender/receiver communicator
+RMA_TAGS = 30000
+
+# Elastic join: rank 0 publishes an MPI port, clients started later connect to it
+PORT_FILE = 'chat_port.txt'  # Where listen() writes the port name for --join
+
+def rma_tag(file_id: str) -> int:
+    """Tag both ends of a transfer derive from its file_id"""
+    return RMA_TAG_BASE + zlib.crc32(file_id.encode()) % RMA_TAGS
 
 class MPITransport:
-    def __init__(self, comm=MPI.COMM_WORLD):
+    """Point-to-point messaging addressed by rank.
+
+    Ranks below size are the ranks of comm. A client that joined a running
+    server (see listen and join) gets the next free rank after those and is
+    reached over its own intercommunicator, kept in links; on the joined
+    client's side comm is that intercommunicator, so it reaches rank 0 only.
+    """
+
+    def __init__(self, comm=MPI.COMM_WORLD, bulk_rate: Optional[float] = None, rank: Optional[int] = None):
         self.comm = comm
-        self.rank = comm.Get_rank()
-        self.size = comm.Get_size()
+        self.rank = comm.Get_rank() if rank is None else rank
+        self.size = comm.Get_remote_size() if comm.Is_inter() else comm.Get_size()
+        self.links = {}  # Joined rank -> intercommunicator whose remote rank 0 is that client
+        self.next_rank = self.size
+        self.port = None
+        self.accept_thread = None
         self.connected = True
+        self.bulk_rate = bulk_rate  # Optional bytes/second cap on outgoing file chunks
+        self.bulk_lock = threading.Lock()
+        self.bulk_window = (time.time(), 0)  # (window start, bytes sent since)
+        self.urgent_sends = 0  # Control/chat sends in progress; bulk sends wait for them
+        self.urgent_done = threading.Condition()
+        self.metrics = Metrics(self.rank, TAG_NAMES)
+        self.metrics.install_pickle_timing(MPI)
+
+    def _throttle_bulk(self, data: Any) -> None:
+        """Let in-progress chat go first and keep file chunks under bulk_rate"""
+        with self.urgent_done:
+            self.urgent_done.wait_for(lambda: self.urgent_sends == 0, timeout=1.0)
+        if self.bulk_rate is None:
+            return
+        size = len(data.get('data', b'')) if isinstance(data, dict) else 0
+        with self.bulk_lock:
+            start, sent = self.bulk_window
+            now = time.time()
+            if now - start > 1.0:
+                start, sent = now, 0
+            delay = start + (sent + size) / self.bulk_rate - now
+            self.bulk_window = (start, sent + size)
+        if delay > 0:
+            time.sleep(delay)
 
     def send(self, data: Any, destination: int, tag: int = TAG_MSG) -> None:
+        if tag in BULK_TAGS:
+            self._throttle_bulk(data)
+            self._send(data, destination, tag)
+            return
+        with self.urgent_done:
+            self.urgent_sends += 1
+        try:
+            self._send(data, destination, tag)
+        finally:
+            with self.urgent_done:
+                self.urgent_sends -= 1
+                self.urgent_done.notify_all()
+
+    def _route(self, rank: int) -> Tuple[Any, int]:
+        """(communicator, rank in it) to reach rank"""
+        link = self.links.get(rank)
+        return (link, 0) if link is not None else (self.comm, rank)
+
+    def reaches(self, rank: int) -> bool:
+        """Whether rank can be sent to directly; a joined client and the ranks of comm
+        only share rank 0, so anything between them goes through the server"""
+        return rank in self.links or 0 <= rank < self.size
+
+    def _send(self, data: Any, destination: int, tag: int) -> None:
+        if isinstance(data, dict):
+            data[SENT_AT] = time.time()
+        comm, dest = self._route(destination)
+        try:
+            comm.send(data, dest=dest, tag=tag)
+            self.metrics.count_sent(tag)
+        except Exception as e:
+            print(f"[Transport] Error sending to {destination}: {e}")
+
+    def isend(self, data: Any, destination: int, tag: int = TAG_MSG) -> Optional[MPI.Request]:
+        """Non-blocking send; returns the request to Test, or None if the send failed"""
+        if isinstance(data, dict):
+            data[SENT_AT] = time.time()
+        comm, dest = self._route(destination)
         try:
-            self.comm.send(data, dest=destination, tag=tag)
+            request = comm.isend(data, dest=dest, tag=tag)
+            self.metrics.count_sent(tag)
+            return request
         except Exception as e:
             print(f"[Transport] Error sending to {destination}: {e}")
+            return None
 
     def receive(self, source: int = MPI.ANY_SOURCE, tag: int = MPI.ANY_TAG) -> Tuple[Any, int, int]:
+        """Receive from source (as returned by probe); ANY_SOURCE only covers comm"""
         status = MPI.Status()
-        data = self.comm.recv(source=source, tag=tag, status=status)
-        return data, status.Get_source(), status.Get_tag()
+        comm, rank = self._route(source) if source != MPI.ANY_SOURCE else (self.comm, source)
+        data = comm.recv(source=rank, tag=tag, status=status)
+        if comm is not self.comm:
+            status.Set_source(source)
+        tag = status.Get_tag()
+        self.metrics.count_received(tag)
+        if isinstance(data, dict) and SENT_AT in data:
+            # Clocks of ranks on different hosts are only as close as NTP keeps them
+            self.metrics.observe(f'hop_latency_s.{TAG_NAMES.get(tag, tag)}', time.time() - data.pop(SENT_AT))
+        return data, status.Get_source(), tag
 
     def check_msg(self) -> bool:
+        return self.probe() is not None
+
+    def probe(self, source: int = MPI.ANY_SOURCE, tag: int = MPI.ANY_TAG) -> Optional[Tuple[int, int]]:
+        """Return (source, tag) of a waiting message without receiving it, or None"""
         status = MPI.Status()
-        return self.comm.Iprobe(source=MPI.ANY_SOURCE, tag=MPI.ANY_TAG, status=status)
+        if source != MPI.ANY_SOURCE:
+            comm, rank = self._route(source)
+            if comm.Iprobe(source=rank, tag=tag, status=status):
+                return source, status.Get_tag()
+            return None
+        if self.comm.Iprobe(source=source, tag=tag, status=status):
+            return status.Get_source(), status.Get_tag()
+        for rank, link in list(self.links.items()):
+            if link.Iprobe(source=0, tag=tag, status=status):
+                return rank, status.Get_tag()
+        return None
+
+    def next_message(self, paused: Iterable[int] = ()) -> Optional[Tuple[int, int]]:
+        """Probe for the next message to receive: priority tags first, then file chunks
+        from any source not in paused (their chunks are left waiting in MPI)"""
+        for tag in PRIORITY_TAGS:
+            probe = self.probe(tag=tag)
+            if probe:
+                return probe
+        probe = self.probe()
+        if probe is None or probe[1] not in BULK_TAGS or probe[0] not in paused:
+            return probe
+        for source in [*range(self.size), *list(self.links)]:
+            if source not in paused:
+                for tag in BULK_TAGS:
+                    probe = self.probe(source, tag)
+                    if probe:
+                        return probe
+        return None
+
+    def supports_rma(self) -> bool:
+        """One-sided transfers need MPI-3 Comm.Create_group to window just the two ranks"""
+        return hasattr(self.comm, 'Create_group') and not self.comm.Is_inter()
+
+    def _pair_comm(self, origin: int, target: int, tag: int):
+        """Communicator of just origin (rank 0) and target (rank 1); collective over the two only"""
+        world = self.comm.Get_group()
+        group = world.Incl([origin, target])
+        try:
+            return self.comm.Create_group(group, tag)
+        finally:
+            group.Free()
+            world.Free()
+
+    def put_file(self, path: str, target: int, tag: int) -> int:
+        """Put the whole file into the window target opened with receive_into_window.
+        The target's threads take no part until the closing fence; returns the bytes put"""
+        size = os.path.getsize(path)
+        start = time.perf_counter()
+        pair = self._pair_comm(self.rank, target, tag)
+        win = MPI.Win.Create(None, 1, comm=pair)  # The origin exposes no memory
+        try:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                try:
+                    win.Fence()
+                    for offset in range(0, size, RMA_PUT_SIZE):
+                        count = min(RMA_PUT_SIZE, size - offset)
+                        win.Put([view[offset:offset + count], MPI.BYTE], 1, target=(offset, count, MPI.BYTE))
+                    win.Fence()  # Every Put is complete at the target once this returns
+                finally:
+                    view.release()
+        finally:
+            win.Free()
+            pair.Free()
+        self.metrics.observe('rma_put_s', time.perf_counter() - start)
+        return size
+
+    def receive_into_window(self, path: str, size: int, origin: int, tag: int) -> None:
+        """Preallocate path, expose its mmap to origin's put_file and block until the transfer ends"""
+        start = time.perf_counter()
+        with open(path, 'w+b') as f:
+            f.truncate(size)
+            with mmap.mmap(f.fileno(), size) as mm:
+                pair = self._pair_comm(origin, self.rank, tag)
+                win = MPI.Win.Create(mm, 1, comm=pair)
+                try:
+                    win.Fence()
+                    win.Fence()
+                finally:
+                    win.Free()
+                    pair.Free()
+                    del win  # Drop mpi4py's reference to the mmap so it can close
+                mm.flush()
+        self.metrics.observe('rma_receive_s', time.perf_counter() - start)
+
+    def listen(self, port_file: str = PORT_FILE) -> str:
+        """Open an MPI port, write its name to port_file and accept joining clients
+        on a background thread for as long as the process runs; returns the port name"""
+        self.port = MPI.Open_port()
+        with open(port_file, 'w') as f:
+            f.write(self.port + '\n')
+        self.accept_thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self.accept_thread.start()
+        return self.port
+
+    def _accept_loop(self):
+        while self.connected:
+            try:
+                link = MPI.COMM_SELF.Accept(self.port)
+            except Exception as e:
+                print(f"[Transport] Accept failed: {e}")
+                return
+            if not self.connected:
+                link.Disconnect()  # The wake-up connection from close()
+                return
+            rank = self.next_rank
+            self.next_rank += 1
+            link.send({'type': 'WELCOME', 'rank': rank}, dest=0, tag=TAG_CMD)
+            self.links[rank] = link  # From here on the main loop probes it
+
+    def detach(self, rank: int) -> None:
+        """Forget a joined client and disconnect from it. Disconnect waits for sends
+        to it still in flight, so it runs on its own thread rather than the caller's"""
+        link = self.links.pop(rank, None)
+        if link is not None:
+            threading.Thread(target=link.Disconnect, daemon=True).start()
+
+    @classmethod
+    def join(cls, port_file: str = PORT_FILE, bulk_rate: Optional[float] = None) -> 'MPITransport':
+        """Connect to a server started with listen(); returns a transport on the new
+        intercommunicator, with the rank the server gave this process"""
+        with open(port_file) as f:
+            port = f.read().strip()
+        link = MPI.COMM_SELF.Connect(port)
+        welcome = link.recv(source=0, tag=TAG_CMD)
+        return cls(link, bulk_rate=bulk_rate, rank=welcome['rank'])
 
     def get_rank(self) -> int:
         return self.rank
 
     def close(self):
         self.connected = False
+        if self.comm.Is_inter():
+            self.comm.Disconnect()
+        elif self.port is not None:
+            if self.accept_thread is not None and self.accept_thread.is_alive():
+                # Close_port under a blocked Accept hangs or errors in most MPIs: connect once
+                # ourselves so the loop wakes, sees connected is False and returns
+                wake = MPI.COMM_SELF.Connect(self.port)
+                wake.Disconnect()
+                self.accept_thread.join()
+            MPI.Close_port(self.port)
+            self.port = None
@@ -4,8 +4,28 @@ from mpi4py import MPI
 import os
 import sys
 import json
+import random
+import hashlib
 
 CHUNK_SIZE = 64 * 1024  # 64KB
+LIST_PAGE_SIZE = 1000  # Entries per list_files response
+
+# The canonical CDC constants and iter_cdc_chunks. RPc_file_homework/RPC_client/RPC_client.py
+# carries an identical copy because each homework runs as a standalone script; change the two together.
+#
+# Content-defined chunking. Bytes are mapped to a 4-letter alphabet and a chunk
+# ends after the first occurrence of a fixed pattern past CDC_MIN; with 4**10
+# possible patterns that is ~1 MiB on average. Cut points depend only on nearby
+# content, so an insert or edit changes one or two chunks, not every later one.
+# bytes.translate/bytes.find run in C, which keeps this at 100-250 MB/s where a
+# per-byte rolling hash in Python manages ~5 MB/s.
+CDC_MIN = 256 * 1024
+CDC_MAX = 4 * 1024 * 1024
+CDC_READ = 16 * 1024 * 1024  # File read size while chunking
+_cdc_rng = random.Random(0x5eed)  # Fixed seed: the same cut points every run, so uploads dedupe against earlier ones
+CDC_TABLE = bytes(_cdc_rng.choice(b'0123') for _ in range(256))
+CDC_PATTERN = bytes(_cdc_rng.choice(b'0123') for _ in range(10))
+CDC_BACKUP = bytes(_cdc_rng.choice(b'0123') for _ in range(7))  # Shorter fallback before forcing a cut at CDC_MAX
 
 def send_file(comm, rank, filepath, server_rank):
     """Send a file to a specific server rank"""
@@ -62,20 +82,97 @@ def send_file(comm, rank, filepath, server_rank):
         print(f"[Rank {rank}] Transfer failed")
         return False
 
-def list_files(comm, rank, server_rank):
-    """Request file list from server"""
-    print(f"[Rank {rank}] Requesting file list from server rank {server_rank}")
+def iter_cdc_chunks(f):
+    """Yield the content-defined chunks of an open file"""
+    buf = b''
+    eof = False
+    while not eof:
+        block = f.read(CDC_READ)
+        eof = not block
+        buf += block
+        sym = buf.translate(CDC_TABLE)
+        start = 0
+        while start < len(buf):
+            end = min(start + CDC_MAX, len(buf))
+            if end - start <= CDC_MIN:
+                if not eof:
+                    break
+                cut = end
+            else:
+                k = sym.find(CDC_PATTERN, start + CDC_MIN, end)
+                if k >= 0:
+                    cut = k + len(CDC_PATTERN)
+                elif end - start < CDC_MAX and not eof:
+                    break  # The pattern may still turn up in the next block
+                else:
+                    k = sym.find(CDC_BACKUP, start + CDC_MIN, end)
+                    cut = k + len(CDC_BACKUP) if k >= 0 else end
+            yield buf[start:cut]
+            start = cut
+        buf = buf[start:]
+
+def send_file_dedup(comm, rank, filepath, server_rank):
+    """Send a file as content-defined chunks, skipping the ones the server already has"""
+    
+    if not os.path.isfile(filepath):
+        print(f"[Rank {rank}] Error: File not found: {filepath}")
+        return False
+    
+    filename = os.path.basename(filepath)
+    
+    # First pass: chunk boundaries and digests
+    chunks = {}  # digest -> (offset, length)
+    digests = []
+    filesize = 0
+    with open(filepath, 'rb') as f:
+        for chunk in iter_cdc_chunks(f):
+            digest = hashlib.sha256(chunk).hexdigest()
+            chunks.setdefault(digest, (filesize, len(chunk)))
+            digests.append(digest)
+            filesize += len(chunk)
     
-    comm.send({'command': 'list'}, dest=server_rank, tag=7)
+    print(f"[Rank {rank}] Sending {filename} ({filesize} bytes, {len(digests)} chunks) to server rank {server_rank}")
+    comm.send({'filename': filename, 'filesize': filesize, 'digests': digests}, dest=server_rank, tag=8)
+    missing = comm.recv(source=server_rank, tag=9)['missing']
     
-    response = comm.recv(source=server_rank, tag=6)
-    files = response['files']
+    # Second pass: send only the chunks the server asked for
+    sent = 0
+    with open(filepath, 'rb') as f:
+        for i, digest in enumerate(missing, 1):
+            offset, length = chunks[digest]
+            f.seek(offset)
+            comm.send({'digest': digest, 'data': f.read(length)}, dest=server_rank, tag=10)
+            sent += length
+            print(f"\r[Rank {rank}] Sent {i}/{len(missing)} new chunks ({sent} bytes)", end='', flush=True)
+    if missing:
+        print()
+    
+    result = comm.recv(source=server_rank, tag=5)
+    if result['status'] == 'complete':
+        print(f"[Rank {rank}] Transfer complete! {result['new']} of {result['chunks']} chunks were new. "
+              f"File saved: {result['filepath']}")
+        return True
+    else:
+        print(f"[Rank {rank}] Transfer failed: {result.get('error', 'unknown error')}")
+        return False
+
+def list_files(comm, rank, server_rank, prefix=''):
+    """Request file list from server, one page at a time"""
+    print(f"[Rank {rank}] Requesting file list from server rank {server_rank}")
     
-    print(f"\n[Rank {rank}] Files on server rank {server_rank} ({len(files)} total):")
-    for f in files:
-        print(f"  - {f['name']} ({f['size']} bytes)")
+    offset = 0
+    while offset is not None:
+        request = {'command': 'list', 'prefix': prefix, 'offset': offset, 'limit': LIST_PAGE_SIZE}
+        comm.send(request, dest=server_rank, tag=7)
+        
+        response = comm.recv(source=server_rank, tag=6)
+        if offset == 0:
+            print(f"\n[Rank {rank}] Files on server rank {server_rank} ({response['total']} total):")
+        for f in response['files']:
+            print(f"  - {f['name']} ({f['size']} bytes)")
+        offset = response['next_offset']
 
-def client_process(comm, rank, filepath, command='send'):
+def client_process(comm, rank, filepath, command='send', prefix=''):
     """Main client process"""
     size = comm.Get_size()
     
@@ -88,9 +185,11 @@ def client_process(comm, rank, filepath, command='send'):
     server_rank = 1
     
     if command == 'list':
-        list_files(comm, rank, server_rank)
+        list_files(comm, rank, server_rank, prefix)
     elif command == 'send':
         send_file(comm, rank, filepath, server_rank)
+    elif command == 'dedup':
+        send_file_dedup(comm, rank, filepath, server_rank)
     else:
         print(f"[Rank {rank}] Unknown command: {command}")
 
@@ -103,7 +202,8 @@ def main():
         if rank == 0:
             print("Usage:")
             print("  Send file:  mpiexec -n <num_procs> python mpi_client.py <file_path>")
-            print("  List files: mpiexec -n <num_procs> python mpi_client.py --list")
+            print("  Send only new chunks: mpiexec -n <num_procs> python mpi_client.py --dedup <file_path>")
+            print("  List files: mpiexec -n <num_procs> python mpi_client.py --list [prefix]")
             print("\nExample:")
             print("  mpiexec -n 4 python mpi_client.py document.pdf")
             print("  (1 client process + 3 server processes)")
@@ -112,7 +212,10 @@ def main():
     # Only rank 0 acts as client in this simple setup
     if rank == 0:
         if sys.argv[1] == '--list':
-            client_process(comm, rank, None, command='list')
+            prefix = sys.argv[2] if len(sys.argv) > 2 else ''
+            client_process(comm, rank, None, command='list', prefix=prefix)
+        elif sys.argv[1] == '--dedup' and len(sys.argv) > 2:
+            client_process(comm, rank, sys.argv[2], command='dedup')
         else:
             filepath = sys.argv[1]
             client_process(comm, rank, filepath, command='send')
@@ -4,11 +4,194 @@ from mpi4py import MPI
 import os
 import json
 import time
+import bisect
+import hashlib
+import uuid
 
 SAVE_DIR = 'received'
 CHUNK_SIZE = 64 * 1024  # 64KB
+INDEX_FILE = SAVE_DIR + '.index.json'  # Sidecar next to SAVE_DIR, not inside it
+STORE_DIR = os.path.join(SAVE_DIR, '.store')  # Content-addressed chunks and the manifests of deduplicated files
+HEX_DIGITS = set('0123456789abcdef')
 
-def handle_file_transfer(comm, status):
+# The canonical DirectoryIndex. RPc_file_homework/RPC_server/RPC_server.py carries an identical
+# copy because each homework runs as a standalone script; change the two together.
+class DirectoryIndex:
+    """In-memory index of the files in a directory, updated as transfers finish"""
+
+    def __init__(self, directory, sidecar, extra_sizes=None):
+        self.directory = directory
+        self.sidecar = sidecar
+        self.extra_sizes = extra_sizes  # Optional callable for files kept outside the directory (chunk manifests)
+        self.sizes = {}
+        self.names = []  # Kept sorted for prefix lookups
+        self.mtime_ns = None  # Directory mtime the index is known to match
+        if not self.load():
+            self.rebuild()
+
+    def rebuild(self):
+        """Rescan the directory: one scandir pass, plus a stat per file for its size except on Windows"""
+        sizes = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    sizes[entry.name] = entry.stat().st_size
+        if self.extra_sizes:
+            sizes.update(self.extra_sizes())
+        self.sizes = sizes
+        self.names = sorted(sizes)
+        self.mtime_ns = os.stat(self.directory).st_mtime_ns
+        self.save()
+
+    def load(self):
+        """Load the sidecar if the directory has not changed since it was written"""
+        try:
+            with open(self.sidecar) as f:
+                data = json.load(f)
+            if data['mtime_ns'] != os.stat(self.directory).st_mtime_ns:
+                return False
+            self.sizes = data['files']
+        except (OSError, ValueError, KeyError):
+            return False
+        self.names = sorted(self.sizes)
+        self.mtime_ns = data['mtime_ns']
+        return True
+
+    def save(self):
+        """Persist the index so the next start can skip the rescan"""
+        data = {
+            'mtime_ns': self.mtime_ns,
+            'files': self.sizes
+        }
+        tmp_path = f"{self.sidecar}.{uuid.uuid4().hex}.tmp"  # Ranks sharing the sidecar save at the same time
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.sidecar)
+
+    def add(self, name, size=None):
+        """Record a new or rewritten file"""
+        if name not in self.sizes:
+            bisect.insort(self.names, name)
+        self.sizes[name] = os.path.getsize(os.path.join(self.directory, name)) if size is None else size
+        self.mtime_ns = os.stat(self.directory).st_mtime_ns
+
+    def discard(self, name):
+        """Forget a removed file"""
+        if self.sizes.pop(name, None) is not None:
+            del self.names[bisect.bisect_left(self.names, name)]
+        self.mtime_ns = os.stat(self.directory).st_mtime_ns
+
+    def refresh(self):
+        """Rescan only if something else changed the directory behind our back"""
+        if os.stat(self.directory).st_mtime_ns != self.mtime_ns:
+            self.rebuild()
+
+    def list(self, prefix='', offset=0, limit=None):
+        """Return one page of (name, size) entries and the total match count"""
+        self.refresh()
+        lo = bisect.bisect_left(self.names, prefix)
+        hi = bisect.bisect_left(self.names, prefix + '\U0010ffff') if prefix else len(self.names)
+        start = min(lo + max(offset, 0), hi)
+        end = hi if limit is None else min(hi, start + limit)
+        files = [{'name': n, 'size': self.sizes[n]} for n in self.names[start:end]]
+        return files, hi - lo
+
+# The canonical ChunkStore. RPc_file_homework/RPC_server/RPC_server.py carries a copy, plus segments()
+# for HTTP downloads, because each homework runs as a standalone script; change the shared methods in both.
+class ChunkStore:
+    """Content-addressed chunk store: chunks are kept once under their sha256,
+    and a deduplicated file is a manifest listing its chunk digests in order
+    """
+    
+    def __init__(self, root):
+        self.chunk_dir = os.path.join(root, 'chunks')
+        self.manifest_dir = os.path.join(root, 'manifests')
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        os.makedirs(self.manifest_dir, exist_ok=True)
+    
+    def _chunk_path(self, digest):
+        if len(digest) != 64 or not set(digest) <= HEX_DIGITS:
+            raise ValueError(f"Bad chunk digest {digest!r}")
+        return os.path.join(self.chunk_dir, digest[:2], digest)
+    
+    def _manifest_path(self, name):
+        return os.path.join(self.manifest_dir, os.path.basename(name) + '.json')
+    
+    def missing(self, digests):
+        """Return the digests not stored yet, in order and without repeats"""
+        seen = set()
+        missing = []
+        for digest in digests:
+            if digest not in seen:
+                seen.add(digest)
+                if not os.path.exists(self._chunk_path(digest)):
+                    missing.append(digest)
+        return missing
+    
+    def put(self, digest, data):
+        """Store one chunk; refuses data that does not hash to its digest"""
+        path = self._chunk_path(digest)
+        if hashlib.sha256(data).hexdigest() != digest:
+            return False
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return True
+    
+    def commit(self, name, digests, size):
+        """Record name as the concatenation of the given chunks
+        
+        Returns the digests that are still missing; the manifest is only
+        written once none are and their sizes add up to size.
+        """
+        missing = self.missing(digests)
+        if missing:
+            return missing
+        total = sum(os.path.getsize(self._chunk_path(d)) for d in digests)
+        if total != size:
+            raise ValueError(f"Chunks add up to {total} bytes, expected {size}")
+        path = self._manifest_path(name)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'size': size, 'chunks': digests}, f)
+        os.replace(tmp_path, path)
+        return []
+    
+    def manifest(self, name):
+        """Return {'size', 'chunks'} for a deduplicated file, or None"""
+        try:
+            with open(self._manifest_path(name)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+    
+    def read(self, name):
+        """Yield the contents of a deduplicated file chunk by chunk"""
+        for digest in self.manifest(name)['chunks']:
+            with open(self._chunk_path(digest), 'rb') as f:
+                yield f.read()
+    
+    def discard(self, name):
+        """Drop the manifest for name (the chunks stay for other files)"""
+        try:
+            os.remove(self._manifest_path(name))
+            return True
+        except FileNotFoundError:
+            return False
+    
+    def sizes(self):
+        """Map every deduplicated file name to its size"""
+        sizes = {}
+        for entry in os.scandir(self.manifest_dir):
+            if entry.name.endswith('.json'):
+                with open(entry.path) as f:
+                    sizes[entry.name[:-len('.json')]] = json.load(f)['size']
+        return sizes
+
+def handle_file_transfer(comm, status, index, store):
     """Handle incoming file transfer from a client"""
     source = status.Get_source()
     
@@ -39,47 +222,91 @@ def handle_file_transfer(comm, status):
             print(f"\r[Rank {comm.Get_rank()}] Progress: {progress:.1f}%", end='', flush=True)
     
     print(f"\n[Rank {comm.Get_rank()}] File saved: {filepath}")
+    store.discard(filename)
+    index.add(os.path.basename(filepath))
     
     # Send final confirmation
     comm.send({'status': 'complete', 'filepath': filepath}, dest=source, tag=5)
 
-def list_files(comm, source):
-    """Send list of files to requesting client"""
-    files = []
-    if os.path.exists(SAVE_DIR):
-        for f in os.listdir(SAVE_DIR):
-            path = os.path.join(SAVE_DIR, f)
-            if os.path.isfile(path):
-                files.append({
-                    'name': f,
-                    'size': os.path.getsize(path)
-                })
+def handle_dedup_transfer(comm, source, index, store):
+    """Receive a file as content-defined chunks, asking only for the ones not stored yet"""
+    request = comm.recv(source=source, tag=8)
+    name = os.path.basename(request['filename'])
+    digests = request['digests']
+    
+    missing = store.missing(digests)
+    print(f"[Rank {comm.Get_rank()}] Receiving {name} ({request['filesize']} bytes) from rank {source}: "
+          f"{len(missing)} of {len(digests)} chunks are new")
+    comm.send({'missing': missing}, dest=source, tag=9)
+    
+    # The client sends exactly the missing chunks, in that order, without per-chunk acks
+    bad = 0
+    for digest in missing:
+        chunk = comm.recv(source=source, tag=10)
+        if chunk['digest'] != digest or not store.put(digest, chunk['data']):
+            bad += 1
+    
+    filepath = os.path.join(SAVE_DIR, name)
+    try:
+        if bad or store.commit(name, digests, request['filesize']):
+            raise ValueError("chunks missing or corrupt")
+    except ValueError as e:
+        print(f"[Rank {comm.Get_rank()}] Dedup transfer of {name} failed: {e}")
+        comm.send({'status': 'failed', 'error': str(e)}, dest=source, tag=5)
+        return
     
-    comm.send({'files': files}, dest=source, tag=6)
+    # The manifest now stands for the file; drop any plain copy of it
+    if os.path.exists(filepath):
+        os.remove(filepath)
+    index.add(name, request['filesize'])
+    print(f"[Rank {comm.Get_rank()}] Stored {name} as {len(digests)} chunks")
+    comm.send({'status': 'complete', 'filepath': filepath, 'chunks': len(digests), 'new': len(missing)},
+              dest=source, tag=5)
+
+def list_files(comm, source, index):
+    """Send one page of the file list to requesting client"""
+    request = comm.recv(source=source, tag=7) or {}
+    offset = request.get('offset', 0)
+    files, total = index.list(request.get('prefix', ''), offset, request.get('limit'))
+    
+    next_offset = offset + len(files)
+    comm.send({
+        'files': files,
+        'total': total,
+        'next_offset': next_offset if next_offset < total else None
+    }, dest=source, tag=6)
 
 def server_process(comm, rank):
     """Main server process loop"""
     os.makedirs(SAVE_DIR, exist_ok=True)
+    store = ChunkStore(STORE_DIR)
+    index = DirectoryIndex(SAVE_DIR, INDEX_FILE, store.sizes)
     
-    print(f"[Server Rank {rank}] Ready to receive files")
+    print(f"[Server Rank {rank}] Ready to receive files ({len(index.names)} already stored)")
     print(f"[Server Rank {rank}] Files will be saved to: {SAVE_DIR}/")
     
-    while True:
-        # Probe for incoming messages
-        status = MPI.Status()
-        if comm.Iprobe(source=MPI.ANY_SOURCE, tag=MPI.ANY_TAG, status=status):
-            tag = status.Get_tag()
-            source = status.Get_source()
+    try:
+        while True:
+            # Probe for incoming messages
+            status = MPI.Status()
+            if comm.Iprobe(source=MPI.ANY_SOURCE, tag=MPI.ANY_TAG, status=status):
+                tag = status.Get_tag()
+                source = status.Get_source()
+                
+                if tag == 1:  # File transfer request
+                    handle_file_transfer(comm, status, index, store)
+                elif tag == 8:  # Deduplicated transfer: chunk digests, then the missing chunks
+                    handle_dedup_transfer(comm, source, index, store)
+                elif tag == 7:  # List files request
+                    list_files(comm, source, index)
+                elif tag == 99:  # Shutdown signal
+                    comm.recv(source=source, tag=99)
+                    print(f"[Server Rank {rank}] Shutting down")
+                    break
             
-            if tag == 1:  # File transfer request
-                handle_file_transfer(comm, status)
-            elif tag == 7:  # List files request
-                list_files(comm, source)
-            elif tag == 99:  # Shutdown signal
-                print(f"[Server Rank {rank}] Shutting down")
-                break
-        
-        time.sleep(0.01)  # Small delay to prevent busy waiting
+            time.sleep(0.01)  # Small delay to prevent busy waiting
+    finally:
+        index.save()
 
 def main():
     comm = MPI.COMM_WORLD
@@ -1,13 +1,358 @@
 #!/usr/bin/env python3
 # rpc_client.py
 import xmlrpc.client
+import http.client
+import urllib.parse
 import base64
+import threading
+import json
 import sys
 import os
+import random
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 CHUNK_SIZE = 64 * 1024  # 64KB chunks
+IN_FLIGHT = 4  # Chunks uploaded concurrently, one keep-alive connection each
+PER_CALL = 1  # upload_chunk calls packed into one system.multicall round trip
+SMALL_FILE = 256 * 1024  # Files up to this size are sent whole with upload_file
+MULTICALL_BYTES = 4 * 1024 * 1024  # Payload budget for one batched round trip
+LIST_PAGE_SIZE = 1000  # Entries per list_files call
+STREAM_CHUNK = 1024 * 1024  # Read size for raw PUT uploads
+RESUME_FILE = '.rpc_resume.json'  # Transfer ids of unfinished uploads, so a rerun can resume them
+RESUME_LOCK = threading.Lock()  # Uploads running on threads of one process update RESUME_FILE in turn
+DOWNLOAD_CONNECTIONS = 4  # Parallel ranged GETs per download
+DOWNLOAD_PART = 16 * 1024 * 1024  # Bytes per ranged GET
 
-def send_file(server_url, filepath):
+# Upload modes: 'put' streams the file as one raw HTTP body, 'binary' sends
+# xmlrpc Binary chunks, 'base64' is the original base64-string encoding,
+# 'dedup' sends only the content-defined chunks the server does not have yet
+UPLOAD_MODES = ('put', 'binary', 'base64', 'dedup')
+
+# Identical copy of the canonical CDC constants and iter_cdc_chunks in MPI_homework/client/MPI_client.py
+# (each homework runs as a standalone script, with no shared module to import); change the two together.
+#
+# Content-defined chunking. Bytes are mapped to a 4-letter alphabet and a chunk
+# ends after the first occurrence of a fixed pattern past CDC_MIN; with 4**10
+# possible patterns that is ~1 MiB on average. Cut points depend only on nearby
+# content, so an insert or edit changes one or two chunks, not every later one.
+# bytes.translate/bytes.find run in C, which keeps this at 100-250 MB/s where a
+# per-byte rolling hash in Python manages ~5 MB/s.
+CDC_MIN = 256 * 1024
+CDC_MAX = 4 * 1024 * 1024
+CDC_READ = 16 * 1024 * 1024  # File read size while chunking
+_cdc_rng = random.Random(0x5eed)  # Fixed seed: the same cut points every run, so uploads dedupe against earlier ones
+CDC_TABLE = bytes(_cdc_rng.choice(b'0123') for _ in range(256))
+CDC_PATTERN = bytes(_cdc_rng.choice(b'0123') for _ in range(10))
+CDC_BACKUP = bytes(_cdc_rng.choice(b'0123') for _ in range(7))  # Shorter fallback before forcing a cut at CDC_MAX
+MISSING_BATCH = 10000  # Digests per missing_chunks call
+
+def wire_int(n):
+    """XML-RPC ints are 32-bit, so larger sizes and offsets travel as strings"""
+    return n if -xmlrpc.client.MAXINT <= n <= xmlrpc.client.MAXINT else str(n)
+
+def missing_ranges(received, filesize):
+    """Complement of the received [start, end) ranges within [0, filesize)"""
+    missing = []
+    pos = 0
+    for start, end in sorted((int(start), int(end)) for start, end in received):
+        if start > pos:
+            missing.append((pos, start))
+        pos = max(pos, end)
+    if pos < filesize:
+        missing.append((pos, filesize))
+    return missing
+
+def load_resume_state():
+    try:
+        with open(RESUME_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_resume_state(state):
+    tmp_path = f"{RESUME_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, RESUME_FILE)
+
+def remember_transfer(resume_key, entry):
+    with RESUME_LOCK:
+        state = load_resume_state()
+        state[resume_key] = entry
+        save_resume_state(state)
+
+def iter_cdc_chunks(f):
+    """Yield the content-defined chunks of an open file"""
+    buf = b''
+    eof = False
+    while not eof:
+        block = f.read(CDC_READ)
+        eof = not block
+        buf += block
+        sym = buf.translate(CDC_TABLE)
+        start = 0
+        while start < len(buf):
+            end = min(start + CDC_MAX, len(buf))
+            if end - start <= CDC_MIN:
+                if not eof:
+                    break
+                cut = end
+            else:
+                k = sym.find(CDC_PATTERN, start + CDC_MIN, end)
+                if k >= 0:
+                    cut = k + len(CDC_PATTERN)
+                elif end - start < CDC_MAX and not eof:
+                    break  # The pattern may still turn up in the next block
+                else:
+                    k = sym.find(CDC_BACKUP, start + CDC_MIN, end)
+                    cut = k + len(CDC_BACKUP) if k >= 0 else end
+            yield buf[start:cut]
+            start = cut
+        buf = buf[start:]
+
+def dedup_file(server_url, filepath, quiet=False):
+    """Upload a file as content-defined chunks, sending only those the server lacks"""
+    proxy = xmlrpc.client.ServerProxy(server_url)
+    filename = os.path.basename(filepath)
+    
+    # First pass: chunk boundaries and digests
+    chunks = []  # (digest, offset, length)
+    offset = 0
+    with open(filepath, 'rb') as f:
+        for chunk in iter_cdc_chunks(f):
+            chunks.append((hashlib.sha256(chunk).hexdigest(), offset, len(chunk)))
+            offset += len(chunk)
+    filesize = offset
+    digests = [digest for digest, _, _ in chunks]
+    
+    missing = set()
+    for i in range(0, len(digests), MISSING_BATCH):
+        missing.update(proxy.missing_chunks(digests[i:i + MISSING_BATCH]))
+    if not quiet:
+        new_bytes = sum(length for digest, _, length in {c[0]: c for c in chunks}.values() if digest in missing)
+        print(f"[+] {len(chunks)} chunks, {len(missing)} new ({new_bytes} of {filesize} bytes to send)")
+    
+    # Second pass: PUT each new chunk as a raw body over one keep-alive connection
+    url = urllib.parse.urlsplit(server_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, blocksize=STREAM_CHUNK)
+    sent = set()
+    try:
+        with open(filepath, 'rb') as f:
+            for digest, offset, length in chunks:
+                if digest not in missing or digest in sent:
+                    continue
+                f.seek(offset)
+                conn.request('PUT', f'/chunks/{digest}', body=f.read(length),
+                             headers={'Content-Type': 'application/octet-stream'})
+                response = conn.getresponse()
+                response.read()
+                if response.status != 204:
+                    return {'success': False, 'error': f'Server rejected chunk {digest[:12]}'}
+                sent.add(digest)
+                if not quiet:
+                    print(f"\rProgress: {len(sent)}/{len(missing)} chunks", end='', flush=True)
+    finally:
+        conn.close()
+    if missing and not quiet:
+        print()
+    
+    return proxy.commit_manifest(filename, digests, wire_int(filesize))
+
+def stream_file(server_url, transfer_id, filepath, filesize, ranges, quiet=False):
+    """PUT each byte range as a raw request body, skipping XML entirely"""
+    url = urllib.parse.urlsplit(server_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, blocksize=STREAM_CHUNK)
+    total = sum(end - start for start, end in ranges)
+    sent = 0
+    
+    def body(f, start, end):
+        nonlocal sent
+        f.seek(start)
+        left = end - start
+        while left:
+            chunk = f.read(min(STREAM_CHUNK, left))
+            if not chunk:
+                break
+            yield chunk
+            left -= len(chunk)
+            sent += len(chunk)
+            if not quiet:
+                print(f"\rProgress: {(sent / total) * 100:.1f}% ({sent}/{total} bytes)", end='', flush=True)
+    
+    try:
+        with open(filepath, 'rb') as f:
+            for start, end in ranges:
+                headers = {
+                    'Content-Length': str(end - start),
+                    'Content-Range': f'bytes {start}-{end - 1}/{filesize}',
+                    'Content-Type': 'application/octet-stream'
+                }
+                conn.request('PUT', f'/upload/{transfer_id}', body=body(f, start, end), headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 204:
+                    return False
+        return True
+    finally:
+        conn.close()
+
+def encode_chunk(chunk, mode):
+    if mode == 'binary':
+        return xmlrpc.client.Binary(chunk)
+    return base64.b64encode(chunk).decode('ascii')
+
+def multicall_results(multicall, count):
+    """Run a MultiCall and return one result per item, turning Faults into error dicts"""
+    results = multicall()
+    items = []
+    for i in range(count):
+        try:
+            items.append(results[i])
+        except xmlrpc.client.Fault as e:
+            items.append({'success': False, 'error': e.faultString})
+    return items
+
+def upload_chunks(server_url, transfer_id, filepath, ranges, mode, in_flight, chunk_size,
+                  quiet=False, per_call=PER_CALL):
+    """Upload offset-tagged chunks of the given byte ranges from a pool of workers,
+    each on its own persistent connection"""
+    local = threading.local()
+    
+    def upload(group):
+        # ServerProxy reuses its HTTP/1.1 connection but is not thread safe, so one per worker
+        if not hasattr(local, 'proxy'):
+            local.proxy = xmlrpc.client.ServerProxy(server_url)
+        length = sum(len(chunk) for _, chunk in group)
+        if len(group) == 1:
+            offset, chunk = group[0]
+            return length, [local.proxy.upload_chunk(transfer_id, encode_chunk(chunk, mode), wire_int(offset))]
+        multicall = xmlrpc.client.MultiCall(local.proxy)
+        for offset, chunk in group:
+            multicall.upload_chunk(transfer_id, encode_chunk(chunk, mode), wire_int(offset))
+        return length, multicall_results(multicall, len(group))
+    
+    total = sum(end - start for start, end in ranges)
+    sent = 0
+    pending = set()
+    
+    def collect(done):
+        nonlocal sent
+        for future in done:
+            length, results = future.result()
+            for result in results:
+                if not result['success']:
+                    return result.get('error', 'Unknown error')
+            sent += length
+        if not quiet:
+            print(f"\rProgress: {(sent / total) * 100:.1f}% ({sent}/{total} bytes)", end='', flush=True)
+        return None
+    
+    def read_chunks(f):
+        for start, end in ranges:
+            f.seek(start)
+            offset = start
+            while offset < end:
+                chunk = f.read(min(chunk_size, end - offset))
+                if not chunk:
+                    return
+                yield offset, chunk
+                offset += len(chunk)
+    
+    with ThreadPoolExecutor(max_workers=in_flight) as pool:
+        with open(filepath, 'rb') as f:
+            group = []
+            for offset, chunk in read_chunks(f):
+                group.append((offset, chunk))
+                if len(group) < per_call:
+                    continue
+                pending.add(pool.submit(upload, group))
+                group = []
+                # Bound memory to in_flight groups: wait for a slot before reading more
+                if len(pending) >= in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    error = collect(done)
+                    if error:
+                        return error
+            if group:
+                pending.add(pool.submit(upload, group))
+        return collect(pending)
+
+def forget_transfer(resume_key):
+    with RESUME_LOCK:
+        state = load_resume_state()
+        if state.pop(resume_key, None) is not None:
+            save_resume_state(state)
+
+def send_files(server_url, paths, mode='put', quiet=False):
+    """Send many files, packing small ones into system.multicall batches of upload_file
+    
+    The server stores files by base name only, so a set where two paths share a
+    name (e.g. a/x.txt and b/x.txt from a directory walk) is refused up front
+    instead of letting one silently overwrite the other. dedup uploads go through
+    the chunk store one file at a time; the other modes batch small files.
+    """
+    missing = [path for path in paths if not os.path.isfile(path)]
+    for path in missing:
+        print(f"Error: File not found: {path}")
+    paths = [path for path in paths if os.path.isfile(path)] if missing else paths
+    
+    by_name = {}
+    for path in paths:
+        by_name.setdefault(os.path.basename(path), []).append(path)
+    clashes = {name: group for name, group in by_name.items() if len(group) > 1}
+    if clashes:
+        for name, group in sorted(clashes.items()):
+            print(f"[-] {len(group)} files would be stored as {name}: {', '.join(group)}")
+        print("[-] Nothing uploaded: the server keeps one file per name")
+        return False
+    
+    proxy = xmlrpc.client.ServerProxy(server_url)
+    small, large = [], []
+    for path in paths:
+        (small if mode != 'dedup' and os.path.getsize(path) <= SMALL_FILE else large).append(path)
+    
+    failed = []
+    stored = 0
+    batch, batch_bytes = [], 0
+    
+    def flush():
+        nonlocal stored
+        multicall = xmlrpc.client.MultiCall(proxy)
+        for path, data in batch:
+            multicall.upload_file(os.path.basename(path), encode_chunk(data, 'binary' if mode == 'put' else mode))
+        for (path, _), result in zip(batch, multicall_results(multicall, len(batch))):
+            if result['success']:
+                stored += 1
+            else:
+                failed.append((path, result.get('error', 'Unknown error')))
+        if not quiet:
+            print(f"\r[+] Stored {stored}/{len(small)} small files", end='', flush=True)
+    
+    for path in small:
+        with open(path, 'rb') as f:
+            data = f.read()
+        if batch and batch_bytes + len(data) > MULTICALL_BYTES:
+            flush()
+            batch, batch_bytes = [], 0
+        batch.append((path, data))
+        batch_bytes += len(data)
+    if batch:
+        flush()
+    if small and not quiet:
+        print()
+    
+    for path in large:
+        if not send_file(server_url, path, mode, quiet):
+            failed.append((path, 'upload failed'))
+    
+    for path, error in failed:
+        print(f"[-] {path}: {error}")
+    return not failed and not missing
+
+def send_file(server_url, filepath, mode='put', quiet=False, in_flight=IN_FLIGHT, chunk_size=CHUNK_SIZE,
+              per_call=PER_CALL):
     """Send a file to the RPC server"""
     
     if not os.path.isfile(filepath):
@@ -28,40 +373,63 @@ def send_file(server_url, filepath):
         print(f"[-] Cannot connect to server: {e}")
         return False
     
+    if mode == 'dedup':
+        try:
+            result = dedup_file(server_url, filepath, quiet)
+        except Exception as e:
+            print(f"[-] Error during transfer: {e}")
+            return False
+        if not result['success']:
+            print(f"[-] Transfer failed: {result.get('error', 'Unknown error')}")
+            return False
+        print(f"[+] File stored on server as {result['chunks']} chunks: {result['filepath']}")
+        return True
+    
+    # An earlier run of this upload may have left a transfer we can resume
+    resume_key = f"{server_url}|{os.path.abspath(filepath)}"
+    previous = load_resume_state().get(resume_key)
+    mtime_ns = os.stat(filepath).st_mtime_ns
+    transfer_id = None
+    ranges = [(0, filesize)] if filesize else []
+    
     try:
-        # Start transfer
-        print(f"[+] Initiating transfer: {filename} ({filesize} bytes)")
-        transfer_id = proxy.start_transfer(filename, filesize)
-        print(f"[+] Transfer ID: {transfer_id}")
+        if previous and previous['size'] == filesize and previous['mtime_ns'] == mtime_ns:
+            status = proxy.get_transfer_status(previous['transfer_id'])
+            if status['success']:
+                transfer_id = previous['transfer_id']
+                ranges = missing_ranges(status['ranges'], filesize)
+                print(f"[+] Resuming transfer {transfer_id}: {int(status['received'])}/{filesize} bytes already on server")
         
-        # Send file in chunks
-        sent = 0
-        with open(filepath, 'rb') as f:
-            while True:
-                chunk = f.read(CHUNK_SIZE)
-                if not chunk:
-                    break
-                
-                # Encode chunk as base64 for XML-RPC
-                encoded_chunk = base64.b64encode(chunk).decode('ascii')
-                
-                result = proxy.upload_chunk(transfer_id, encoded_chunk)
-                
-                if not result['success']:
-                    print(f"\n[-] Upload failed: {result.get('error', 'Unknown error')}")
-                    proxy.cancel_transfer(transfer_id)
-                    return False
-                
-                sent += len(chunk)
-                progress = (sent / filesize) * 100
-                print(f"\rProgress: {progress:.1f}% ({sent}/{filesize} bytes)", end='', flush=True)
+        if transfer_id is None:
+            # Start transfer
+            print(f"[+] Initiating transfer: {filename} ({filesize} bytes)")
+            transfer_id = proxy.start_transfer(filename, wire_int(filesize))
+            print(f"[+] Transfer ID: {transfer_id}")
+            remember_transfer(resume_key, {'transfer_id': transfer_id, 'size': filesize, 'mtime_ns': mtime_ns})
         
-        print()
+        if mode == 'put':
+            if not stream_file(server_url, transfer_id, filepath, filesize, ranges, quiet):
+                print("\n[-] Upload failed: server rejected the stream")
+                proxy.cancel_transfer(transfer_id)
+                forget_transfer(resume_key)
+                return False
+        else:
+            error = upload_chunks(server_url, transfer_id, filepath, ranges, mode,
+                                  in_flight, chunk_size, quiet, per_call)
+            if error:
+                print(f"\n[-] Upload failed: {error}")
+                proxy.cancel_transfer(transfer_id)
+                forget_transfer(resume_key)
+                return False
+        
+        if not quiet:
+            print()
         
         # Finalize transfer
         result = proxy.finish_transfer(transfer_id)
         
         if result['success']:
+            forget_transfer(resume_key)
             print(f"[+] Transfer completed successfully!")
             print(f"[+] File saved on server: {result['filepath']}")
             return True
@@ -70,38 +438,157 @@ def send_file(server_url, filepath):
             return False
             
     except Exception as e:
+        # Keep the partial upload on the server; running the same command again resumes it
         print(f"\n[-] Error during transfer: {e}")
-        try:
-            proxy.cancel_transfer(transfer_id)
-        except:
-            pass
+        if transfer_id is not None:
+            print(f"[-] Re-run the upload to resume transfer {transfer_id}")
         return False
 
-def list_files(server_url):
-    """List files on the server"""
-    proxy = xmlrpc.client.ServerProxy(server_url)
+def download_file(server_url, name, dest=None, connections=DOWNLOAD_CONNECTIONS, quiet=False):
+    """Fetch a received file from GET /files/<name> as DOWNLOAD_PART byte ranges
+    over parallel keep-alive connections, each written straight into place"""
+    url = urllib.parse.urlsplit(server_url)
+    path = f"/files/{urllib.parse.quote(name)}"
+    dest = dest or os.path.basename(name)
     
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80)
     try:
-        files = proxy.list_files()
-        print(f"\n[+] Files on server ({len(files)} total):")
-        for f in files:
-            print(f"  - {f['name']} ({f['size']} bytes)")
+        conn.request('HEAD', path)
+        response = conn.getresponse()
+        response.read()
+    finally:
+        conn.close()
+    if response.status != 200:
+        print(f"[-] {name}: {response.status} {response.reason}")
+        return False
+    filesize = int(response.getheader('Content-Length'))
+    ranged = response.getheader('Accept-Ranges') == 'bytes'
+    if ranged:
+        parts = [(start, min(start + DOWNLOAD_PART, filesize)) for start in range(0, filesize, DOWNLOAD_PART)]
+    else:
+        parts, connections = [(0, filesize)], 1
+    with open(dest, 'wb') as f:
+        f.truncate(filesize)
+    
+    lock = threading.Lock()
+    pending = iter(parts)
+    received = 0
+    
+    def fetch():
+        nonlocal received
+        conn = http.client.HTTPConnection(url.hostname, url.port or 80)
+        buf = bytearray(STREAM_CHUNK)
+        view = memoryview(buf)
+        try:
+            with open(dest, 'r+b') as f:
+                while True:
+                    with lock:
+                        part = next(pending, None)
+                    if part is None:
+                        return True
+                    start, end = part
+                    conn.request('GET', path, headers={'Range': f'bytes={start}-{end - 1}'} if ranged else {})
+                    response = conn.getresponse()
+                    # A 200 carries the whole file: only usable when that is the part asked for
+                    whole = start == 0 and end == filesize
+                    if response.status == 206:
+                        ok = (response.getheader('Content-Range') or '').startswith(f'bytes {start}-{end - 1}/')
+                    else:
+                        ok = response.status == 200 and whole
+                    if not ok:
+                        response.read()
+                        return False
+                    f.seek(start)
+                    left = end - start
+                    while left:
+                        n = response.readinto(view[:min(len(buf), left)])
+                        if not n:
+                            return False
+                        f.write(view[:n])
+                        left -= n
+                        with lock:
+                            received += n
+                        if not quiet:
+                            print(f"\rProgress: {(received / filesize) * 100:.1f}% ({received}/{filesize} bytes)",
+                                  end='', flush=True)
+                    response.read()
+        finally:
+            conn.close()
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(connections, len(parts)))) as pool:
+        ok = all(pool.map(lambda _: fetch(), range(max(1, min(connections, len(parts))))))
+    elapsed = time.perf_counter() - start
+    if not quiet:
+        if filesize:
+            print()
+        if ok:
+            print(f"[+] Saved {dest} ({filesize} bytes, {filesize / 1e6 / max(elapsed, 1e-9):.1f} MB/s)")
+        else:
+            print(f"[-] Download of {name} failed")
+    return ok
+
+def list_files(server_url, prefix=''):
+    """List files on the server, one page at a time"""
+    proxy = xmlrpc.client.ServerProxy(server_url, allow_none=True)
+    
+    try:
+        offset = 0
+        while offset is not None:
+            page = proxy.list_files(prefix, offset, LIST_PAGE_SIZE)
+            if offset == 0:
+                print(f"\n[+] Files on server ({page['total']} total):")
+            for f in page['files']:
+                print(f"  - {f['name']} ({int(f['size'])} bytes)")
+            offset = page['next_offset']
     except Exception as e:
         print(f"[-] Error: {e}")
 
 if __name__ == '__main__':
     if len(sys.argv) < 3:
         print("Usage:")
-        print("  Upload:   python rpc_client.py <server_url> <file_path>")
-        print("  List:     python rpc_client.py <server_url> --list")
+        print("  Upload:   python rpc_client.py <server_url> <file_path> [--mode put|binary|base64|dedup]")
+        print("                                 [--in-flight N] [--chunk-size BYTES] [--per-call N]  (binary/base64 modes)")
+        print("  Upload many: python rpc_client.py <server_url> <dir_or_file> [<dir_or_file> ...] [--mode ...]")
+        print("  List:     python rpc_client.py <server_url> --list [prefix]")
+        print("  Download: python rpc_client.py <server_url> --get <name> [dest] [--connections N]")
         print("\nExample:")
         print("  python rpc_client.py http://localhost:9000 document.pdf")
         sys.exit(1)
     
     server_url = sys.argv[1]
     
-    if len(sys.argv) == 3 and sys.argv[2] == '--list':
-        list_files(server_url)
+    if sys.argv[2] == '--list':
+        prefix = sys.argv[3] if len(sys.argv) > 3 else ''
+        list_files(server_url, prefix)
+    elif sys.argv[2] == '--get':
+        args = [a for i, a in enumerate(sys.argv[3:], 3) if not a.startswith('--') and sys.argv[i - 1] != '--connections']
+        if not args:
+            print("Usage: python rpc_client.py <server_url> --get <name> [dest] [--connections N]")
+            sys.exit(1)
+        connections = int(sys.argv[sys.argv.index('--connections') + 1]) if '--connections' in sys.argv else DOWNLOAD_CONNECTIONS
+        ok = download_file(server_url, args[0], args[1] if len(args) > 1 else None, connections)
+        sys.exit(0 if ok else 1)
     else:
-        filepath = sys.argv[2]
-        send_file(server_url, filepath)
+        options = ('--mode', '--in-flight', '--chunk-size', '--per-call')
+        paths = [a for i, a in enumerate(sys.argv[2:], 2) if not a.startswith('--') and sys.argv[i - 1] not in options]
+        mode = 'put'
+        if '--mode' in sys.argv:
+            mode = sys.argv[sys.argv.index('--mode') + 1]
+            if mode not in UPLOAD_MODES:
+                print(f"Unknown mode {mode}, expected one of {', '.join(UPLOAD_MODES)}")
+                sys.exit(1)
+        in_flight = int(sys.argv[sys.argv.index('--in-flight') + 1]) if '--in-flight' in sys.argv else IN_FLIGHT
+        chunk_size = int(sys.argv[sys.argv.index('--chunk-size') + 1]) if '--chunk-size' in sys.argv else CHUNK_SIZE
+        per_call = int(sys.argv[sys.argv.index('--per-call') + 1]) if '--per-call' in sys.argv else PER_CALL
+        if len(paths) == 1 and not os.path.isdir(paths[0]):
+            send_file(server_url, paths[0], mode, in_flight=in_flight, chunk_size=chunk_size, per_call=per_call)
+        else:
+            files = []
+            for path in paths:
+                if os.path.isdir(path):
+                    for root, _, names in os.walk(path):
+                        files.extend(os.path.join(root, name) for name in names)
+                else:
+                    files.append(path)
+            send_files(server_url, files, mode)
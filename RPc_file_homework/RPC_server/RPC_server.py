@@ -1,120 +1,678 @@
 #!/usr/bin/env python3
 # rpc_server.py
-from xmlrpc.server import SimpleXMLRPCServer
+from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+from socketserver import ThreadingMixIn
+import xmlrpc.client
+import threading
 import base64
+import sys
 import os
+import json
+import time
+import uuid
+import bisect
 import hashlib
+import urllib.parse
 
 HOST = '0.0.0.0'
 PORT = 9000
 SAVE_DIR = 'received'
+STREAM_CHUNK = 1024 * 1024  # Read size for raw PUT uploads
+PARTIAL_DIR = '.partial'  # Under SAVE_DIR: unfinished transfer data and their received-range state
+STATE_SAVE_INTERVAL = 1.0  # Seconds between received-range checkpoints per transfer
+STORE_DIR = '.store'  # Under SAVE_DIR: content-addressed chunks and the manifests of deduplicated files
+HEX_DIGITS = set('0123456789abcdef')
+
+# Identical copy of the canonical DirectoryIndex in MPI_homework/server/MPI_server.py (each homework
+# runs as a standalone script, with no shared module to import); change the two together.
+class DirectoryIndex:
+    """In-memory index of the files in a directory, updated as transfers finish"""
+
+    def __init__(self, directory, sidecar, extra_sizes=None):
+        self.directory = directory
+        self.sidecar = sidecar
+        self.extra_sizes = extra_sizes  # Optional callable for files kept outside the directory (chunk manifests)
+        self.sizes = {}
+        self.names = []  # Kept sorted for prefix lookups
+        self.mtime_ns = None  # Directory mtime the index is known to match
+        if not self.load():
+            self.rebuild()
+
+    def rebuild(self):
+        """Rescan the directory: one scandir pass, plus a stat per file for its size except on Windows"""
+        sizes = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    sizes[entry.name] = entry.stat().st_size
+        if self.extra_sizes:
+            sizes.update(self.extra_sizes())
+        self.sizes = sizes
+        self.names = sorted(sizes)
+        self.mtime_ns = os.stat(self.directory).st_mtime_ns
+        self.save()
+
+    def load(self):
+        """Load the sidecar if the directory has not changed since it was written"""
+        try:
+            with open(self.sidecar) as f:
+                data = json.load(f)
+            if data['mtime_ns'] != os.stat(self.directory).st_mtime_ns:
+                return False
+            self.sizes = data['files']
+        except (OSError, ValueError, KeyError):
+            return False
+        self.names = sorted(self.sizes)
+        self.mtime_ns = data['mtime_ns']
+        return True
+
+    def save(self):
+        """Persist the index so the next start can skip the rescan"""
+        data = {
+            'mtime_ns': self.mtime_ns,
+            'files': self.sizes
+        }
+        tmp_path = f"{self.sidecar}.{uuid.uuid4().hex}.tmp"  # Ranks sharing the sidecar save at the same time
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.sidecar)
+
+    def add(self, name, size=None):
+        """Record a new or rewritten file"""
+        if name not in self.sizes:
+            bisect.insort(self.names, name)
+        self.sizes[name] = os.path.getsize(os.path.join(self.directory, name)) if size is None else size
+        self.mtime_ns = os.stat(self.directory).st_mtime_ns
+
+    def discard(self, name):
+        """Forget a removed file"""
+        if self.sizes.pop(name, None) is not None:
+            del self.names[bisect.bisect_left(self.names, name)]
+        self.mtime_ns = os.stat(self.directory).st_mtime_ns
+
+    def refresh(self):
+        """Rescan only if something else changed the directory behind our back"""
+        if os.stat(self.directory).st_mtime_ns != self.mtime_ns:
+            self.rebuild()
+
+    def list(self, prefix='', offset=0, limit=None):
+        """Return one page of (name, size) entries and the total match count"""
+        self.refresh()
+        lo = bisect.bisect_left(self.names, prefix)
+        hi = bisect.bisect_left(self.names, prefix + '\U0010ffff') if prefix else len(self.names)
+        start = min(lo + max(offset, 0), hi)
+        end = hi if limit is None else min(hi, start + limit)
+        files = [{'name': n, 'size': self.sizes[n]} for n in self.names[start:end]]
+        return files, hi - lo
+
+def parse_range(header, size):
+    """Parse a single-range 'bytes=a-b' / 'bytes=a-' / 'bytes=-n' header into [start, end)
+    
+    Returns None for anything else (multiple ranges, other units, an invalid range
+    such as 'bytes=5-3'), which RFC 9110 says to ignore and answer with the whole
+    file; raises ValueError if the range is valid but unsatisfiable.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip() != 'bytes' or ',' in spec:
+        return None
+    first, dash, last = spec.strip().partition('-')
+    if not dash or not (first or last) or not all(p.isdigit() for p in (first, last) if p):
+        return None
+    if first:
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        end = int(last) + 1 if last else size
+    else:
+        start, end = max(size - int(last), 0), size
+    if start >= size or end <= start:
+        raise ValueError(f"Range {header!r} outside 0-{size}")
+    return start, min(end, size)
+
+def wire_int(n):
+    """XML-RPC ints are 32-bit, so larger sizes and offsets travel as strings"""
+    return n if -xmlrpc.client.MAXINT <= n <= xmlrpc.client.MAXINT else str(n)
+
+def add_range(ranges, start, end):
+    """Merge [start, end) into a sorted list of disjoint [start, end) ranges"""
+    i = bisect.bisect_left(ranges, [start, start])
+    if i > 0 and ranges[i - 1][1] >= start:
+        i -= 1
+    j = i
+    while j < len(ranges) and ranges[j][0] <= end:
+        start = min(start, ranges[j][0])
+        end = max(end, ranges[j][1])
+        j += 1
+    ranges[i:j] = [[start, end]]
+
+# Copy of the canonical ChunkStore in MPI_homework/server/MPI_server.py, plus segments() for HTTP
+# downloads (each homework runs as a standalone script); change the shared methods in both.
+class ChunkStore:
+    """Content-addressed chunk store: chunks are kept once under their sha256,
+    and a deduplicated file is a manifest listing its chunk digests in order
+    """
+    
+    def __init__(self, root):
+        self.chunk_dir = os.path.join(root, 'chunks')
+        self.manifest_dir = os.path.join(root, 'manifests')
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        os.makedirs(self.manifest_dir, exist_ok=True)
+    
+    def _chunk_path(self, digest):
+        if len(digest) != 64 or not set(digest) <= HEX_DIGITS:
+            raise ValueError(f"Bad chunk digest {digest!r}")
+        return os.path.join(self.chunk_dir, digest[:2], digest)
+    
+    def _manifest_path(self, name):
+        return os.path.join(self.manifest_dir, os.path.basename(name) + '.json')
+    
+    def missing(self, digests):
+        """Return the digests not stored yet, in order and without repeats"""
+        seen = set()
+        missing = []
+        for digest in digests:
+            if digest not in seen:
+                seen.add(digest)
+                if not os.path.exists(self._chunk_path(digest)):
+                    missing.append(digest)
+        return missing
+    
+    def put(self, digest, data):
+        """Store one chunk; refuses data that does not hash to its digest"""
+        path = self._chunk_path(digest)
+        if hashlib.sha256(data).hexdigest() != digest:
+            return False
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return True
+    
+    def commit(self, name, digests, size):
+        """Record name as the concatenation of the given chunks
+        
+        Returns the digests that are still missing; the manifest is only
+        written once none are and their sizes add up to size.
+        """
+        missing = self.missing(digests)
+        if missing:
+            return missing
+        total = sum(os.path.getsize(self._chunk_path(d)) for d in digests)
+        if total != size:
+            raise ValueError(f"Chunks add up to {total} bytes, expected {size}")
+        path = self._manifest_path(name)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'size': size, 'chunks': digests}, f)
+        os.replace(tmp_path, path)
+        return []
+    
+    def manifest(self, name):
+        """Return {'size', 'chunks'} for a deduplicated file, or None"""
+        try:
+            with open(self._manifest_path(name)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+    
+    def read(self, name):
+        """Yield the contents of a deduplicated file chunk by chunk"""
+        for digest in self.manifest(name)['chunks']:
+            with open(self._chunk_path(digest), 'rb') as f:
+                yield f.read()
+    
+    def segments(self, manifest, start, end):
+        """Yield (chunk path, offset, count) covering bytes [start, end) of a deduplicated file"""
+        pos = 0
+        for digest in manifest['chunks']:
+            if pos >= end:
+                return
+            path = self._chunk_path(digest)
+            size = os.path.getsize(path)
+            if pos + size > start:
+                offset = max(start - pos, 0)
+                yield path, offset, min(size, end - pos) - offset
+            pos += size
+    
+    def discard(self, name):
+        """Drop the manifest for name (the chunks stay for other files)"""
+        try:
+            os.remove(self._manifest_path(name))
+            return True
+        except FileNotFoundError:
+            return False
+    
+    def sizes(self):
+        """Map every deduplicated file name to its size"""
+        sizes = {}
+        for entry in os.scandir(self.manifest_dir):
+            if entry.name.endswith('.json'):
+                with open(entry.path) as f:
+                    sizes[entry.name[:-len('.json')]] = json.load(f)['size']
+        return sizes
 
 class FileTransferService:
     def __init__(self, save_dir):
         self.save_dir = save_dir
-        os.makedirs(save_dir, exist_ok=True)
+        self.partial_dir = os.path.join(save_dir, PARTIAL_DIR)
+        os.makedirs(self.partial_dir, exist_ok=True)
         self.active_transfers = {}
+        self.lock = threading.Lock()  # Guards active_transfers and index; each transfer has its own write lock
+        self.store = ChunkStore(os.path.join(save_dir, STORE_DIR))
+        # Sidecar next to save_dir; deduplicated files are listed alongside plain ones
+        self.index = DirectoryIndex(save_dir, save_dir.rstrip(os.sep) + '.index.json', self.store.sizes)
+        self._load_partial_transfers()
+    
+    def _load_partial_transfers(self):
+        """Reopen transfers left unfinished by a previous run so clients can resume them"""
+        for name in os.listdir(self.partial_dir):
+            if not name.endswith('.json'):
+                continue
+            transfer_id = name[:-len('.json')]
+            try:
+                with open(os.path.join(self.partial_dir, name)) as f:
+                    state = json.load(f)
+                self.active_transfers[transfer_id] = self._open_transfer(
+                    transfer_id, state['filename'], state['filesize'], state['ranges'])
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[-] Skipping unreadable partial transfer {transfer_id}: {e}")
+        if self.active_transfers:
+            print(f"[+] Resumable transfers: {len(self.active_transfers)}")
+    
+    def _open_transfer(self, transfer_id, filename, filesize, ranges):
+        partial_path = os.path.join(self.partial_dir, transfer_id + '.part')
+        fd = os.open(partial_path, os.O_RDWR | os.O_CREAT, 0o644)
+        return {
+            'filename': filename,
+            'filepath': os.path.join(self.save_dir, os.path.basename(filename)),
+            'partial_path': partial_path,
+            'state_path': os.path.join(self.partial_dir, transfer_id + '.json'),
+            'filesize': filesize,
+            'ranges': ranges,  # Received [start, end) byte ranges
+            'received': sum(end - start for start, end in ranges),
+            'position': ranges[0][1] if ranges and ranges[0][0] == 0 else 0,  # Next offset for offset-less chunks
+            'saved_at': 0.0,
+            'file_handle': os.fdopen(fd, 'r+b', buffering=0),
+            'lock': threading.Lock()
+        }
+    
+    def _save_state(self, transfer):
+        state = {
+            'filename': transfer['filename'],
+            'filesize': transfer['filesize'],
+            'ranges': transfer['ranges']
+        }
+        tmp_path = transfer['state_path'] + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, transfer['state_path'])
+        transfer['saved_at'] = time.time()
+    
+    def _write_at(self, transfer, data, offset):
+        """Write data at offset and record the range; caller holds the transfer lock"""
+        fd = transfer['file_handle'].fileno()
+        view = memoryview(data)
+        pos = offset
+        while view:
+            n = os.pwrite(fd, view, pos)
+            view = view[n:]
+            pos += n
+        add_range(transfer['ranges'], offset, pos)
+        transfer['received'] = sum(end - start for start, end in transfer['ranges'])
+        if time.time() - transfer['saved_at'] >= STATE_SAVE_INTERVAL:
+            self._save_state(transfer)
+    
+    def _status(self, transfer):
+        return {
+            'success': True,
+            'received': wire_int(transfer['received']),
+            'expected': wire_int(transfer['filesize'])
+        }
+    
+    def _save_all(self):
+        """Persist the received ranges of every open transfer (called on shutdown)"""
+        with self.lock:
+            transfers = list(self.active_transfers.values())
+        for transfer in transfers:
+            with transfer['lock']:
+                if not transfer['file_handle'].closed:
+                    self._save_state(transfer)
     
     def ping(self):
         """Health check endpoint"""
         return "pong"
     
     def start_transfer(self, filename, filesize):
-        """Initialize a file transfer session"""
-        transfer_id = hashlib.md5(f"{filename}{filesize}".encode()).hexdigest()
-        filepath = os.path.join(self.save_dir, os.path.basename(filename))
-        
-        self.active_transfers[transfer_id] = {
-            'filename': filename,
-            'filepath': filepath,
-            'filesize': filesize,
-            'received': 0,
-            'file_handle': open(filepath, 'wb')
-        }
+        """Initialize a file transfer session; data lands in a partial file until finished"""
+        transfer_id = uuid.uuid4().hex
+        transfer = self._open_transfer(transfer_id, filename, int(filesize), [])
+        self._save_state(transfer)
+        with self.lock:
+            self.active_transfers[transfer_id] = transfer
         
         print(f"[+] Started transfer {transfer_id}: {filename} ({filesize} bytes)")
         return transfer_id
     
-    def upload_chunk(self, transfer_id, chunk_data):
-        """Receive a file chunk (base64 encoded)"""
-        if transfer_id not in self.active_transfers:
+    def get_transfer_status(self, transfer_id):
+        """Report which byte ranges of a transfer have been received"""
+        transfer = self.active_transfers.get(transfer_id)
+        if transfer is None:
             return {'success': False, 'error': 'Invalid transfer ID'}
         
-        transfer = self.active_transfers[transfer_id]
+        with transfer['lock']:
+            status = self._status(transfer)
+            status['filename'] = transfer['filename']
+            status['ranges'] = [[wire_int(start), wire_int(end)] for start, end in transfer['ranges']]
+        return status
+    
+    def upload_chunk(self, transfer_id, chunk_data, offset=None):
+        """Receive a file chunk (xmlrpc Binary, or a base64 string from older clients)
+        
+        With an explicit offset the chunk is written in place with pwrite, so
+        chunks may arrive out of order from parallel clients.
+        """
+        transfer = self.active_transfers.get(transfer_id)
+        if transfer is None:
+            return {'success': False, 'error': 'Invalid transfer ID'}
         
         try:
-            # Decode base64 chunk
-            chunk = base64.b64decode(chunk_data)
-            transfer['file_handle'].write(chunk)
-            transfer['received'] += len(chunk)
+            if isinstance(chunk_data, xmlrpc.client.Binary):
+                chunk = chunk_data.data
+            else:
+                chunk = base64.b64decode(chunk_data)
+            with transfer['lock']:
+                if transfer['file_handle'].closed:
+                    return {'success': False, 'error': 'Transfer already closed'}
+                offset = transfer['position'] if offset is None else int(offset)
+                if offset < 0 or offset + len(chunk) > transfer['filesize']:
+                    return {'success': False, 'error': 'Chunk outside file bounds'}
+                self._write_at(transfer, chunk, offset)
+                transfer['position'] = offset + len(chunk)
+                status = self._status(transfer)
             
             progress = (transfer['received'] / transfer['filesize']) * 100
             print(f"\r[{transfer_id[:8]}] Progress: {progress:.1f}%", end='', flush=True)
             
-            return {
-                'success': True,
-                'received': transfer['received'],
-                'expected': transfer['filesize']
-            }
+            return status
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    def upload_file(self, filename, data):
+        """Store a whole small file in one call (meant to be batched with system.multicall)
+        
+        data is an xmlrpc Binary or a base64 string, as for upload_chunk.
+        """
+        if isinstance(data, xmlrpc.client.Binary):
+            data = data.data
+        else:
+            data = base64.b64decode(data)
+        filepath = os.path.join(self.save_dir, os.path.basename(filename))
+        tmp_path = os.path.join(self.partial_dir, f"{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, filepath)
+        self.store.discard(filename)
+        with self.lock:
+            self.index.add(os.path.basename(filepath))
+        return {'success': True, 'filepath': filepath, 'received': len(data)}
+    
+    def _receive_stream(self, transfer_id, stream, length, offset=0):
+        """Copy a raw HTTP request body into the transfer file (not exposed over XML-RPC)"""
+        transfer = self.active_transfers.get(transfer_id)
+        if transfer is None or offset < 0 or offset + length > transfer['filesize']:
+            return False
+        
+        buffer = bytearray(STREAM_CHUNK)
+        view = memoryview(buffer)
+        remaining = length
+        while remaining:
+            n = stream.readinto(view[:min(remaining, STREAM_CHUNK)])
+            if not n:
+                break
+            with transfer['lock']:
+                if transfer['file_handle'].closed:
+                    return False
+                self._write_at(transfer, view[:n], offset)
+            offset += n
+            remaining -= n
+            
+            progress = (transfer['received'] / transfer['filesize']) * 100 if transfer['filesize'] else 100.0
+            print(f"\r[{transfer_id[:8]}] Progress: {progress:.1f}%", end='', flush=True)
+        return remaining == 0
+    
     def finish_transfer(self, transfer_id):
-        """Finalize the transfer"""
-        if transfer_id not in self.active_transfers:
+        """Finalize the transfer once every byte has arrived; otherwise keep it resumable"""
+        with self.lock:
+            transfer = self.active_transfers.get(transfer_id)
+            complete = transfer is not None and transfer['received'] == transfer['filesize']
+            if complete:
+                del self.active_transfers[transfer_id]
+        if transfer is None:
             return {'success': False, 'error': 'Invalid transfer ID'}
+        if not complete:
+            with transfer['lock']:
+                self._save_state(transfer)
+                result = self._status(transfer)
+            result.update({'success': False, 'error': 'Transfer incomplete, resume missing ranges'})
+            return result
         
-        transfer = self.active_transfers[transfer_id]
-        transfer['file_handle'].close()
-        
-        success = transfer['received'] == transfer['filesize']
+        with transfer['lock']:
+            transfer['file_handle'].close()
+        os.replace(transfer['partial_path'], transfer['filepath'])
+        os.remove(transfer['state_path'])
+        self.store.discard(transfer['filename'])
         
         print(f"\n[+] Transfer {transfer_id[:8]} completed: {transfer['filepath']}")
+        with self.lock:
+            self.index.add(os.path.basename(transfer['filepath']))
         
-        del self.active_transfers[transfer_id]
+        result = self._status(transfer)
+        result['filepath'] = transfer['filepath']
+        return result
+    
+    def cancel_transfer(self, transfer_id):
+        """Cancel an ongoing transfer and drop its partial data"""
+        with self.lock:
+            transfer = self.active_transfers.pop(transfer_id, None)
+        if transfer is None:
+            return {'success': False, 'error': 'Transfer not found'}
         
+        with transfer['lock']:
+            transfer['file_handle'].close()
+        os.remove(transfer['partial_path'])
+        os.remove(transfer['state_path'])
+        return {'success': True}
+    
+    def missing_chunks(self, digests):
+        """Dedup negotiation: which of these chunk digests still need to be sent"""
+        return self.store.missing(digests)
+    
+    def put_chunk(self, digest, data):
+        """Store one content-addressed chunk (batched with system.multicall)"""
+        if isinstance(data, xmlrpc.client.Binary):
+            data = data.data
+        if not self.store.put(digest, data):
+            return {'success': False, 'error': f'Chunk does not match digest {digest[:12]}'}
+        return {'success': True}
+    
+    def commit_manifest(self, filename, digests, filesize):
+        """Store filename as a manifest of already uploaded chunks"""
+        name = os.path.basename(filename)
+        try:
+            missing = self.store.commit(name, digests, int(filesize))
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}
+        if missing:
+            return {'success': False, 'error': 'Chunks missing', 'missing': missing}
+        
+        # The manifest now stands for the file; drop any plain copy of it
+        filepath = os.path.join(self.save_dir, name)
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        with self.lock:
+            self.index.add(name, int(filesize))
+        print(f"[+] Stored {name} as {len(digests)} chunks ({filesize} bytes)")
+        return {'success': True, 'filepath': filepath, 'chunks': len(digests)}
+    
+    def _download(self, name):
+        """(size, segments) for a received file, or None; segments(start, end) yields
+        the (path, offset, count) pieces to send, so downloads never pass through Python"""
+        name = os.path.basename(name)
+        if not name or name.startswith('.'):
+            return None
+        path = os.path.join(self.save_dir, name)
+        if os.path.isfile(path):
+            return os.path.getsize(path), lambda start, end: [(path, start, end - start)]
+        manifest = self.store.manifest(name)
+        if manifest is None:
+            return None
+        return manifest['size'], lambda start, end: self.store.segments(manifest, start, end)
+    
+    def list_files(self, prefix='', offset=0, limit=None):
+        """List one page of received files, optionally filtered by name prefix"""
+        with self.lock:
+            files, total = self.index.list(prefix, offset, limit)
+        for f in files:
+            f['size'] = wire_int(f['size'])
+        next_offset = offset + len(files)
         return {
-            'success': success,
-            'filepath': transfer['filepath'],
-            'received': transfer['received'],
-            'expected': transfer['filesize']
+            'files': files,
+            'total': total,
+            'next_offset': next_offset if next_offset < total else None
         }
+
+class FileTransferRequestHandler(SimpleXMLRPCRequestHandler):
+    """XML-RPC handler that also takes raw file bodies on PUT /upload/<transfer_id>
+    and raw dedup chunks on PUT /chunks/<sha256>, and serves downloads on
+    GET /files/<name>
     
-    def cancel_transfer(self, transfer_id):
-        """Cancel an ongoing transfer"""
-        if transfer_id in self.active_transfers:
-            transfer = self.active_transfers[transfer_id]
-            transfer['file_handle'].close()
-            os.remove(transfer['filepath'])
-            del self.active_transfers[transfer_id]
-            return {'success': True}
-        return {'success': False, 'error': 'Transfer not found'}
-    
-    def list_files(self):
-        """List received files"""
-        files = []
-        for f in os.listdir(self.save_dir):
-            path = os.path.join(self.save_dir, f)
-            if os.path.isfile(path):
-                files.append({
-                    'name': f,
-                    'size': os.path.getsize(path)
-                })
-        return files
+    A Content-Range: bytes <start>-<end>/<total> header writes the body at
+    <start>, which is how clients resume the missing ranges of a transfer.
+    Downloads honour a single Range header and go out with sendfile.
+    """
+    
+    def do_GET(self):
+        self._serve_file(send_body=True)
+    
+    def do_HEAD(self):
+        self._serve_file(send_body=False)
+    
+    def _serve_file(self, send_body):
+        parts = self.path.strip('/').split('/', 1)
+        found = None
+        if len(parts) == 2 and parts[0] == 'files':
+            found = self.server.instance._download(urllib.parse.unquote(parts[1]))
+        if found is None:
+            self.send_error(404)
+            return
+        size, segments = found
+        
+        start, end = 0, size
+        status = 200
+        if self.headers.get('Range'):
+            try:
+                requested = parse_range(self.headers['Range'], size)
+            except ValueError:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if requested:
+                start, end = requested
+                status = 206
+        
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start))
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end - 1}/{size}')
+        self.end_headers()
+        self.wfile.flush()  # The XML-RPC handler buffers wfile; the headers must go out before the body
+        if not send_body:
+            return
+        # socket.sendfile uses os.sendfile where the OS has it: file pages go to the socket in the kernel
+        for path, offset, count in segments(start, end):
+            if count > 0:
+                with open(path, 'rb') as f:
+                    self.connection.sendfile(f, offset, count)
+    
+    def do_PUT(self):
+        parts = self.path.strip('/').split('/')
+        if len(parts) != 2 or parts[0] not in ('upload', 'chunks'):
+            self.send_error(404)
+            return
+        
+        length = int(self.headers.get('Content-Length', 0))
+        if parts[0] == 'chunks':
+            try:
+                stored = self.server.instance.store.put(parts[1], self.rfile.read(length))
+            except ValueError:
+                stored = False
+            if not stored:
+                self.send_error(400, 'Chunk does not match its digest')
+                return
+            self.send_response(204)
+            self.end_headers()
+            return
+        
+        offset = 0
+        content_range = self.headers.get('Content-Range')
+        if content_range:
+            try:
+                offset = int(content_range.split()[1].split('-')[0])
+            except (IndexError, ValueError):
+                self.send_error(400, 'Bad Content-Range')
+                return
+        if not self.server.instance._receive_stream(parts[1], self.rfile, length, offset):
+            self.send_error(400, 'Unknown transfer or short body')
+            return
+        
+        self.send_response(204)
+        self.end_headers()
+
+class KeepAliveRequestHandler(FileTransferRequestHandler):
+    """Keeps connections open between calls so clients can reuse them. Only for the
+    threaded server: a serial server would sit on one idle connection and never accept the next"""
+    protocol_version = 'HTTP/1.1'
+
+class SerialXMLRPCServer(SimpleXMLRPCServer):
+    """The original one-request-at-a-time server, with room for clients waiting to connect"""
+    request_queue_size = 128
+
+class ThreadingXMLRPCServer(ThreadingMixIn, SimpleXMLRPCServer):
+    """Handles each request on its own thread so uploads and listings run concurrently"""
+    daemon_threads = True
+    request_queue_size = 128
 
 def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    port = int(args[0]) if args else PORT
     service = FileTransferService(SAVE_DIR)
+    print(f"[+] Indexed {len(service.index.names)} stored files")
     
-    server = SimpleXMLRPCServer((HOST, PORT), allow_none=True)
+    # --serial keeps the original one-request-at-a-time server
+    serial = '--serial' in sys.argv
+    server_class = SerialXMLRPCServer if serial else ThreadingXMLRPCServer
+    handler = FileTransferRequestHandler if serial else KeepAliveRequestHandler
+    server = server_class((HOST, port), requestHandler=handler, allow_none=True)
     server.register_instance(service)
+    server.register_multicall_functions()
     
-    print(f"[+] RPC File Transfer Server listening on {HOST}:{PORT}")
+    mode = 'serial' if serial else 'threaded'
+    print(f"[+] RPC File Transfer Server listening on {HOST}:{port} ({mode})")
     print(f"[+] Files will be saved to: {SAVE_DIR}/")
     
     try:
         server.serve_forever()
     except KeyboardInterrupt:
         print("\n[-] Server shutting down")
+    finally:
+        service._save_all()
+        service.index.save()
 
 if __name__ == '__main__':
     main()
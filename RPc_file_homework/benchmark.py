@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# benchmark.py
+# RPC upload benchmarks (Linux only):
+#   modes        bytes on the wire and server CPU per GB for each upload mode
+#   concurrency  aggregate throughput with 1 to 64 concurrent clients
+#   smallfiles   a directory of 10k small files, one transfer each vs multicall batches
+#   dedup        re-uploading a file with ~5% of it changed, plain put vs dedup mode
+#   download     GET /files/<name> with 1 to 8 ranged connections, plain and dedup-stored files
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, 'RPC_client'))
+from RPC_client import send_file, send_files, download_file, UPLOAD_MODES
+
+PORT = 9050
+PROXY_PORT = 9051  # Client talks to the counting proxy, which forwards to PORT
+SERVER_URL = f'http://127.0.0.1:{PROXY_PORT}'
+FILE_SIZE = 256 * 1024 * 1024
+CONCURRENCY = [1, 2, 4, 8, 16, 32, 64]
+CONCURRENT_BYTES = 64 * 1024 * 1024  # Total uploaded per concurrency level
+SMALL_FILES = 10000
+SMALL_FILE_BYTES = 4096
+DEDUP_EDITS = 8  # Scattered rewrites, FILE_SIZE / 20 bytes in total
+DOWNLOAD_CONNECTIONS = [1, 2, 4, 8]
+
+def wait_for_port(port, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Server did not start on port {port}")
+
+class CountingProxy:
+    """TCP forwarder that counts the bytes each client sends to the server"""
+    
+    def __init__(self, listen_port, target_port):
+        self.target_port = target_port
+        self.bytes_up = 0
+        self.lock = threading.Lock()
+        self.listener = socket.create_server(('127.0.0.1', listen_port))
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+    
+    def _accept_loop(self):
+        while True:
+            client, _ = self.listener.accept()
+            upstream = socket.create_connection(('127.0.0.1', self.target_port))
+            threading.Thread(target=self._pipe, args=(client, upstream, True), daemon=True).start()
+            threading.Thread(target=self._pipe, args=(upstream, client, False), daemon=True).start()
+    
+    def _pipe(self, src, dst, count):
+        try:
+            while True:
+                data = src.recv(1024 * 1024)
+                if not data:
+                    break
+                if count:
+                    with self.lock:
+                        self.bytes_up += len(data)
+                dst.sendall(data)
+        except OSError:
+            pass
+        finally:
+            try:
+                dst.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+def server_cpu(pid):
+    """User + system CPU seconds used so far by the server process"""
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+def write_payload(path, size):
+    with open(path, 'wb') as f:
+        for _ in range(size // (1024 * 1024)):
+            f.write(os.urandom(1024 * 1024))
+        f.write(os.urandom(size % (1024 * 1024)))
+
+def start_server(workdir, *flags):
+    server_script = os.path.join(HERE, 'RPC_server', 'RPC_server.py')
+    server = subprocess.Popen([sys.executable, server_script, str(PORT), *flags], cwd=workdir,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(PORT)
+    return server
+
+def bench_modes(workdir):
+    source = os.path.join(workdir, 'payload.bin')
+    write_payload(source, FILE_SIZE)
+    server = start_server(workdir)
+    try:
+        proxy = CountingProxy(PROXY_PORT, PORT)
+        gb = FILE_SIZE / 1e9
+        print(f"Uploading {FILE_SIZE // (1024 * 1024)} MB per mode")
+        print(f"  {'mode':8s} {'wire MB/GB':>11s} {'server CPU s/GB':>16s} {'MB/s':>8s}")
+        for mode in UPLOAD_MODES:
+            wire_before, cpu_before = proxy.bytes_up, server_cpu(server.pid)
+            start = time.perf_counter()
+            ok = send_file(SERVER_URL, source, mode=mode, quiet=True)
+            elapsed = time.perf_counter() - start
+            wire_after, cpu_after = proxy.bytes_up, server_cpu(server.pid)
+            if not ok:
+                print(f"  {mode:8s} upload failed")
+                continue
+            wire = (wire_after - wire_before) / 1e6 / gb
+            cpu = (cpu_after - cpu_before) / gb
+            print(f"  {mode:8s} {wire:11.0f} {cpu:16.2f} {FILE_SIZE / 1e6 / elapsed:8.1f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+def bench_concurrency(workdir, mode='put'):
+    """Split CONCURRENT_BYTES across N clients uploading at once, against serial and threaded servers"""
+    server_url = f'http://127.0.0.1:{PORT}'
+    print(f"Aggregate MB/s uploading {CONCURRENT_BYTES // (1024 * 1024)} MB total ({mode} mode)")
+    print(f"  {'clients':>7s} {'serial':>9s} {'threaded':>9s}")
+    results = {}
+    for flags in [('--serial',), ()]:
+        server = start_server(workdir, *flags)
+        try:
+            for clients in CONCURRENCY:
+                per_client = CONCURRENT_BYTES // clients
+                source = os.path.join(workdir, f'payload_{clients}.bin')
+                if not os.path.exists(source):
+                    write_payload(source, per_client)
+                paths = []
+                for i in range(clients):
+                    link = os.path.join(workdir, f'upload_{clients}_{i}.bin')
+                    if not os.path.exists(link):
+                        os.symlink(source, link)
+                    paths.append(link)
+                
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=clients) as pool:
+                    ok = all(pool.map(lambda p: send_file(server_url, p, mode=mode, quiet=True), paths))
+                elapsed = time.perf_counter() - start
+                results[flags, clients] = per_client * clients / 1e6 / elapsed if ok else 0.0
+        finally:
+            server.terminate()
+            server.wait()
+    for clients in CONCURRENCY:
+        print(f"  {clients:7d} {results[('--serial',), clients]:9.1f} {results[(), clients]:9.1f}")
+
+def bench_smallfiles(workdir):
+    source_dir = os.path.join(workdir, 'small')
+    os.makedirs(source_dir)
+    paths = []
+    for i in range(SMALL_FILES):
+        path = os.path.join(source_dir, f'file_{i:05d}.bin')
+        with open(path, 'wb') as f:
+            f.write(os.urandom(SMALL_FILE_BYTES))
+        paths.append(path)
+    
+    server_url = f'http://127.0.0.1:{PORT}'
+    server = start_server(workdir)
+    try:
+        print(f"Uploading {SMALL_FILES} files of {SMALL_FILE_BYTES} bytes")
+        start = time.perf_counter()
+        ok = all(send_file(server_url, path, quiet=True) for path in paths)
+        per_file = time.perf_counter() - start
+        print(f"  one transfer per file: {per_file:7.2f} s  {SMALL_FILES / per_file:8.0f} files/s" + ("" if ok else "  (failures)"))
+        
+        start = time.perf_counter()
+        ok = send_files(server_url, paths, quiet=True)
+        batched = time.perf_counter() - start
+        print(f"  multicall batches:     {batched:7.2f} s  {SMALL_FILES / batched:8.0f} files/s" + ("" if ok else "  (failures)"))
+    finally:
+        server.terminate()
+        server.wait()
+
+def bench_dedup(workdir):
+    """Upload a file, rewrite ~5% of it in a few places, and upload it again"""
+    source = os.path.join(workdir, 'nightly.bin')
+    write_payload(source, FILE_SIZE)
+    server = start_server(workdir)
+    try:
+        proxy = CountingProxy(PROXY_PORT, PORT)
+        print(f"Re-uploading {FILE_SIZE // (1024 * 1024)} MB with {DEDUP_EDITS} edits totalling 5%")
+        print(f"  {'mode':8s} {'first MB':>9s} {'again MB':>9s} {'again s':>8s}")
+        for mode in ('put', 'dedup'):
+            write_payload(source, FILE_SIZE)
+            wire_before = proxy.bytes_up
+            send_file(SERVER_URL, source, mode=mode, quiet=True)
+            first = proxy.bytes_up - wire_before
+            
+            edit = FILE_SIZE // 20 // DEDUP_EDITS
+            with open(source, 'r+b') as f:
+                for i in range(DEDUP_EDITS):
+                    f.seek(i * (FILE_SIZE // DEDUP_EDITS))
+                    f.write(os.urandom(edit))
+            
+            wire_before = proxy.bytes_up
+            start = time.perf_counter()
+            ok = send_file(SERVER_URL, source, mode=mode, quiet=True)
+            elapsed = time.perf_counter() - start
+            again = proxy.bytes_up - wire_before
+            print(f"  {mode:8s} {first / 1e6:9.1f} {again / 1e6:9.1f} {elapsed:8.2f}" + ("" if ok else "  (failed)"))
+    finally:
+        server.terminate()
+        server.wait()
+
+def bench_download(workdir):
+    """Download a put-stored and a dedup-stored copy of one file over 1 to 8 connections"""
+    source = os.path.join(workdir, 'payload.bin')
+    write_payload(source, FILE_SIZE)
+    dedup_source = os.path.join(workdir, 'payload_dedup.bin')
+    os.symlink(source, dedup_source)
+    server_url = f'http://127.0.0.1:{PORT}'
+    server = start_server(workdir)
+    try:
+        send_file(server_url, source, mode='put', quiet=True)
+        send_file(server_url, dedup_source, mode='dedup', quiet=True)
+        gb = FILE_SIZE / 1e9
+        print(f"Downloading {FILE_SIZE // (1024 * 1024)} MB")
+        print(f"  {'stored':8s} {'conns':>5s} {'MB/s':>8s} {'server CPU s/GB':>16s}")
+        for name in ('payload.bin', 'payload_dedup.bin'):
+            for connections in DOWNLOAD_CONNECTIONS:
+                dest = os.path.join(workdir, 'downloaded.bin')
+                cpu_before = server_cpu(server.pid)
+                start = time.perf_counter()
+                ok = download_file(server_url, name, dest, connections=connections, quiet=True)
+                elapsed = time.perf_counter() - start
+                cpu = (server_cpu(server.pid) - cpu_before) / gb
+                stored = 'dedup' if name.endswith('_dedup.bin') else 'put'
+                print(f"  {stored:8s} {connections:5d} {FILE_SIZE / 1e6 / elapsed:8.1f} {cpu:16.2f}" + ("" if ok else "  (failed)"))
+                os.remove(dest)
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    which = sys.argv[1] if len(sys.argv) > 1 else 'modes'
+    with tempfile.TemporaryDirectory() as workdir:
+        if which == 'concurrency':
+            bench_concurrency(workdir, sys.argv[2] if len(sys.argv) > 2 else 'put')
+        elif which == 'smallfiles':
+            bench_smallfiles(workdir)
+        elif which == 'dedup':
+            bench_dedup(workdir)
+        elif which == 'download':
+            bench_download(workdir)
+        else:
+            bench_modes(workdir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# benchmark.py
+# Localhost upload throughput of client.py against server.py
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from client import send_file
+
+HOST = '127.0.0.1'
+PORT = 5050
+TOTAL_BYTES = 1024 * 1024 * 1024  # Split evenly across the concurrent uploads
+CONCURRENCY = [1, 16, 256]
+
+def wait_for_port(host, port, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Server did not start on {host}:{port}")
+
+def run_level(workdir, concurrency):
+    """Upload TOTAL_BYTES as `concurrency` parallel files, return GB/s"""
+    per_file = TOTAL_BYTES // concurrency
+    source = os.path.join(workdir, f"source_{concurrency}.bin")
+    with open(source, 'wb') as f:
+        f.write(os.urandom(1024 * 1024) * (per_file // (1024 * 1024)))
+        f.write(os.urandom(per_file % (1024 * 1024)))
+
+    # Distinct names so concurrent uploads don't overwrite each other
+    paths = []
+    for i in range(concurrency):
+        link = os.path.join(workdir, f"upload_{concurrency}_{i}.bin")
+        os.symlink(source, link)
+        paths.append(link)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda p: send_file(HOST, PORT, p, quiet=True), paths))
+    elapsed = time.perf_counter() - start
+
+    if not all(results):
+        print(f"[-] {results.count(False)} uploads failed at concurrency {concurrency}")
+    return per_file * concurrency / elapsed / 1e9
+
+def main():
+    use_splice = '--splice' in sys.argv
+    server_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+
+    with tempfile.TemporaryDirectory() as workdir:
+        server_args = [sys.executable, server_script, str(PORT)] + (['--splice'] if use_splice else [])
+        server = subprocess.Popen(server_args, cwd=workdir, stdout=subprocess.DEVNULL)
+        try:
+            wait_for_port(HOST, PORT)
+            print(f"Uploading {TOTAL_BYTES / 1e9:.2f} GB per level (splice={'on' if use_splice else 'off'})")
+            for concurrency in CONCURRENCY:
+                rate = run_level(workdir, concurrency)
+                print(f"  {concurrency:4d} concurrent uploads: {rate:6.2f} GB/s")
+        finally:
+            server.terminate()
+            server.wait()
+
+if __name__ == '__main__':
+    main()
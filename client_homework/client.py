@@ -5,50 +5,223 @@ import socket
 import struct
 import sys
 import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
-CHUNK = 4096
+CHUNK = 64 * 1024 * 1024  # Bytes handed to one sendfile call between progress updates
+SOCK_BUF = 4 * 1024 * 1024  # Kernel socket buffer size
+SMALL_FILE = 256 * 1024  # Batch files up to this size are coalesced into one write
+BATCH_BUF = 4 * 1024 * 1024  # Flush coalesced small files once this much is buffered
+SESSION_START = 0xFFFFFFFFFFFFFFFF  # Name length that opens a batch session
+STATUS_OK = 0x02
+SEGMENT_START = 0xFFFFFFFFFFFFFFFE  # Name length that opens one byte range of a parallel upload
+COMMIT_START = 0xFFFFFFFFFFFFFFFD  # Name length that asks the server to assemble the upload
+SEGMENT_READ = 1024 * 1024  # Bytes read, hashed and sent at a time within a segment
+SEGMENT_RETRIES = 3
 
-def send_file(server_host, server_port, filepath):
+def iter_files(paths):
+    """Yield (name on server, local path) for files and whole directory trees"""
+    for path in paths:
+        if os.path.isdir(path):
+            root = os.path.basename(os.path.normpath(path))
+            stack = [(path, root)]
+            while stack:
+                directory, prefix = stack.pop()
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        name = prefix + '/' + entry.name
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append((entry.path, name))
+                        elif entry.is_file():
+                            yield name, entry.path
+        elif os.path.isfile(path):
+            yield os.path.basename(path), path
+        else:
+            print("File not found:", path)
+
+def send_batch(server_host, server_port, paths, quiet=False):
+    """Upload many files over one connection with a single ack at the end"""
+    names = []
+    total = 0
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCK_BUF)
+        s.connect((server_host, server_port))
+        pending = bytearray(struct.pack('!Q', SESSION_START))
+        for name, path in iter_files(paths):
+            name_bytes = name.encode('utf-8')
+            with open(path, 'rb') as f:
+                filesize = os.fstat(f.fileno()).st_size
+                if filesize <= SMALL_FILE:
+                    data = f.read()
+                    pending += struct.pack('!Q', len(name_bytes)) + name_bytes
+                    pending += struct.pack('!Q', len(data)) + data
+                    if len(pending) >= BATCH_BUF:
+                        s.sendall(pending)
+                        pending.clear()
+                else:
+                    pending += struct.pack('!Q', len(name_bytes)) + name_bytes
+                    pending += struct.pack('!Q', filesize)
+                    s.sendall(pending)
+                    pending.clear()
+                    sent = 0
+                    while sent < filesize:
+                        n = s.sendfile(f, sent, min(CHUNK, filesize - sent))
+                        if n == 0:
+                            raise ConnectionError(f"{path} shrank while sending")
+                        sent += n
+            names.append(name)
+            total += filesize
+            if not quiet and len(names) % 1000 == 0:
+                print(f"\rSent {len(names)} files, {total} bytes", end='', flush=True)
+        pending += struct.pack('!Q', 0)
+        s.sendall(pending)
+        if not quiet:
+            print(f"\rSent {len(names)} files, {total} bytes")
+
+        # wait for the batched ack: !Q count, then one status byte per file
+        header = recv_exact(s, 8)
+        (count,) = struct.unpack('!Q', header)
+        statuses = recv_exact(s, count)
+
+    failed = [name for name, status in zip(names, statuses) if status != STATUS_OK]
+    if count != len(names):
+        print(f"Server acknowledged {count} of {len(names)} files")
+    for name in failed:
+        print("Server failed to store:", name)
+    if not quiet:
+        print(f"Server confirmed {count - len(failed)}/{len(names)} files")
+    return count == len(names) and not failed
+
+def send_segment(server_host, server_port, filepath, upload_id, name_bytes, filesize, offset, length):
+    """Send one byte range on its own connection, return its sha256 or None"""
+    digest = hashlib.sha256()
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCK_BUF)
+        s.connect((server_host, server_port))
+        s.sendall(struct.pack('!Q16sQQQQ', SEGMENT_START, upload_id, filesize, offset, length,
+                              len(name_bytes)) + name_bytes)
+        with open(filepath, 'rb') as f:
+            f.seek(offset)
+            left = length
+            while left:
+                chunk = f.read(min(SEGMENT_READ, left))
+                if not chunk:
+                    raise ConnectionError(f"{filepath} shrank while sending")
+                digest.update(chunk)
+                s.sendall(chunk)
+                left -= len(chunk)
+        s.sendall(digest.digest())
+        status = s.recv(1)
+    return digest.digest() if status == bytes([STATUS_OK]) else None
+
+def send_parallel(server_host, server_port, filepath, connections=4, quiet=False):
+    """Upload one file as byte ranges over parallel connections, verified end to end"""
     if not os.path.isfile(filepath):
-        print("File not found:", filepath); return
+        print("File not found:", filepath); return False
+    name_bytes = os.path.basename(filepath).encode('utf-8')
+    filesize = os.path.getsize(filepath)
+    if filesize == 0:
+        return send_file(server_host, server_port, filepath, quiet)
+    upload_id = os.urandom(16)
+
+    segment_size = -(-filesize // connections) or 1
+    ranges = [(offset, min(segment_size, filesize - offset))
+              for offset in range(0, filesize, segment_size)]
+
+    def upload(segment):
+        offset, length = segment
+        for attempt in range(1, SEGMENT_RETRIES + 1):
+            try:
+                digest = send_segment(server_host, server_port, filepath, upload_id,
+                                      name_bytes, filesize, offset, length)
+                if digest is not None:
+                    return digest
+                print(f"Segment at {offset} rejected by server (attempt {attempt})")
+            except OSError as e:
+                print(f"Segment at {offset} failed (attempt {attempt}): {e}")
+        return None
+
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        digests = list(pool.map(upload, ranges))
+    if None in digests:
+        print("Giving up: some segments could not be delivered")
+        return False
+    if not quiet:
+        print(f"Sent {filesize} bytes in {len(ranges)} segments")
+
+    # the file digest is the sha256 of the segment digests in offset order
+    file_digest = hashlib.sha256(b''.join(digests)).digest()
+    with socket.create_connection((server_host, server_port)) as s:
+        s.sendall(struct.pack('!Q16sQ32s', COMMIT_START, upload_id, filesize, file_digest))
+        status = s.recv(1)
+    if status == bytes([STATUS_OK]):
+        if not quiet:
+            print("Server verified and assembled the file")
+        return True
+    print("Server could not verify the assembled file")
+    return False
+
+def recv_exact(s, n):
+    data = bytearray()
+    while len(data) < n:
+        chunk = s.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed before batch ack")
+        data += chunk
+    return bytes(data)
+
+def send_file(server_host, server_port, filepath, quiet=False):
+    if not os.path.isfile(filepath):
+        print("File not found:", filepath); return False
     filename = os.path.basename(filepath)
     filesize = os.path.getsize(filepath)
 
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCK_BUF)
         s.connect((server_host, server_port))
-        # send filename length and filename
+        # send filename length, filename and filesize in one write
         name_bytes = filename.encode('utf-8')
-        s.sendall(struct.pack('!Q', len(name_bytes)))
-        s.sendall(name_bytes)
-        # send filesize
-        s.sendall(struct.pack('!Q', filesize))
+        s.sendall(struct.pack('!Q', len(name_bytes)) + name_bytes + struct.pack('!Q', filesize))
         # wait for server ACK
         ack = s.recv(1)
         if ack != b'\x01':
             print("No ACK from server, aborting")
-            return
+            return False
         sent = 0
         with open(filepath, 'rb') as f:
-            while True:
-                chunk = f.read(CHUNK)
-                if not chunk:
+            # socket.sendfile uses os.sendfile, so file bytes never pass through Python
+            while sent < filesize:
+                n = s.sendfile(f, sent, min(CHUNK, filesize - sent))
+                if n == 0:
                     break
-                s.sendall(chunk)
-                sent += len(chunk)
-                print(f"\rSent {sent}/{filesize} bytes", end='', flush=True)
-        print()
+                sent += n
+                if not quiet:
+                    print(f"\rSent {sent}/{filesize} bytes", end='', flush=True)
+        if not quiet:
+            print()
         # wait for EOF ack
         eof = s.recv(1)
         if eof == b'\x02':
-            print("Server confirmed receipt")
+            if not quiet:
+                print("Server confirmed receipt")
+            return True
         else:
             print(" No EOF confirmation")
+            return False
 
 if __name__ == '__main__':
-    if len(sys.argv) != 4:
+    if len(sys.argv) < 4:
         print("Usage: python client.py <server_ip> <server_port> <file_path>")
+        print("       python client.py <server_ip> <server_port> <path> [<path> ...]  (batch, dirs are walked)")
+        print("       python client.py <server_ip> <server_port> <file_path> --parallel <connections>")
         sys.exit(1)
     host = sys.argv[1]
     port = int(sys.argv[2])
-    path = sys.argv[3]
-    send_file(host, port, path)
+    paths = sys.argv[3:]
+    if '--parallel' in paths:
+        idx = paths.index('--parallel')
+        send_parallel(host, port, paths[0], int(paths[idx + 1]))
+    elif len(paths) == 1 and os.path.isfile(paths[0]):
+        send_file(host, port, paths[0])
+    else:
+        send_batch(host, port, paths)
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+# server.py
+
+import hashlib
+import os
+import selectors
+import socket
+import struct
+import sys
+import time
+
+HOST = '0.0.0.0'
+PORT = 5000
+SAVE_DIR = 'received'
+BUF_SIZE = 1024 * 1024  # Shared receive buffer, reused for every recv_into
+SOCK_BUF = 4 * 1024 * 1024  # Kernel socket buffer size
+MAX_NAME_LEN = 4096  # Longest file name, in bytes, a client may send
+UPLOAD_IDLE_TIMEOUT = 300.0  # Seconds a segmented upload may go without a segment before it is dropped
+RETIRED_TTL = 3600.0  # Seconds an expired or committed upload id keeps being refused
+EXPIRE_INTERVAL = 10.0  # Seconds between checks for idle uploads
+
+ACK_READY = b'\x01'
+ACK_DONE = b'\x02'
+STATUS_FAILED = 0x03
+
+# A name length of SESSION_START opens a batch session: files follow back to
+# back with no per-file acks, a name length of 0 ends the batch, and the server
+# answers with !Q count plus one status byte (ACK_DONE or STATUS_FAILED) per file.
+SESSION_START = 0xFFFFFFFFFFFFFFFF
+
+# Parallel segmented uploads. A name length of SEGMENT_START is followed by
+# upload id (16 bytes), !QQQQ total size, offset, length, name length, the
+# name, `length` body bytes and the sha256 of those bytes; the server answers
+# one status byte. COMMIT_START is followed by the upload id, !Q total size
+# and sha256 over the segment digests in offset order; once the segments
+# cover the file and the digest matches, the file is moved into place.
+SEGMENT_START = 0xFFFFFFFFFFFFFFFE
+COMMIT_START = 0xFFFFFFFFFFFFFFFD
+SEGMENT_HEADER = struct.Struct('!16sQQQQ')
+COMMIT_HEADER = struct.Struct('!16sQ32s')
+
+# Framing stages: !Q name length, name, !Q size, then the file body
+STAGE_NAME_LEN = 0
+STAGE_NAME = 1
+STAGE_SIZE = 2
+STAGE_BODY = 3
+STAGE_SEG_HEADER = 4
+STAGE_SEG_NAME = 5
+STAGE_SEG_TRAILER = 6
+STAGE_COMMIT = 7
+
+def safe_relpath(name):
+    """Turn a client-supplied relative path into one that stays inside save_dir"""
+    parts = [p for p in name.replace('\\', '/').split('/') if p not in ('', '.')]
+    if not parts or '..' in parts:
+        return None
+    return os.path.join(*parts)
+
+class Connection:
+    """Upload state for one client socket"""
+
+    def __init__(self, sock, addr, save_dir, uploads, retired):
+        self.sock = sock
+        self.addr = addr
+        self.save_dir = save_dir
+        self.uploads = uploads  # Segmented uploads shared by all connections
+        self.retired = retired  # Upload id -> when it expired or was committed; its segments are refused
+        self.outbox = bytearray()
+        self.pipe = None  # (read_fd, write_fd) when splicing
+        self.fd = None
+        self.name = None
+        self.remaining = 0
+        self.session = None  # Per-file status bytes while a batch session is open
+        self.known_dirs = set()
+        self.segment = None  # Range being written while in a segmented upload
+        self._expect(STAGE_NAME_LEN, 8)
+
+    def _expect(self, stage, need):
+        self.stage = stage
+        self.need = need
+        self.header = bytearray()
+
+    def consume(self, data):
+        """Feed received bytes through the framing state machine"""
+        pos = 0
+        while pos < len(data):
+            if self.stage == STAGE_BODY:
+                n = min(self.remaining, len(data) - pos)
+                self._write(data[pos:pos + n])
+                pos += n
+                self.remaining -= n
+                if self.remaining == 0:
+                    self._finish_file()
+            else:
+                take = data[pos:pos + self.need - len(self.header)]
+                self.header += take
+                pos += len(take)
+                if len(self.header) == self.need:
+                    self._advance_header()
+
+    def _advance_header(self):
+        if self.stage == STAGE_NAME_LEN:
+            (name_len,) = struct.unpack('!Q', self.header)
+            if name_len == SESSION_START:
+                self.session = bytearray()
+                self._expect(STAGE_NAME_LEN, 8)
+            elif name_len == SEGMENT_START:
+                self._expect(STAGE_SEG_HEADER, SEGMENT_HEADER.size)
+            elif name_len == COMMIT_START:
+                self._expect(STAGE_COMMIT, COMMIT_HEADER.size)
+            elif name_len == 0 and self.session is not None:
+                self.outbox += struct.pack('!Q', len(self.session)) + self.session
+                self.session = None
+                self._expect(STAGE_NAME_LEN, 8)
+            else:
+                self._check_name_len(name_len)
+                self._expect(STAGE_NAME, name_len)
+                if name_len == 0:
+                    self._advance_header()
+        elif self.stage == STAGE_NAME:
+            name = self.header.decode('utf-8')
+            if self.session is None:
+                self.name = os.path.basename(name)
+            else:
+                self.name = safe_relpath(name)
+            self._expect(STAGE_SIZE, 8)
+        elif self.stage == STAGE_SIZE:
+            (self.remaining,) = struct.unpack('!Q', self.header)
+            if self.session is None:
+                path = os.path.join(self.save_dir, self.name or 'unnamed')
+                self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+                self.outbox += ACK_READY
+            else:
+                self.fd = self._open_session_file()
+            self._expect(STAGE_BODY, 0)
+            if self.remaining == 0:
+                self._finish_file()
+        elif self.stage == STAGE_SEG_HEADER:
+            upload_id, size, offset, length, name_len = SEGMENT_HEADER.unpack(self.header)
+            self.segment = {'upload_id': upload_id, 'size': size, 'offset': offset,
+                            'pos': offset, 'length': length, 'hash': hashlib.sha256()}
+            self._check_name_len(name_len)
+            self._expect(STAGE_SEG_NAME, name_len)
+            if name_len == 0:
+                self._advance_header()
+        elif self.stage == STAGE_SEG_NAME:
+            self.name = os.path.basename(self.header.decode('utf-8')) or 'unnamed'
+            self._start_segment()
+        elif self.stage == STAGE_SEG_TRAILER:
+            self._finish_segment(bytes(self.header))
+        elif self.stage == STAGE_COMMIT:
+            self._commit(*COMMIT_HEADER.unpack(self.header))
+            self._expect(STAGE_NAME_LEN, 8)
+
+    def _check_name_len(self, name_len):
+        """Refuse a name length before buffering that many header bytes"""
+        if name_len > MAX_NAME_LEN:
+            raise ValueError(f"file name of {name_len} bytes is longer than {MAX_NAME_LEN}")
+
+    def _start_segment(self):
+        """Attach to (or create and preallocate) the upload this segment belongs to"""
+        segment = self.segment
+        upload = self.uploads.get(segment['upload_id'])
+        in_range = segment['offset'] + segment['length'] <= segment['size']
+        # A first segment that does not fit its own size creates nothing on disk
+        if upload is None and in_range and segment['upload_id'] not in self.retired:
+            path = os.path.join(self.save_dir, f".{self.name}.{segment['upload_id'].hex()[:16]}.part")
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            if hasattr(os, 'posix_fallocate') and segment['size']:
+                os.posix_fallocate(fd, 0, segment['size'])
+            else:
+                os.ftruncate(fd, segment['size'])
+            upload = {'fd': fd, 'path': path, 'name': self.name, 'size': segment['size'],
+                      'digests': {}, 'active': 0, 'touched': time.monotonic()}
+            self.uploads[segment['upload_id']] = upload
+        # Expired or already assembled uploads and out-of-range segments are read and discarded
+        if upload is not None and segment['offset'] + segment['length'] <= upload['size']:
+            upload['touched'] = time.monotonic()
+            upload['active'] += 1  # Not expired while a segment is streaming into it
+            segment['upload'] = upload
+        else:
+            segment['upload'] = None
+        self.remaining = segment['length']
+        self._expect(STAGE_BODY, 0)
+        if self.remaining == 0:
+            self._finish_file()
+
+    def _finish_segment(self, digest):
+        segment = self.segment
+        self.segment = None
+        self._release_segment(segment)
+        ok = segment['upload'] is not None and segment['hash'].digest() == digest
+        if ok:
+            segment['upload']['digests'][segment['offset']] = (segment['length'], digest)
+        self.outbox.append(ACK_DONE[0] if ok else STATUS_FAILED)
+        self._expect(STAGE_NAME_LEN, 8)
+
+    def _release_segment(self, segment):
+        upload = segment['upload']
+        if upload is not None:
+            upload['active'] -= 1
+            upload['touched'] = time.monotonic()
+
+    def _commit(self, upload_id, size, digest):
+        """Check segment coverage and the end-to-end digest, then move the file into place"""
+        upload = self.uploads.get(upload_id)
+        ok = False
+        if upload is not None and upload['size'] == size:
+            combined = hashlib.sha256()
+            pos = 0
+            for offset in sorted(upload['digests']):
+                length, segment_digest = upload['digests'][offset]
+                if offset != pos:
+                    break
+                combined.update(segment_digest)
+                pos += length
+            ok = pos == size and combined.digest() == digest
+            if ok:
+                os.close(upload['fd'])
+                os.replace(upload['path'], os.path.join(self.save_dir, upload['name']))
+                del self.uploads[upload_id]
+                self.retired[upload_id] = time.monotonic()
+                print(f"[+] {upload['name']} assembled from {len(upload['digests'])} segments")
+        self.outbox.append(ACK_DONE[0] if ok else STATUS_FAILED)
+
+    def _open_session_file(self):
+        """Open a batch file, or return None so its body is read and discarded"""
+        if self.name is None:
+            return None
+        path = os.path.join(self.save_dir, self.name)
+        parent = os.path.dirname(path)
+        try:
+            if parent not in self.known_dirs:
+                os.makedirs(parent, exist_ok=True)
+                self.known_dirs.add(parent)
+            return os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        except OSError as e:
+            print(f"[-] {self.addr}: cannot store {self.name}: {e}")
+            return None
+
+    def _write(self, data):
+        if self.segment is not None:
+            if self.segment['upload'] is not None:
+                self.segment['hash'].update(data)
+                fd = self.segment['upload']['fd']
+                while data:
+                    n = os.pwrite(fd, data, self.segment['pos'])
+                    self.segment['pos'] += n
+                    data = data[n:]
+            return
+        if self.fd is None:
+            return
+        while data:
+            n = os.write(self.fd, data)
+            data = data[n:]
+
+    def _finish_file(self):
+        if self.segment is not None:
+            self._expect(STAGE_SEG_TRAILER, 32)
+            return
+        if self.session is None:
+            os.close(self.fd)
+            self.outbox += ACK_DONE
+        elif self.fd is None:
+            self.session.append(STATUS_FAILED)
+        else:
+            os.close(self.fd)
+            self.session += ACK_DONE
+        self.fd = None
+        self._expect(STAGE_NAME_LEN, 8)
+
+    def splice_body(self):
+        """Move body bytes socket -> pipe -> file without copying through Python"""
+        if self.fd is None or self.segment is not None:
+            return None  # Discarded or segment body, let the caller recv it normally
+        if self.pipe is None:
+            self.pipe = os.pipe()
+        moved = os.splice(self.sock.fileno(), self.pipe[1], min(self.remaining, BUF_SIZE),
+                          flags=os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK)
+        if moved == 0:
+            return 0
+        left = moved
+        while left:
+            left -= os.splice(self.pipe[0], self.fd, left, flags=os.SPLICE_F_MOVE)
+        self.remaining -= moved
+        if self.remaining == 0:
+            self._finish_file()
+        return moved
+
+    def close(self):
+        if self.segment is not None:
+            self._release_segment(self.segment)
+            self.segment = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        if self.pipe is not None:
+            os.close(self.pipe[0])
+            os.close(self.pipe[1])
+            self.pipe = None
+        self.sock.close()
+
+class FileServer:
+    """Single-threaded selector loop serving many concurrent uploads"""
+
+    def __init__(self, host, port, save_dir, use_splice=False):
+        self.save_dir = save_dir
+        self.use_splice = use_splice and hasattr(os, 'splice')
+        self.uploads = {}  # upload id -> segmented upload in progress
+        self.retired = {}  # upload id -> when it expired or was committed
+        self.expired_at = time.monotonic()
+        self.selector = selectors.DefaultSelector()
+        self.buffer = bytearray(BUF_SIZE)
+        self.view = memoryview(self.buffer)
+        os.makedirs(save_dir, exist_ok=True)
+
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((host, port))
+        self.listener.listen(socket.SOMAXCONN)
+        self.listener.setblocking(False)
+        self.selector.register(self.listener, selectors.EVENT_READ)
+
+    def serve_forever(self):
+        while True:
+            if time.monotonic() - self.expired_at >= EXPIRE_INTERVAL:
+                self._expire_uploads()
+            for key, mask in self.selector.select(timeout=EXPIRE_INTERVAL):
+                if key.fileobj is self.listener:
+                    self._accept()
+                    continue
+                conn = key.data
+                try:
+                    if mask & selectors.EVENT_READ:
+                        self._read(conn)
+                    if mask & selectors.EVENT_WRITE and conn.sock.fileno() != -1:
+                        self._flush(conn)
+                except (OSError, ValueError) as e:
+                    # ValueError: a malformed header (bad UTF-8 name, oversized name); only this client goes
+                    print(f"[-] {conn.addr}: {e}")
+                    self._drop(conn)
+
+    def _expire_uploads(self):
+        """Drop segmented uploads nobody has sent a segment to for UPLOAD_IDLE_TIMEOUT:
+        close their fd, remove the .part file and refuse their id from then on"""
+        now = self.expired_at = time.monotonic()
+        for upload_id, upload in list(self.uploads.items()):
+            if upload['active'] == 0 and now - upload.get('touched', 0.0) > UPLOAD_IDLE_TIMEOUT:
+                os.close(upload['fd'])
+                try:
+                    os.remove(upload['path'])
+                except OSError:
+                    pass
+                del self.uploads[upload_id]
+                self.retired[upload_id] = now
+                print(f"[-] Dropped idle upload of {upload['name']} ({len(upload['digests'])} segments received)")
+        for upload_id, when in list(self.retired.items()):
+            if now - when > RETIRED_TTL:
+                del self.retired[upload_id]
+
+    def _accept(self):
+        while True:
+            try:
+                sock, addr = self.listener.accept()
+            except BlockingIOError:
+                return
+            sock.setblocking(False)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCK_BUF)
+            conn = Connection(sock, addr, self.save_dir, self.uploads, self.retired)
+            self.selector.register(sock, selectors.EVENT_READ, conn)
+
+    def _read(self, conn):
+        try:
+            n = None
+            if self.use_splice and conn.stage == STAGE_BODY:
+                n = conn.splice_body()
+            if n is None:
+                n = conn.sock.recv_into(self.buffer)
+                conn.consume(self.view[:n])
+        except BlockingIOError:
+            return
+        if n == 0:
+            self._drop(conn)
+            return
+        if conn.outbox:
+            self._flush(conn)
+
+    def _flush(self, conn):
+        try:
+            sent = conn.sock.send(conn.outbox)
+            del conn.outbox[:sent]
+        except BlockingIOError:
+            pass
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if conn.outbox else 0)
+        self.selector.modify(conn.sock, events, conn)
+
+    def _drop(self, conn):
+        if conn.fd is not None:
+            print(f"[-] {conn.addr} disconnected mid-upload of {conn.name}")
+        self.selector.unregister(conn.sock)
+        conn.close()
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else PORT
+    use_splice = '--splice' in sys.argv
+    server = FileServer(HOST, port, SAVE_DIR, use_splice)
+    print(f"[+] File server listening on {HOST}:{port} (splice={'on' if server.use_splice else 'off'})")
+    print(f"[+] Files will be saved to: {SAVE_DIR}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[-] Server shutting down")
@@ -32,9 +32,14 @@ def get_linux_terminal_cmd():
     return None
 
 def main():
+    # 'python launcher.py join' opens one more client on a chat started by this launcher
+    joining = len(sys.argv) > 1 and sys.argv[1] == 'join'
     n = 3
-    if len(sys.argv) > 1:
+    if joining:
+        n = 1
+    elif len(sys.argv) > 1:
         n = sys.argv[1]
+    app_args = ["--join"] if joining else ["--elastic"]
 
     mpi_exe = get_mpi_executable()
     if not mpi_exe:
@@ -54,12 +59,12 @@ def main():
             mpi_exe, 
             "-n", str(n), 
             "cmd", "/c", "start", "/WAIT", "MPI Chat",
-            "python", "-m", "MPI_communicator.main"
+            "python", "-m", "MPI_communicator.main", *app_args
         ]
     else:
         # Linux: Use terminal emulator
         term_cmd = get_linux_terminal_cmd()
-        python_cmd = [sys.executable, "-m", "MPI_communicator.main"]
+        python_cmd = [sys.executable, "-m", "MPI_communicator.main", *app_args]
         
         # Check if running as root
         mpi_args = ["-n", str(n)]
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# protocol_benchmark.py
+# Upload the same generated files over each file-transfer implementation on one Linux box
+# and record throughput, per-file latency, CPU time and peak RSS of client and server:
+#   tcp         client_homework: client.send_file -> server.py, one connection per file
+#   rpc[:mode]  RPc_file_homework: RPC_client.send_file -> RPC_server.py, 'put' mode unless given
+#   mpi         MPI_homework: MPI_client.send_file -> MPI_server.py, as ranks 0 and 1 of one mpiexec job
+#
+#   python protocol_benchmark.py [--files 200x64K,20x16M,2x256M] [--protocols tcp,rpc,mpi] [--out results.json]
+#
+# Every (protocol, workload) run gets a fresh server. The client runs in its own process
+# (this script with --client) so the CPU time and RSS it reports are the client's alone;
+# it reads the server's from /proc before the first file and after the last.
+
+import contextlib
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import xmlrpc.client
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TCP_SERVER = os.path.join(HERE, 'client_homework', 'server.py')
+RPC_SERVER = os.path.join(HERE, 'RPc_file_homework', 'RPC_server', 'RPC_server.py')
+MPI_SERVER = os.path.join(HERE, 'MPI_homework', 'server', 'MPI_server.py')
+CLIENT_DIRS = [os.path.join(HERE, 'client_homework'), os.path.join(HERE, 'RPc_file_homework', 'RPC_client'),
+               os.path.join(HERE, 'MPI_homework', 'client')]
+
+WORKLOADS = '200x64K,20x16M,2x256M'  # <count>x<size> per workload, K/M/G are binary units
+PROTOCOLS = 'tcp,rpc,mpi'
+RESULTS_FILE = 'protocol_benchmark.json'
+RUN_TIMEOUT = 1800  # Seconds one (protocol, workload) run may take
+UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+def option(name, default=None):
+    return sys.argv[sys.argv.index(name) + 1] if name in sys.argv else default
+
+def parse_size(text):
+    text = text.strip().upper()
+    if text[-1:] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+def parse_workloads(spec):
+    """'200x64K,2x256M' -> [(200, 65536), (2, 268435456)]"""
+    workloads = []
+    for item in spec.split(','):
+        count, size = item.lower().split('x')
+        workloads.append((int(count), parse_size(size)))
+    return workloads
+
+def workload_name(count, size):
+    for unit in ('G', 'M', 'K'):
+        if size >= UNITS[unit] and size % UNITS[unit] == 0:
+            return f"{count}x{size // UNITS[unit]}{unit}"
+    return f"{count}x{size}"
+
+def percentile(values, p):
+    """Nearest-rank percentile: the smallest value with at least p% of the values at or below it"""
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)] if values else None
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_for_port(port, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Server did not start on port {port}")
+
+def process_usage(pid):
+    """(CPU seconds, peak RSS bytes) of a running process, from /proc"""
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    peak = 0
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                peak = int(line.split()[1]) * 1024
+    return cpu, peak
+
+def find_process(script, cwd):
+    """Pid of the python process running script in cwd (the MPI server rank mpiexec started)"""
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/cmdline', 'rb') as f:
+                argv = f.read().split(b'\0')
+            if script.encode() in argv and os.path.realpath(f'/proc/{entry}/cwd') == os.path.realpath(cwd):
+                return int(entry)
+        except OSError:
+            continue
+    return None
+
+def write_files(directory, count, size):
+    os.makedirs(directory)
+    for i in range(count):
+        with open(os.path.join(directory, f'file_{i:05d}.bin'), 'wb') as f:
+            for _ in range(size // (1024 * 1024)):
+                f.write(os.urandom(1024 * 1024))
+            f.write(os.urandom(size % (1024 * 1024)))
+
+# Client side: runs in its own process, launched by run_protocol
+
+def client_uploader(protocol, target):
+    """Return send(path) -> bool for protocol, plus a finish() to call after the last file"""
+    sys.path[:0] = CLIENT_DIRS
+    name, _, mode = protocol.partition(':')
+    if name == 'tcp':
+        from client import send_file
+        host, port = target.rsplit(':', 1)
+        return (lambda path: send_file(host, int(port), path, quiet=True)), (lambda: None)
+    if name == 'rpc':
+        from RPC_client import send_file
+        return (lambda path: send_file(target, path, mode=mode or 'put', quiet=True)), (lambda: None)
+    if name == 'mpi':
+        from mpi4py import MPI
+        from MPI_client import send_file
+        comm = MPI.COMM_WORLD
+        # MPI_server.py shuts its rank down on tag 99
+        return (lambda path: send_file(comm, 0, path, 1)), (lambda: comm.send(None, dest=1, tag=99))
+    raise ValueError(f"Unknown protocol {protocol}")
+
+def client_main():
+    """--client <protocol> <target> <files dir> <server pid|0> <result path>"""
+    protocol, target, files_dir, server_pid, result_path = sys.argv[sys.argv.index('--client') + 1:][:5]
+    server_cwd = os.getcwd()
+    send, finish = client_uploader(protocol, target)
+    paths = sorted(os.path.join(files_dir, name) for name in os.listdir(files_dir))
+    server_pid = int(server_pid) or find_process(MPI_SERVER, server_cwd)
+
+    latencies = []
+    ok = True
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    server_before = process_usage(server_pid)
+    start = time.perf_counter()
+    # The clients print progress; keep it off the terminal but leave the cost in the numbers
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for path in paths:
+            file_start = time.perf_counter()
+            ok = bool(send(path)) and ok
+            latencies.append(time.perf_counter() - file_start)
+    elapsed = time.perf_counter() - start
+    server_after = process_usage(server_pid)
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    finish()
+
+    with open(result_path, 'w') as f:
+        json.dump({
+            'ok': ok,
+            'elapsed_s': elapsed,
+            'latencies_s': latencies,
+            'client_cpu_s': (usage_after.ru_utime + usage_after.ru_stime) - (usage.ru_utime + usage.ru_stime),
+            'client_peak_rss_bytes': usage_after.ru_maxrss * 1024,  # Linux reports KiB
+            'server_cpu_s': server_after[0] - server_before[0],
+            'server_peak_rss_bytes': server_after[1]
+        }, f)
+
+# Harness side
+
+def mpi_command():
+    """mpiexec prefix for a one-rank-each MPMD job, or None when MPI is not usable here"""
+    mpiexec = shutil.which('mpiexec') or shutil.which('mpirun')
+    try:
+        import mpi4py  # noqa: F401  Only checked for; the client process imports it
+    except ImportError:
+        return None
+    if mpiexec is None:
+        return None
+    command = [mpiexec]
+    if hasattr(os, 'getuid') and os.getuid() == 0:
+        command.append('--allow-run-as-root')  # Open MPI refuses root otherwise
+    return command
+
+def stored_sizes(name, target, server_dir):
+    """{name: size} of the files the server holds after a run
+
+    The RPC server is asked through list_files, since dedup uploads are kept as
+    chunks rather than files under received/; the others are read from disk.
+    """
+    if name == 'rpc':
+        proxy = xmlrpc.client.ServerProxy(target)
+        sizes, offset = {}, 0
+        while offset is not None:
+            page = proxy.list_files('', offset)
+            sizes.update((f['name'], int(f['size'])) for f in page['files'])
+            offset = page['next_offset']
+        return sizes
+    received = os.path.join(server_dir, 'received')
+    if not os.path.isdir(received):
+        return {}
+    return {entry.name: entry.stat().st_size for entry in os.scandir(received) if entry.is_file()}
+
+def run_protocol(protocol, files_dir, server_dir):
+    """Upload every file in files_dir with protocol against a fresh server in server_dir;
+    returns the client's measurements, or {'skipped': reason}"""
+    os.makedirs(server_dir)
+    result_path = os.path.join(os.path.dirname(server_dir), 'client_result.json')
+    name = protocol.partition(':')[0]
+    server = None
+    target = None
+    try:
+        if name == 'mpi':
+            prefix = mpi_command()
+            if prefix is None:
+                return {'skipped': 'mpiexec or mpi4py not available'}
+            command = prefix + ['-n', '1', sys.executable, os.path.abspath(__file__), '--client', protocol, '-',
+                                files_dir, '0', result_path, ':', '-n', '1', sys.executable, MPI_SERVER]
+            job = subprocess.run(command, cwd=server_dir, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                 timeout=RUN_TIMEOUT)
+        else:
+            port = free_port()
+            script = TCP_SERVER if name == 'tcp' else RPC_SERVER
+            server = subprocess.Popen([sys.executable, script, str(port)], cwd=server_dir,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            wait_for_port(port)
+            target = f'127.0.0.1:{port}' if name == 'tcp' else f'http://127.0.0.1:{port}'
+            command = [sys.executable, os.path.abspath(__file__), '--client', protocol, target,
+                       files_dir, str(server.pid), result_path]
+            job = subprocess.run(command, cwd=server_dir, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                 timeout=RUN_TIMEOUT)
+        if job.returncode != 0 or not os.path.exists(result_path):
+            return {'failed': job.stderr.decode(errors='replace')[-2000:]}
+        with open(result_path) as f:
+            result = json.load(f)
+        # While the server is still up: the RPC one is asked what it stored
+        try:
+            stored = stored_sizes(name, target, server_dir)
+        except (OSError, xmlrpc.client.Error):
+            stored = {}
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if os.path.exists(result_path):
+            os.remove(result_path)
+
+    # Count a run as correct only if every file arrived whole
+    for entry in os.scandir(files_dir):
+        if stored.get(entry.name) != entry.stat().st_size:
+            result['ok'] = False
+    return result
+
+def summarize(protocol, count, size, result):
+    row = {'protocol': protocol, 'workload': workload_name(count, size), 'files': count, 'file_bytes': size}
+    if 'latencies_s' not in result:
+        row.update(result)
+        return row
+    latencies = result.pop('latencies_s')
+    row.update(result)
+    row['total_bytes'] = count * size
+    row['throughput_mb_s'] = count * size / 1e6 / result['elapsed_s'] if result['elapsed_s'] else None
+    row['files_per_s'] = count / result['elapsed_s'] if result['elapsed_s'] else None
+    row['latency_s'] = {
+        'mean': sum(latencies) / len(latencies),
+        'p50': percentile(latencies, 50),
+        'p99': percentile(latencies, 99),
+        'max': max(latencies)
+    }
+    return row
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=HERE, capture_output=True, text=True,
+                              timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def main():
+    if '--client' in sys.argv:
+        client_main()
+        return
+    workloads = parse_workloads(option('--files', WORKLOADS))
+    protocols = option('--protocols', PROTOCOLS).split(',')
+    out = option('--out', RESULTS_FILE)
+
+    report = {
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': git_commit(),
+        'host': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'results': []
+    }
+    print(f"  {'protocol':10s} {'workload':>10s} {'MB/s':>8s} {'files/s':>8s} {'p50 ms':>8s} {'p99 ms':>8s} "
+          f"{'cli CPU s':>9s} {'srv CPU s':>9s} {'cli MB':>7s} {'srv MB':>7s}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for count, size in workloads:
+            files_dir = os.path.join(workdir, 'files')
+            write_files(files_dir, count, size)
+            for protocol in protocols:
+                server_dir = os.path.join(workdir, 'server')
+                result = run_protocol(protocol, files_dir, server_dir)
+                shutil.rmtree(server_dir, ignore_errors=True)
+                row = summarize(protocol, count, size, result)
+                report['results'].append(row)
+                if 'latency_s' in row:
+                    print(f"  {protocol:10s} {row['workload']:>10s} {row['throughput_mb_s']:8.1f} "
+                          f"{row['files_per_s']:8.1f} {row['latency_s']['p50'] * 1000:8.2f} "
+                          f"{row['latency_s']['p99'] * 1000:8.2f} {row['client_cpu_s']:9.2f} {row['server_cpu_s']:9.2f} "
+                          f"{row['client_peak_rss_bytes'] / 1e6:7.0f} {row['server_peak_rss_bytes'] / 1e6:7.0f}"
+                          + ("" if row['ok'] else "  (INCOMPLETE)"))
+                elif 'skipped' in row:
+                    print(f"  {protocol:10s} {row['workload']:>10s} skipped: {row['skipped']}")
+                else:
+                    lines = row['failed'].strip().splitlines()
+                    reason = f"failed: {lines[-1]}" if lines else "failed"
+                    print(f"  {protocol:10s} {row['workload']:>10s} {reason}")
+            shutil.rmtree(files_dir)
+
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {out}")
+
+if __name__ == '__main__':
+    main()